@@ -12,6 +12,14 @@ def mock_media(settings):
         yield temp_directory
 
 
+@pytest.fixture(autouse=True)
+def temp_media(settings, tmp_path):
+    # Загрузки и миниатюры тестов не должны попадать в MEDIA_ROOT проекта.
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.THUMBNAIL_KVSTORE_PATH = str(tmp_path / 'kvstore.sqlite3')
+    yield settings.MEDIA_ROOT
+
+
 @pytest.fixture
 def mixer():
     return _mixer
@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .sqlite import configure_sqlite
+        connection_created.connect(configure_sqlite)
+        if settings.METRICS_ENABLED:
+            from .metrics import instrument_templates
+            instrument_templates()
+        if settings.TEMPLATE_PROFILING:
+            from .templating import instrument_template_profiling
+            instrument_template_profiling()
+        if settings.TEMPLATE_WARMUP:
+            from .templating import warm_templates
+            warm_templates()
@@ -0,0 +1,170 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+_DONE = object()
+
+
+class WsgiToAsgi:
+    ''' ASGI-приложение поверх WSGI-обработчика Django.
+
+    Тело запроса читается и ответ отдаётся в цикле событий, а сам
+    Django - работа с базой и рендеринг - выполняется в пуле из
+    ``max_workers`` потоков. Поток пула берётся, только когда запрос
+    прочитан целиком. Кусок обычного ответа тоже готовится в пуле, но
+    ждать, пока медленный клиент примет кусок, поток не будет.
+
+    Потоковый ответ (response.streaming, например SSE) может подолгу
+    ждать следующего куска, поэтому он читается в отдельном пуле из
+    ``max_streams`` потоков и не занимает пул запросов. Когда все его
+    потоки заняты, новый потоковый ответ заменяется на 503.
+    '''
+
+    def __init__(self, wsgi_application, max_workers, max_streams=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='asgi-wsgi'
+        )
+        self.max_streams = max_streams or max_workers
+        self.stream_executor = ThreadPoolExecutor(
+            self.max_streams, thread_name_prefix='asgi-stream'
+        )
+        # Меняется только в цикле событий, блокировка не нужна.
+        self.streams = 0
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        self.stream_executor.shutdown(wait=wait)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип {scope["type"]}')
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        await self.respond(self.environ(scope, bytes(body)), send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def respond(self, environ, send):
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        def run():
+            result = self.wsgi_application(environ, start_response)
+            return result, iter(result)
+
+        result, chunks = await loop.run_in_executor(self.executor, run)
+        executor = self.executor
+        if getattr(result, 'streaming', False):
+            if self.streams >= self.max_streams:
+                if hasattr(result, 'close'):
+                    await loop.run_in_executor(self.executor, result.close)
+                await self.unavailable(send)
+                return
+            executor = self.stream_executor
+            self.streams += 1
+        try:
+            chunk = await loop.run_in_executor(executor, next, chunks, _DONE)
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            })
+            while chunk is not _DONE:
+                if chunk:
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+                chunk = await loop.run_in_executor(
+                    executor, next, chunks, _DONE
+                )
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            try:
+                if hasattr(result, 'close'):
+                    await loop.run_in_executor(executor, result.close)
+            finally:
+                if executor is self.stream_executor:
+                    self.streams -= 1
+
+    @staticmethod
+    async def unavailable(send):
+        await send({
+            'type': 'http.response.start',
+            'status': HTTPStatus.SERVICE_UNAVAILABLE,
+            'headers': [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'retry-after', b'5'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': HTTPStatus.SERVICE_UNAVAILABLE.phrase.encode(),
+        })
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        # PEP 3333: пути в environ - байты UTF-8, прочитанные как latin-1.
+        # scope['path'] уже раскодирован сервером из %XX, а raw_path нет.
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': _wsgi_str(scope.get('root_path', '')),
+            'PATH_INFO': _wsgi_str(scope['path']),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = (
+                f'{environ[key]},{value}' if key in environ else value
+            )
+        return environ
+
+
+def _wsgi_str(value):
+    return value.encode('utf-8').decode('latin-1')
@@ -0,0 +1,162 @@
+import json
+import math
+import threading
+from time import perf_counter
+
+from django.db import connection, connections
+from django.test import Client
+from django.utils.module_loading import autodiscover_modules
+
+SCENARIOS = {}
+
+
+def register(name, login=False, job=False, rows=100000):
+    ''' Регистрирует сценарий нагрузки.
+
+    Сценарий получает подготовленные данные и возвращает функцию
+    ``request(client, number)``, которая выполняет один запрос.
+    Задание (``job=True``) - не HTTP-сценарий: оно получает данные
+    и опции команды, выполняется один раз и само возвращает итоги.
+    Задания запускаются только явно, по имени; ``rows`` - их объём
+    данных, если --rows не задан.
+    '''
+    def decorator(func):
+        func.login = login
+        func.job = job
+        func.rows = rows
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    ''' Загружает модули benchmarks всех приложений. '''
+    autodiscover_modules('benchmarks')
+    return SCENARIOS
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, queries, elapsed, errors=0):
+    ''' Пропускная способность, перцентили задержки и число запросов. '''
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2)
+        if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_avg': round(sum(queries) / len(queries), 2)
+        if queries else 0.0,
+        'queries_max': max(queries, default=0),
+    }
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_concurrent(request, total, concurrency, users=()):
+    ''' Выполняет ``total`` запросов в ``concurrency`` потоках.
+
+    У каждого потока свой клиент; если переданы пользователи,
+    потоки авторизуются под ними по кругу.
+    '''
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(worker_number):
+        client = Client()
+        if users:
+            client.force_login(users[worker_number % len(users)])
+        counter = _QueryCounter()
+        own_latencies, own_queries, own_errors = [], [], 0
+        try:
+            with connection.execute_wrapper(counter):
+                for number in range(worker_number, total, concurrency):
+                    counter.count = 0
+                    started = perf_counter()
+                    try:
+                        response = request(client, number)
+                    except Exception:
+                        own_errors += 1
+                        continue
+                    own_latencies.append(perf_counter() - started)
+                    own_queries.append(counter.count)
+                    if response.status_code >= 400:
+                        own_errors += 1
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(own_latencies)
+                queries.extend(own_queries)
+                errors.append(own_errors)
+
+    threads = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(concurrency)
+    ]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - started
+    return summarize(latencies, queries, elapsed, sum(errors))
+
+
+def compare(baseline, current, tolerance):
+    ''' Регрессии относительно базового прогона.
+
+    Задержка сравнивается с допуском ``tolerance`` (доля), а число
+    запросов к базе - точно: оно не зависит от шума машины.
+    У заданий сравнивается пропускная способность ``rows_per_s``.
+    '''
+    regressions = []
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if 'rows_per_s' in result:
+            if result['rows_per_s'] < base['rows_per_s'] * (1 - tolerance):
+                regressions.append(
+                    f'{name}: rows_per_s {base["rows_per_s"]} -> '
+                    f'{result["rows_per_s"]}'
+                )
+            continue
+        if 'queries_max' not in result:
+            continue
+        if result['queries_max'] > base['queries_max']:
+            regressions.append(
+                f'{name}: queries_max {base["queries_max"]} -> '
+                f'{result["queries_max"]}'
+            )
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95_ms {base["p95_ms"]} -> {result["p95_ms"]}'
+            )
+    return regressions
+
+
+def dump(report, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
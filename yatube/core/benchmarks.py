@@ -0,0 +1,271 @@
+import http.client
+import os
+import random
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.core.wsgi import get_wsgi_application
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from django.views.static import serve as static_serve
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+from .asgi import WsgiToAsgi
+from .bench import register, summarize
+from .static import file_response, open_files, resolve
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _PooledWSGIServer(WSGIServer):
+    ''' WSGI-сервер, где каждое соединение целиком занимает поток пула.
+
+    Так работают синхронные воркеры: поток ждёт, пока клиент
+    дошлёт запрос, и только потом вызывает Django.
+    '''
+
+    request_queue_size = 128
+
+    def __init__(self, address, workers):
+        super().__init__(address, _QuietHandler)
+        self.pool = ThreadPoolExecutor(workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def _start_wsgi(application, workers):
+    server = _PooledWSGIServer(('127.0.0.1', 0), workers)
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+    return server.server_address[1], stop
+
+
+def _start_asgi(application):
+    server = uvicorn.Server(uvicorn.Config(
+        application, host='127.0.0.1', port=0, lifespan='off',
+        log_level='warning',
+    ))
+    # Не в главном потоке uvicorn не ставит обработчики сигналов.
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return server.servers[0].sockets[0].getsockname()[1], stop
+
+
+def _slow_client(port, path, seconds, stop):
+    ''' Присылает заголовки по одному, растягивая запрос на ``seconds``. '''
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port)) as sock:
+                sock.sendall(
+                    f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'.encode()
+                )
+                for number in range(10):
+                    sleep(seconds / 10)
+                    sock.sendall(f'X-Pad-{number}: slow\r\n'.encode())
+                sock.sendall(b'\r\n')
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            pass
+
+
+def _fast_clients(port, path, total, concurrency):
+    latencies, errors = [], []
+
+    def worker(worker_number):
+        own_errors = 0
+        for _ in range(worker_number, total, concurrency):
+            started = perf_counter()
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', port, timeout=30
+            )
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    own_errors += 1
+            except OSError:
+                own_errors += 1
+                continue
+            finally:
+                connection.close()
+            latencies.append(perf_counter() - started)
+        errors.append(own_errors)
+
+    threads = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(concurrency)
+    ]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, [], perf_counter() - started, sum(errors))
+
+
+def _measure(port, path, options):
+    stop = threading.Event()
+    slow = [
+        threading.Thread(
+            target=_slow_client,
+            args=(port, path, options['slow_seconds'], stop),
+        )
+        for _ in range(options['slow_clients'])
+    ]
+    for thread in slow:
+        thread.start()
+    # Медленные клиенты должны успеть занять соединения.
+    sleep(0.1)
+    try:
+        return _fast_clients(
+            port, path, options['requests'], options['concurrency']
+        )
+    finally:
+        stop.set()
+        for thread in slow:
+            thread.join()
+
+
+@register('slow_clients', job=True)
+def slow_clients(data, options):
+    ''' Быстрые клиенты ленты на фоне медленных: WSGI против ASGI.
+
+    Оба сервера держат одинаковый пул из ``--concurrency`` потоков
+    для Django. Вдвое больше медленных клиентов шлют заголовки
+    около секунды: в WSGI они занимают потоки пула, в ASGI - только
+    соединения в цикле событий. ASGI-приложение запускается под
+    uvicorn; без него замеряется только WSGI.
+    '''
+    concurrency = options.get('concurrency', 2)
+    options = {
+        'requests': options.get('requests', 10),
+        'concurrency': concurrency,
+        'slow_clients': 2 * concurrency,
+        'slow_seconds': 1.0 if 'requests' in options else 0.2,
+    }
+    path = reverse('posts:index')
+    application = get_wsgi_application()
+    result = {}
+    port, stop = _start_wsgi(application, concurrency)
+    try:
+        wsgi = _measure(port, path, options)
+    finally:
+        stop()
+    summaries = [('wsgi', wsgi)]
+    if uvicorn is not None:
+        asgi_application = WsgiToAsgi(application, concurrency)
+        port, stop = _start_asgi(asgi_application)
+        try:
+            summaries.append(('asgi', _measure(port, path, options)))
+        finally:
+            stop()
+            asgi_application.shutdown()
+    for prefix, summary in summaries:
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'errors'):
+            result[f'{prefix}_{key}'] = summary[key]
+    return result
+
+
+def _read_file(request, root, path):
+    with open(resolve(root, path), 'rb') as file:
+        return HttpResponse(file.read(), content_type='image/jpeg')
+
+
+def _files_per_s(view, requests):
+    started = perf_counter()
+    for request, path in requests:
+        response = view(request, path)
+        b''.join(response)
+        response.close()
+    return round(len(requests) / (perf_counter() - started))
+
+
+@register('media_files', job=True)
+def media_files(data, options):
+    ''' Отдача миниатюр: file_response против наивных способов.
+
+    ``--rows`` запросов к сотне файлов по 20 КБ, каждый десятый - с
+    Range. Сравнение с чтением файла в память и с
+    django.views.static.serve; ответ вычитывается целиком, как его
+    отправил бы сервер. Выигрыш sendfile виден только под gunicorn
+    и здесь не замеряется.
+    '''
+    rnd = random.Random(0)
+    factory = RequestFactory()
+    names = [f'cache/{number:03}.jpg' for number in range(100)]
+    requests = [
+        (
+            factory.get('/media/', **(
+                {'HTTP_RANGE': 'bytes=1000-4999'} if number % 10 == 0
+                else {}
+            )),
+            rnd.choice(names),
+        )
+        for number in range(options['rows'])
+    ]
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, 'cache'))
+        for name in names:
+            with open(os.path.join(root, name), 'wb') as file:
+                file.write(os.urandom(20 * 1024))
+        read = _files_per_s(
+            lambda request, path: _read_file(request, root, path), requests
+        )
+        django_serve = _files_per_s(
+            lambda request, path: static_serve(request, path, root),
+            requests,
+        )
+        open_files.clear()
+        hits, misses = open_files.hits, open_files.misses
+        served = _files_per_s(
+            lambda request, path: file_response(
+                request, resolve(root, path), 'public', precompressed=False,
+            ),
+            requests,
+        )
+        hits, misses = open_files.hits - hits, open_files.misses - misses
+        open_files.clear()
+    return {
+        'read_files_per_s': read,
+        'django_serve_files_per_s': django_serve,
+        'rows_per_s': served,
+        'fd_cache_hit_ratio': round(hits / ((hits + misses) or 1), 3),
+    }
@@ -0,0 +1,183 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Метка забранных журналов вместо номера пачки в имени файла.
+CLAIMED = 'claimed'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindBuffer:
+    ''' Копит записи в памяти и сохраняет их пачками.
+
+    Каждая запись сначала дописывается в файл-журнал процесса (spool),
+    поэтому падение процесса её не теряет: журналы упавших процессов
+    сохраняет первый сброс в любом другом процессе. Гарантия -
+    "хотя бы один раз": при падении между коммитом и удалением журнала
+    пачка будет сохранена повторно.
+
+    Сбрасывает фоновый поток (см. start) каждые ``interval`` секунд
+    или при накоплении ``max_items`` записей. Без потока буфер
+    сбрасывается синхронно, как только заполнится.
+    '''
+
+    def __init__(self, save, spool_path, max_items=100, interval=0.2,
+                 fsync=False):
+        self.save = save
+        self.spool_path = spool_path
+        self.max_items = max_items
+        self.interval = interval
+        self.fsync = fsync
+        self._items = []
+        self._spool = None
+        self._batch = 0
+        self._closed = []
+        self._claims = 0
+        self._replayed = False
+        self._started = int(time.time() * 1000)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            spool = self._open_spool()
+            spool.write(line)
+            spool.flush()
+            if self.fsync:
+                os.fsync(spool.fileno())
+            self._items.append(record)
+            full = len(self._items) >= self.max_items
+        if full:
+            if self._thread is None:
+                self.flush()
+            else:
+                self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return list(self._items)
+
+    def flush(self):
+        ''' Сохраняет всё накопленное одной транзакцией.
+
+        При первом вызове сначала досохраняет журналы процессов,
+        которые упали, не успев их сбросить. Возвращает число
+        сохранённых записей.
+        '''
+        with self._flush_lock:
+            saved = 0
+            if not self._replayed:
+                saved += self._replay_orphans()
+                self._replayed = True
+            with self._lock:
+                items, self._items = self._items, []
+                if self._spool is not None:
+                    self._spool.close()
+                    self._spool = None
+                    self._closed.append(self._spool_name())
+                    self._batch += 1
+                closed, self._closed = self._closed, []
+            if items:
+                try:
+                    with transaction.atomic():
+                        self.save(items)
+                except Exception:
+                    with self._lock:
+                        self._items[:0] = items
+                        self._closed[:0] = closed
+                    raise
+            for path in closed:
+                os.remove(path)
+            return saved + len(items)
+
+    def _replay_orphans(self):
+        saved = 0
+        for path in sorted(glob.glob(f'{self.spool_path}.*.*')):
+            claimed = self._claim(path)
+            if claimed is None:
+                continue
+            with open(claimed, encoding='utf-8') as spool:
+                items = [json.loads(line) for line in spool if line.strip()]
+            if items:
+                with transaction.atomic():
+                    self.save(items)
+            os.remove(claimed)
+            saved += len(items)
+        return saved
+
+    def _claim(self, path):
+        ''' Забирает журнал упавшего процесса; None - журнал не наш.
+
+        Журнал переименовывается под именем этого процесса: rename
+        атомарен, и из нескольких процессов журнал достанется одному.
+        Для остальных он теперь журнал живого процесса.
+        '''
+        owner = self._owner()
+        path_owner, batch = path.rsplit('.', 2)[1:]
+        if path_owner == owner:
+            # Свой забранный журнал, который не сохранился в прошлый раз.
+            return path if batch.startswith(CLAIMED) else None
+        pid = int(path_owner.split('-')[0])
+        # Журнал живого процесса трогать нельзя; свой pid с чужой
+        # меткой запуска - это прошлый запуск с тем же pid.
+        if pid != os.getpid() and _pid_alive(pid):
+            return None
+        claimed = f'{self.spool_path}.{owner}.{CLAIMED}{self._claims}'
+        self._claims += 1
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            # Журнал уже забрал другой процесс.
+            return None
+        return claimed
+
+    def _owner(self):
+        return f'{os.getpid()}-{self._started}'
+
+    def _spool_name(self):
+        return f'{self.spool_path}.{self._owner()}.{self._batch}'
+
+    def _open_spool(self):
+        if self._spool is None:
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            self._spool = open(self._spool_name(), 'a', encoding='utf-8')
+        return self._spool
+
+    def start(self):
+        ''' Запускает фоновый сброс. '''
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name='write-behind', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось сбросить буфер записи')
+                time.sleep(self.interval)
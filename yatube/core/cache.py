@@ -0,0 +1,24 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+
+class MetricsCacheMixin:
+    ''' Считает попадания и промахи кэша в замерах запроса. '''
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        metrics.cache_lookup(value is not self._missing)
+        return default if value is self._missing else value
+
+    def get_many(self, keys, version=None):
+        found = super().get_many(keys, version)
+        for key in keys:
+            metrics.cache_lookup(key in found)
+        return found
+
+
+class InstrumentedLocMemCache(MetricsCacheMixin, LocMemCache):
+    pass
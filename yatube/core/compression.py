@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import io
+import os
+
+from django.core.cache import cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Уровни сжатия: на лету - быстрый, для кэша и статики - наилучший.
+GZIP_LEVELS = {False: 6, True: 9}
+BROTLI_QUALITY = {False: 5, True: 11}
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available():
+    ''' Поддерживаемые кодировки в порядке предпочтения. '''
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _parse_accept_encoding(header):
+    accepted = {}
+    for item in header.split(','):
+        name, *params = item.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def negotiate(header, encodings=None):
+    ''' Кодировка ответа по заголовку Accept-Encoding или None.
+
+    Любое значение заголовка сводится к одной из немногих кодировок,
+    поэтому и сжатых копий страницы в кэше - не больше, чем кодировок.
+    ``encodings`` сужает выбор, например, до готовых копий файла.
+    '''
+    accepted = _parse_accept_encoding(header or '')
+    for encoding in available() if encodings is None else encodings:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY[best])
+    # mtime=0: одинаковое содержимое - одинаковые байты. GzipFile, а не
+    # gzip.compress: у того аргумент mtime появился только в Python 3.8.
+    buffer = io.BytesIO()
+    with gzip.GzipFile(
+        fileobj=buffer, mode='wb', compresslevel=GZIP_LEVELS[best], mtime=0
+    ) as file:
+        file.write(data)
+    return buffer.getvalue()
+
+
+def cached_compress(data, encoding, timeout):
+    ''' Сжатое тело из кэша; ключ - хеш исходного тела.
+
+    Страница из cache_page отдаётся одними и теми же байтами, так что
+    сжимается она один раз на кодировку, а попадания стоят хеша.
+    '''
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    key = f'compressed:{encoding}:{digest}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(data, encoding, best=True)
+        cache.set(key, compressed, timeout)
+    return compressed
+
+
+def compress_file(path, min_ratio):
+    ''' Пишет рядом с файлом .gz и .br, если они заметно меньше.
+
+    Возвращает созданные кодировки. Уже сжатые форматы (png, jpg)
+    обычно не проходят порог и остаются без копий.
+    '''
+    with open(path, 'rb') as file:
+        data = file.read()
+    created = []
+    for encoding in available():
+        target = path + SUFFIXES[encoding]
+        compressed = compress(data, encoding, best=True)
+        if len(compressed) > len(data) * min_ratio:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as file:
+            file.write(compressed)
+        created.append(encoding)
+    return created
@@ -0,0 +1,157 @@
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    ''' Вместо отправки сохраняет письма в таблицу OutboundEmail.
+
+    Запрос (например, сброс пароля) не ждёт почтовый сервер. Письмо
+    пишется в той же транзакции, что и остальные изменения запроса,
+    и не уйдёт, если она откатится. Отправляет очередь команда
+    send_queued_mail через EMAIL_QUEUE_BACKEND.
+    '''
+
+    def send_messages(self, email_messages):
+        queued = [
+            OutboundEmail(
+                subject=str(message.subject)[:255],
+                from_email=message.from_email,
+                recipients=json.dumps(message.recipients()),
+                message=message.message().as_bytes(),
+            )
+            for message in email_messages if message.recipients()
+        ]
+        OutboundEmail.objects.bulk_create(queued)
+        return len(queued)
+
+
+class StoredMIME:
+    ''' Готовое MIME-письмо из очереди для почтовых бэкендов Django. '''
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return self.data.replace(b'\n', linesep.encode())
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(unixfrom, linesep).decode()
+
+    def get_charset(self):
+        return None
+
+
+class QueuedMessage(EmailMessage):
+    ''' Письмо из очереди: MIME собран при постановке в очередь. '''
+
+    def __init__(self, email):
+        recipients = json.loads(email.recipients)
+        super().__init__(
+            subject=email.subject, from_email=email.from_email,
+            to=recipients,
+        )
+        self.queued = email
+
+    def message(self):
+        return StoredMIME(bytes(self.queued.message))
+
+
+def _claim(batch_size):
+    ''' Берёт пачку писем и откладывает их на время отправки.
+
+    Письмо забирается условным UPDATE по прежнему next_attempt: если
+    его уже взял другой отправитель, строка не обновится, и письмо
+    уйдёт один раз. Если отправитель упадёт, письма вернутся в очередь
+    через EMAIL_QUEUE_LEASE_SECONDS.
+    '''
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.EMAIL_QUEUE_LEASE_SECONDS)
+    due = list(OutboundEmail.objects.filter(
+        next_attempt__lte=now
+    ).order_by('next_attempt', 'id')[:batch_size])
+    claimed = []
+    with transaction.atomic():
+        for email in due:
+            if OutboundEmail.objects.filter(
+                id=email.id, next_attempt=email.next_attempt
+            ).update(next_attempt=lease):
+                email.next_attempt = lease
+                claimed.append(email)
+    return claimed
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        email.next_attempt = None
+    else:
+        # Экспоненциальная пауза: 1, 2, 4... интервала повтора.
+        email.next_attempt = timezone.now() + timedelta(
+            seconds=settings.EMAIL_QUEUE_RETRY_SECONDS
+            * 2 ** (email.attempts - 1)
+        )
+    email.save(update_fields=['attempts', 'last_error', 'next_attempt'])
+    logger.warning('Письмо %s не отправлено: %s', email.id, email.last_error)
+
+
+def _reopen(connection):
+    ''' Переоткрывает соединение после ошибки; возвращает ошибку или None. '''
+    try:
+        connection.close()
+        connection.open()
+    except Exception as error:
+        return error
+    return None
+
+
+def send_queued(batch_size=None):
+    ''' Отправляет очередь пачками по ``batch_size`` писем.
+
+    На пачку открывается одно соединение EMAIL_QUEUE_BACKEND.
+    Отправленные письма удаляются; неудачные получают следующую
+    попытку с растущей паузой, после EMAIL_QUEUE_MAX_ATTEMPTS
+    остаются в таблице с пустым next_attempt. Если соединение
+    не открылось, вся оставшаяся пачка считается неудачной.
+    Возвращает число отправленных и неудачных писем.
+    '''
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH
+    sent = failed = 0
+    while True:
+        emails = _claim(batch_size)
+        if not emails:
+            return sent, failed
+        connection = get_connection(settings.EMAIL_QUEUE_BACKEND)
+        unsent, error = emails, _reopen(connection)
+        done = []
+        try:
+            while unsent and error is None:
+                email, unsent = unsent[0], unsent[1:]
+                try:
+                    connection.send_messages([QueuedMessage(email)])
+                except Exception as send_error:
+                    _failed(email, send_error)
+                    failed += 1
+                    # Соединение после ошибки может быть разорвано.
+                    error = _reopen(connection)
+                else:
+                    done.append(email.id)
+        finally:
+            connection.close()
+            OutboundEmail.objects.filter(id__in=done).delete()
+        sent += len(done)
+        if error is not None:
+            for email in unsent:
+                _failed(email, error)
+            return sent, failed + len(unsent)
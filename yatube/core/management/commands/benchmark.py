@@ -0,0 +1,155 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+from core import bench
+from posts.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон эндпоинтов на отдельной тестовой базе '
+        'с синтетическими данными. Результат - JSON для сравнения в CI.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help='Сценарии для прогона (по умолчанию - все, кроме заданий).',
+        )
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--follows', type=int, default=200)
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый сценарий.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--rows', type=int,
+            help=(
+                'Объём данных для заданий. По умолчанию у каждого свой: '
+                'миллион строк для import_posts, 100000 для остальных.'
+            ),
+        )
+        parser.add_argument(
+            '--sqlite-defaults', action='store_true',
+            help='Без SQLITE_PRAGMAS и постоянных соединений: для сравнения.',
+        )
+        parser.add_argument('--output', help='Куда записать JSON-отчёт.')
+        parser.add_argument(
+            '--compare', help='Базовый JSON-отчёт для поиска регрессий.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95 относительно базового отчёта.',
+        )
+
+    def handle(self, *args, **options):
+        scenarios = bench.autodiscover()
+        names = options['scenarios'] or sorted(
+            name for name, scenario in scenarios.items() if not scenario.job
+        )
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        # Как и тестовый раннер: отладочные панели искажают замеры.
+        settings.DEBUG = False
+        if options['sqlite_defaults']:
+            settings.SQLITE_PRAGMAS = {}
+            for connection in connections.all():
+                connection.settings_dict['CONN_MAX_AGE'] = 0
+                connection.settings_dict['OPTIONS'].pop('timeout', None)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            old_config = self.setup_databases(temp_dir)
+            try:
+                report = self.run_scenarios(names, scenarios, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        if options['output']:
+            bench.dump(report, options['output'])
+        if options['compare']:
+            regressions = bench.compare(
+                bench.load(options['compare']), report, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии производительности:\n' + '\n'.join(regressions)
+                )
+
+    def setup_databases(self, temp_dir):
+        # Файловая база вместо in-memory: так потоки работают
+        # с тем же хранилищем и журналом, что и в продакшене.
+        for connection in connections.all():
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(
+                    temp_dir, f'{connection.alias}.sqlite3'
+                )
+        return setup_databases(verbosity=0, interactive=False)
+
+    def run_scenarios(self, names, scenarios, options):
+        data = seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            comments=options['comments'],
+        )
+        report = {
+            'meta': {
+                key: options[key] for key in (
+                    'users', 'groups', 'posts', 'follows', 'comments',
+                    'requests', 'concurrency', 'rows', 'sqlite_defaults',
+                )
+            },
+            'scenarios': {},
+        }
+        for name in names:
+            scenario = scenarios[name]
+            cache.clear()
+            if scenario.job:
+                result = scenario(
+                    data, {**options, 'rows': options['rows'] or scenario.rows}
+                )
+                report['scenarios'][name] = result
+                self.stdout.write(f'{name:>14}: ' + '  '.join(
+                    f'{key} {value}' for key, value in sorted(result.items())
+                ))
+                continue
+            request = scenario(data)
+            result = bench.run_concurrent(
+                request,
+                total=options['requests'],
+                concurrency=options['concurrency'],
+                users=data.users if scenario.login else (),
+            )
+            # Фоновая нагрузка сценария дописывает свои итоги.
+            if hasattr(request, 'close'):
+                result.update(request.close())
+            report['scenarios'][name] = result
+            line = (
+                f'{name:>14}: {result["throughput_rps"]:>8} rps  '
+                f'p50 {result["p50_ms"]} ms  p95 {result["p95_ms"]} ms  '
+                f'p99 {result["p99_ms"]} ms  '
+                f'queries {result["queries_avg"]}  '
+                f'errors {result["errors"]}'
+            )
+            if 'writes' in result:
+                line += (
+                    f'  writes {result["writes"]}  '
+                    f'write_errors {result["write_errors"]}'
+                )
+            self.stdout.write(line)
+        return report
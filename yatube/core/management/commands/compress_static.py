@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.compression import SUFFIXES, compress_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает собранную статику (после collectstatic): рядом с '
+        'файлами появляются .gz и .br для отдачи веб-сервером '
+        '(nginx: gzip_static, brotli_static).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-ratio', type=float,
+            default=settings.COMPRESSION_STATIC_MIN_RATIO,
+            help='Копия пишется, только если не больше этой доли файла.',
+        )
+
+    def handle(self, *args, **options):
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise CommandError(
+                f'Нет каталога STATIC_ROOT {root}: сначала collectstatic.'
+            )
+        suffixes = tuple(SUFFIXES.values())
+        files = compressed = 0
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(suffixes):
+                    continue
+                path = os.path.join(directory, name)
+                files += 1
+                created = compress_file(path, options['min_ratio'])
+                compressed += bool(created)
+                if created and options['verbosity'] > 1:
+                    relative = os.path.relpath(path, root)
+                    self.stdout.write(f'{relative}: {", ".join(created)}')
+        self.stdout.write(f'Файлов: {files}, сжато: {compressed}')
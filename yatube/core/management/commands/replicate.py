@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.replication import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в реплики DATABASE_REPLICAS: '
+        'замена репликации для локальной проверки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию - один раз).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for path in replicate():
+                self.stdout.write(f'Обновлена реплика {path}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
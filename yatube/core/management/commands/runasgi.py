@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает ASGI-приложение под uvicorn с заданными пулами потоков. '
+        'Для продакшена - uvicorn yatube.asgi:application.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('addrport', nargs='?', default='127.0.0.1:8000')
+        parser.add_argument(
+            '--threads', type=int, default=settings.ASGI_THREADS,
+            help='Размер пула потоков для Django.',
+        )
+        parser.add_argument(
+            '--streams', type=int, default=settings.ASGI_STREAMS,
+            help='Сколько потоковых ответов (SSE) отдаётся одновременно.',
+        )
+
+    def handle(self, *args, **options):
+        if uvicorn is None:
+            raise CommandError('Нужен uvicorn: pip install uvicorn')
+        host, _, port = options['addrport'].rpartition(':')
+        application = WsgiToAsgi(
+            get_wsgi_application(), options['threads'], options['streams']
+        )
+        self.stdout.write(
+            f'ASGI: http://{host or "127.0.0.1"}:{port}/, '
+            f'потоков: {options["threads"]}'
+        )
+        uvicorn.run(application, host=host or '127.0.0.1', port=int(port))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import send_queued
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди (EMAIL_BACKEND = '
+        'core.mail.QueuedEmailBackend) через EMAIL_QUEUE_BACKEND.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию - один раз).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued(batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Отправлено писем: {sent}, с ошибкой: {failed}'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,187 @@
+import threading
+from collections import defaultdict, deque
+from time import perf_counter
+
+from django.conf import settings
+
+_local = threading.local()
+
+# Счётчики, которые копятся по каждому представлению.
+TOTALS = (
+    ('requests', 'yatube_requests_total', 'counter',
+     'Количество обработанных запросов.'),
+    ('wall', 'yatube_request_seconds_sum', 'counter',
+     'Суммарное время обработки запросов, секунды.'),
+    ('db_queries', 'yatube_db_queries_total', 'counter',
+     'Количество запросов к базе.'),
+    ('db', 'yatube_db_seconds_sum', 'counter',
+     'Суммарное время запросов к базе, секунды.'),
+    ('template', 'yatube_template_seconds_sum', 'counter',
+     'Суммарное время рендеринга шаблонов, секунды.'),
+    ('cache_hits', 'yatube_cache_hits_total', 'counter',
+     'Попадания в кэш.'),
+    ('cache_misses', 'yatube_cache_misses_total', 'counter',
+     'Промахи мимо кэша.'),
+)
+
+
+class RequestStats:
+    ''' Замеры одного запроса. '''
+
+    __slots__ = (
+        'view', 'method', 'status', 'started', 'wall', 'db_queries', 'db',
+        'template', 'cache_hits', 'cache_misses', 'rendering', 'templates',
+    )
+
+    def __init__(self, method, profile=False):
+        self.view = None
+        self.method = method
+        self.status = None
+        self.started = perf_counter()
+        self.wall = self.db = self.template = 0.0
+        self.db_queries = self.cache_hits = self.cache_misses = 0
+        self.rendering = False
+        # Разбивка по шаблонам и узлам, только в режиме профилирования.
+        self.templates = {} if profile else None
+
+    def as_dict(self):
+        row = {
+            'view': self.view,
+            'method': self.method,
+            'status': self.status,
+            'wall_ms': round(self.wall * 1000, 3),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db * 1000, 3),
+            'template_ms': round(self.template * 1000, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+        if self.templates is not None:
+            row['templates'] = {
+                key: round(seconds * 1000, 3)
+                for key, seconds in self.templates.items()
+            }
+        return row
+
+
+class MetricsRegistry:
+    ''' Кольцевой буфер последних запросов и накопленные итоги. '''
+
+    def __init__(self, size):
+        self.recent = deque(maxlen=size)
+        self.totals = defaultdict(lambda: defaultdict(float))
+        self.template_totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, stats):
+        row = stats.as_dict()
+        with self._lock:
+            self.recent.append(row)
+            totals = self.totals[stats.view or '-']
+            totals['requests'] += 1
+            totals['wall'] += stats.wall
+            totals['db_queries'] += stats.db_queries
+            totals['db'] += stats.db
+            totals['template'] += stats.template
+            totals['cache_hits'] += stats.cache_hits
+            totals['cache_misses'] += stats.cache_misses
+            for key, seconds in (stats.templates or {}).items():
+                self.template_totals[key] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.recent)
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+            self.totals.clear()
+            self.template_totals.clear()
+
+    def prometheus(self):
+        ''' Итоги в текстовом формате Prometheus. '''
+        with self._lock:
+            totals = {view: dict(row) for view, row in self.totals.items()}
+            template_totals = dict(self.template_totals)
+        lines = []
+        for field, name, kind, help_text in TOTALS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view, row in sorted(totals.items()):
+                value = row.get(field, 0)
+                lines.append(f'{name}{{view="{view}"}} {value:g}')
+        if template_totals:
+            name = 'yatube_template_node_seconds_sum'
+            lines.append(
+                f'# HELP {name} Время рендеринга шаблона или узла, секунды.'
+            )
+            lines.append(f'# TYPE {name} counter')
+            for node, value in sorted(template_totals.items()):
+                lines.append(f'{name}{{node="{node}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(settings.METRICS_BUFFER_SIZE)
+
+
+def current():
+    ''' Замеры текущего запроса или None вне запроса. '''
+    return getattr(_local, 'stats', None)
+
+
+def start(method, profile=False):
+    _local.stats = RequestStats(method, profile)
+    return _local.stats
+
+
+def finish(stats):
+    stats.wall = perf_counter() - stats.started
+    _local.stats = None
+    registry.record(stats)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    ''' Обёртка для connection.execute_wrapper. '''
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = current()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db += perf_counter() - started
+
+
+def cache_lookup(hit):
+    stats = current()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+def instrument_templates():
+    ''' Учитывает время рендеринга шаблонов верхнего уровня. '''
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        stats = current()
+        # Вложенные рендеры (виджеты форм) уже входят во внешний.
+        if stats is None or stats.rendering:
+            return original(self, context, request)
+        stats.rendering = True
+        started = perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template += perf_counter() - started
+            stats.rendering = False
+
+    render.instrumented = True
+    Template.render = render
@@ -0,0 +1,149 @@
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import get_max_age, patch_vary_headers
+
+from . import metrics
+from .compression import cached_compress, compress, negotiate
+from .querywatch import QueryWatcher
+from .routers import enable_replica_reads
+
+
+class RequestMetricsMiddleware:
+    ''' Замеряет время, запросы к базе, рендеринг и кэш каждого запроса.
+
+    Замеры складываются в кольцевой буфер metrics.registry и
+    отдаются представлениями core.views.metrics*.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.start(
+            request.method, profile=settings.TEMPLATE_PROFILING
+        )
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.db_wrapper)
+                    )
+                response = self.get_response(request)
+            stats.status = response.status_code
+            return response
+        finally:
+            match = request.resolver_match
+            stats.view = match.view_name if match else None
+            metrics.finish(stats)
+
+
+class CompressionMiddleware:
+    ''' Сжимает ответы gzip или brotli по заголовку Accept-Encoding.
+
+    Ответы с max-age (их ставит cache_page) сжимаются наилучшим
+    уровнем один раз, и сжатое тело лежит в кэше рядом со страницей.
+    Остальные сжимаются на лету быстрым уровнем. Страницы с
+    CSRF-токеном не сжимаются: это защита от BREACH, и тела у них
+    каждый раз разные.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.compressible(request, response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+        content = response.content
+        max_age = get_max_age(response)
+        if max_age and 'private' not in response.get('Cache-Control', ''):
+            compressed = cached_compress(content, encoding, max_age)
+        else:
+            compressed = compress(content, encoding)
+        if len(compressed) >= len(content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def compressible(request, response):
+        content_type = response.get('Content-Type', '').split(';', 1)[0]
+        return (
+            not response.streaming
+            and not response.has_header('Content-Encoding')
+            and content_type.strip() in settings.COMPRESSION_TYPES
+            and len(response.content) >= settings.COMPRESSION_MIN_SIZE
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
+
+
+class QueryWatchMiddleware:
+    ''' Пишет медленные запросы и подозрения на N+1 в журнал.
+
+    Следит только за долей запросов QUERY_WATCH_SAMPLE_RATE.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.QUERY_WATCH_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_WATCH_SAMPLE_RATE:
+            return self.get_response(request)
+        with QueryWatcher() as watcher:
+            response = self.get_response(request)
+        watcher.log(request.path)
+        return response
+
+
+class ReadReplicaMiddleware:
+    ''' Включает чтение с реплик для лент из READ_REPLICA_VIEWS.
+
+    После любого изменяющего запроса ставит cookie, и на время
+    READ_REPLICA_PIN_SECONDS автор читает с основной базы, чтобы
+    сразу видеть свои записи.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            enable_replica_reads(False)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                settings.READ_REPLICA_PIN_COOKIE, '1',
+                max_age=settings.READ_REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        enable_replica_reads(
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name
+            in settings.READ_REPLICA_VIEWS
+            and settings.READ_REPLICA_PIN_COOKIE not in request.COOKIES
+        )
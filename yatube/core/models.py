@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -11,3 +12,23 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class OutboundEmail(models.Model):
+    """Письмо в очереди на отправку, см. core.mail."""
+    # Тема - только для поиска письма в базе; отправляется message.
+    subject = models.CharField(max_length=255, blank=True)
+    from_email = models.CharField(max_length=254)
+    # JSON-список адресов конверта: to, cc и bcc вместе.
+    recipients = models.TextField()
+    message = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Когда пробовать снова; пусто - попытки исчерпаны.
+    next_attempt = models.DateTimeField(
+        default=timezone.now, null=True, db_index=True
+    )
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.subject
@@ -0,0 +1,80 @@
+import queue
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    ''' Очередь сообщений одного подписчика канала. '''
+
+    def __init__(self, hub, channel, maxsize):
+        self.hub = hub
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def get(self, timeout):
+        ''' Следующее сообщение или None, если за ``timeout`` ничего нет. '''
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Hub:
+    ''' Публикация сообщений подписчикам внутри процесса.
+
+    Сообщение готовится один раз и кладётся в очередь каждого
+    подписчика канала. Подписчика, который не успевает разбирать
+    очередь, отключаем: пусть переподключится и дочитает из базы.
+    '''
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.maxsize)
+        with self._lock:
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        ''' Рассылает сообщение; возвращает число получателей. '''
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        delivered = 0
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                continue
+            delivered += 1
+        return delivered
+
+    def subscribers(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+hub = Hub()
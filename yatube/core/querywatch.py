@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+slow_logger = logging.getLogger('yatube.slow_queries')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACES = re.compile(r'\s+')
+# Служебные модули, которые оборачивают любой запрос.
+_SKIP_FILES = ('metrics.py', 'middleware.py', 'querywatch.py')
+
+
+def normalize(sql):
+    ''' Форма запроса: литералы и списки параметров заменены на ?. '''
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDERS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _call_site():
+    ''' Шаблон и код проекта, из которых выполнен запрос. '''
+    templates = []
+    code = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        if frame.f_code.co_name == 'render_annotated' and node is not None:
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                templates.append(f'{origin.template_name}:{token.lineno}')
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in filename
+            and not filename.endswith(_SKIP_FILES)
+        ):
+            code.append(
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno} in {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return templates[:3], code[:3]
+
+
+class QueryWatcher:
+    ''' Собирает запросы к базе и группирует их по форме.
+
+    Одинаковые по форме SELECT-запросы, повторённые не меньше
+    ``threshold`` раз за запрос, скорее всего означают N+1.
+    '''
+
+    def __init__(self, threshold=None, slow_ms=None):
+        self.threshold = threshold or settings.QUERY_WATCH_N_PLUS_ONE
+        self.slow_ms = (
+            settings.QUERY_WATCH_SLOW_MS if slow_ms is None else slow_ms
+        )
+        self.shapes = defaultdict(list)
+        self.slow = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (perf_counter() - started) * 1000
+            shape = normalize(sql)
+            calls = self.shapes[shape]
+            # Место вызова нужно только для повторов и медленных запросов.
+            if len(calls) == self.threshold - 1 or duration >= self.slow_ms:
+                site = _call_site()
+            else:
+                site = None
+            calls.append(site)
+            if duration >= self.slow_ms:
+                self.slow.append((duration, sql, site))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def n_plus_one(self):
+        ''' Подозрительные повторы: (форма, число, место вызова). '''
+        return [
+            (shape, len(calls), calls[self.threshold - 1])
+            for shape, calls in self.shapes.items()
+            if shape.startswith('SELECT') and len(calls) >= self.threshold
+        ]
+
+    def log(self, label):
+        for duration, sql, site in self.slow:
+            slow_logger.warning(
+                'slow query %.1f ms in %s: %s at %s',
+                duration, label, sql, site
+            )
+        for shape, count, site in self.n_plus_one():
+            slow_logger.warning(
+                'possible N+1 in %s: %d x %s at %s',
+                label, count, shape, site
+            )
+
+
+class NPlusOneAssertionsMixin:
+    ''' Примесь к TestCase: падает на повторяющихся запросах. '''
+
+    @contextmanager
+    def assertNoNPlusOne(self, threshold=None):
+        with QueryWatcher(threshold=threshold) as watcher:
+            yield watcher
+        suspects = watcher.n_plus_one()
+        if suspects:
+            self.fail('\n'.join(
+                f'{count} x {shape} at {site}'
+                for shape, count, site in suspects
+            ))
@@ -0,0 +1,27 @@
+import sqlite3
+
+from django.conf import settings
+
+
+def replicate_sqlite(source, targets):
+    ''' Копирует файл SQLite в реплики через backup API.
+
+    Заменяет настоящую репликацию при локальной проверке роутера.
+    '''
+    with sqlite3.connect(source) as source_db:
+        for target in targets:
+            target_db = sqlite3.connect(target)
+            try:
+                source_db.backup(target_db)
+            finally:
+                target_db.close()
+
+
+def replicate():
+    ''' Обновляет все DATABASE_REPLICAS из основной базы. '''
+    replica_files = [
+        settings.DATABASES[alias]['NAME']
+        for alias in settings.DATABASE_REPLICAS
+    ]
+    replicate_sqlite(settings.DATABASES['default']['NAME'], replica_files)
+    return replica_files
@@ -0,0 +1,47 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def replica_reads_enabled():
+    return getattr(_state, 'replica_reads', False)
+
+
+def enable_replica_reads(enabled=True):
+    _state.replica_reads = enabled
+
+
+class ReadReplicaRouter:
+    ''' Отправляет чтение из лент на реплики, а запись - в default.
+
+    Реплики используются только пока включены для текущего потока
+    (это делает ReadReplicaMiddleware) и только для моделей из
+    READ_REPLICA_APPS: сессии и пользователи всегда читаются
+    с основной базы.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and replica_reads_enabled()
+            and model._meta.app_label in settings.READ_REPLICA_APPS
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
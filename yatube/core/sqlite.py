@@ -0,0 +1,15 @@
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    ''' Применяет SQLITE_PRAGMAS к каждому новому соединению.
+
+    WAL позволяет читателям не ждать писателя, а busy_timeout
+    заставляет писателей ждать блокировку вместо ошибки
+    "database is locked".
+    '''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
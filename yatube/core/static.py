@@ -0,0 +1,234 @@
+import mimetypes
+import os
+import re
+import stat as stat_module
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.static import was_modified_since
+
+from .compression import SUFFIXES, available, negotiate
+
+# Имя с хешем содержимого от ManifestStaticFilesStorage: name.0123456789ab.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Один диапазон; несколько через запятую не поддерживаются - весь файл.
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def resolve(root, path):
+    ''' Абсолютный путь внутри ``root`` или Http404.
+
+    Скрытые файлы (например, хранилище миниатюр .kvstore.sqlite3
+    в MEDIA_ROOT/cache) не отдаются.
+    '''
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404('Скрытый файл')
+    try:
+        return safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл вне каталога')
+
+
+class OpenFiles:
+    ''' LRU открытых дескрипторов для частых небольших файлов.
+
+    Миниатюры и статика отдаются тысячи раз подряд: вместо open,
+    fstat и close на каждый запрос берётся дубликат уже открытого
+    дескриптора. Файл, подменённый на диске (другие inode, размер
+    или mtime), открывается заново.
+    '''
+
+    def __init__(self, size=None):
+        self.size = size
+        self.hits = self.misses = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path, stat):
+        ''' Новый дескриптор файла; закрывает его вызывающий. '''
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and entry[1] == signature:
+                self._files.move_to_end(path)
+                self.hits += 1
+                return os.dup(entry[0])
+        fd = os.open(path, os.O_RDONLY)
+        size = self.size or settings.OPEN_FILES_CACHE_SIZE
+        with self._lock:
+            self.misses += 1
+            old = self._files.pop(path, None)
+            if old is not None:
+                os.close(old[0])
+            self._files[path] = (fd, signature)
+            while len(self._files) > size:
+                _, (old_fd, _) = self._files.popitem(last=False)
+                os.close(old_fd)
+            return os.dup(fd)
+
+    def clear(self):
+        with self._lock:
+            for fd, _ in self._files.values():
+                os.close(fd)
+            self._files.clear()
+
+
+open_files = OpenFiles()
+
+
+class FileSlice:
+    ''' Байты [offset, offset + length) файла для FileResponse.
+
+    Дескриптор отдаётся серверу через fileno(): gunicorn отправит
+    ровно Content-Length байт с текущей позиции через os.sendfile,
+    не копируя их через процесс. Если сервер читает сам, read идёт
+    через pread и не сдвигает позицию, общую у дубликатов одного
+    дескриптора.
+    '''
+
+    def __init__(self, fd, offset, length):
+        self.fd = fd
+        self.position = offset
+        self.remaining = length
+        os.lseek(fd, offset, os.SEEK_SET)
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b''
+        data = os.pread(self.fd, size, self.position)
+        self.position += len(data)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FileSliceResponse(FileResponse):
+    ''' FileResponse, заголовки которого ставит file_response.
+
+    Своё угадывание заголовков у FileResponse в Django 2.2 читает
+    settings.DEFAULT_CONTENT_TYPE, а это проверка устаревания с
+    разбором стека на каждый ответ.
+    '''
+
+    block_size = 64 * 1024
+
+    def set_headers(self, filelike):
+        pass
+
+
+def open_slice(path, stat, offset, length):
+    ''' Файл для ответа; сервер отправит его через sendfile.
+
+    Небольшие файлы берутся дубликатом дескриптора из LRU. Позиция
+    у дубликатов общая, поэтому так отдаются только ответы с начала
+    файла: все они ставят её в 0, и gunicorn после sendfile
+    возвращает её туда же. Диапазон с середины файла и большие
+    файлы открываются заново, со своей позицией.
+    '''
+    if offset == 0 and stat.st_size <= settings.OPEN_FILES_MAX_BYTES:
+        return FileSlice(open_files.open(path, stat), offset, length)
+    return FileSlice(os.open(path, os.O_RDONLY), offset, length)
+
+
+def byte_range(header, size):
+    ''' Диапазон (начало, конец включительно) из заголовка Range.
+
+    None - отдать файл целиком; ValueError - диапазон за концом
+    файла, ответ 416.
+    '''
+    match = BYTE_RANGE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        if int(end) == 0:
+            raise ValueError('Пустой диапазон')
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if start >= size:
+        raise ValueError('Диапазон за концом файла')
+    end = min(int(end), size - 1) if end else size - 1
+    # Конец раньше начала - заголовок некорректен и не учитывается.
+    return (start, end) if end >= start else None
+
+
+def _precompressed(request, full_path):
+    copies = {
+        encoding: full_path + SUFFIXES[encoding]
+        for encoding in available()
+        if os.path.isfile(full_path + SUFFIXES[encoding])
+    }
+    encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'), copies)
+    return copies.get(encoding, full_path), encoding, bool(copies)
+
+
+def _requested_range(request, size, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and parse_http_date_safe(if_range) != int(mtime):
+        return None
+    return byte_range(request.META.get('HTTP_RANGE'), size)
+
+
+def file_response(request, full_path, cache_control, precompressed=True):
+    ''' Ответ с файлом: условные запросы, Range и сжатые копии.
+
+    Если рядом лежит сжатая копия для принятой клиентом кодировки
+    (.gz, .br от collectstatic), отдаётся она.
+    '''
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404('Файл не найден')
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime,
+        stat.st_size,
+    ):
+        return HttpResponseNotModified()
+    served_path, encoding, varies = (
+        _precompressed(request, full_path) if precompressed
+        else (full_path, None, False)
+    )
+    served = stat if served_path == full_path else os.stat(served_path)
+    try:
+        requested = _requested_range(request, served.st_size, stat.st_mtime)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{served.st_size}'
+        return response
+    start, end = requested or (0, served.st_size - 1)
+    content_type = mimetypes.guess_type(full_path)[0]
+    response = FileSliceResponse(
+        open_slice(served_path, served, start, end - start + 1),
+        content_type=content_type or 'application/octet-stream',
+        status=206 if requested else 200,
+    )
+    response['Content-Length'] = str(end - start + 1)
+    if requested:
+        response['Content-Range'] = f'bytes {start}-{end}/{served.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if varies:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
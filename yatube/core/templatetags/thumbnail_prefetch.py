@@ -0,0 +1,18 @@
+from django import template
+from sorl.thumbnail import default
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, geometry, field='image', **options):
+    ''' Записи о миниатюрах ленты одним запросом вместо запроса на пост.
+
+    Геометрия и опции - те же, что у {% thumbnail %} в цикле ниже.
+    '''
+    prefetch = getattr(default.backend, 'prefetch', None)
+    if prefetch is not None:
+        prefetch(
+            [getattr(post, field) for post in posts], geometry, **options
+        )
+    return ''
@@ -0,0 +1,84 @@
+import logging
+import os
+from time import perf_counter
+
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def warm_templates():
+    ''' Компилирует все шаблоны заранее, чтобы их взял кэширующий загрузчик.
+
+    Возвращает число загруженных шаблонов.
+    '''
+    engine = engines['django'].engine
+    dirs = list(engine.dirs) + list(get_app_template_dirs('templates'))
+    warmed = 0
+    for root_dir in dirs:
+        for path, _, files in os.walk(root_dir):
+            for filename in files:
+                if not filename.endswith(('.html', '.txt')):
+                    continue
+                name = os.path.relpath(
+                    os.path.join(path, filename), root_dir
+                ).replace(os.sep, '/')
+                try:
+                    engine.get_template(name)
+                except TemplateSyntaxError:
+                    logger.exception('Не удалось скомпилировать %s', name)
+                    continue
+                warmed += 1
+    return warmed
+
+
+def _timed(key_func, original):
+    def render(self, context):
+        stats = metrics.current()
+        if stats is None or stats.templates is None:
+            return original(self, context)
+        started = perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            key = key_func(self)
+            stats.templates[key] = (
+                stats.templates.get(key, 0.0) + perf_counter() - started
+            )
+
+    render.profiled = True
+    return render
+
+
+def _node_key(kind):
+    def key(node):
+        origin = getattr(node, 'origin', None)
+        token = getattr(node, 'token', None)
+        name = origin.template_name if origin is not None else '?'
+        line = token.lineno if token is not None else '?'
+        return f'{kind} {name}:{line}'
+    return key
+
+
+def instrument_template_profiling():
+    ''' Время рендеринга по каждому шаблону, {% include %} и {% thumbnail %}.
+
+    Время вложенных узлов входит и во внешние, поэтому суммы по
+    ключам больше общего времени рендеринга.
+    '''
+    from django.template.base import Template
+    from django.template.loader_tags import IncludeNode
+    from sorl.thumbnail.templatetags.thumbnail import ThumbnailNodeBase
+
+    targets = (
+        (Template, lambda template: f'template {template.name}'),
+        (IncludeNode, _node_key('include')),
+        (ThumbnailNodeBase, _node_key('thumbnail')),
+    )
+    for cls, key_func in targets:
+        if getattr(cls.render, 'profiled', False):
+            continue
+        cls.render = _timed(key_func, cls.render)
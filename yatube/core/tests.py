@@ -1,6 +1,49 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Comment, Follow, Post, User
+from posts.seed import seed
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import bench, compression
+from .asgi import WsgiToAsgi
+from .mail import send_queued
+from .metrics import registry
+from .middleware import ReadReplicaMiddleware
+from .models import OutboundEmail
+from .pubsub import Hub
+from .querywatch import QueryWatcher, normalize
+from .replication import replicate_sqlite
+from .routers import (ReadReplicaRouter, enable_replica_reads,
+                      replica_reads_enabled)
+from .static import OpenFiles, byte_range, file_response
+from .thumbnails import SQLiteKVStore, ThumbnailBackend
+from .templating import instrument_template_profiling, warm_templates
 
 
 class CoreViewTest(TestCase):
@@ -9,3 +52,779 @@ class CoreViewTest(TestCase):
         response = self.client.get('/nonexist-page')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class RequestMetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_request_is_measured(self):
+        ''' Запрос попадает в буфер с замерами базы, шаблонов и кэша. '''
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        first, second = registry.snapshot()
+        self.assertEqual(first['view'], 'posts:index')
+        self.assertEqual(first['status'], HTTPStatus.OK)
+        self.assertGreater(first['db_queries'], 0)
+        self.assertGreater(first['template_ms'], 0)
+        self.assertGreater(first['cache_misses'], 0)
+        self.assertEqual(second['db_queries'], 0)
+        self.assertGreater(second['cache_hits'], 0)
+
+    def test_metrics_are_staff_only(self):
+        ''' Замеры доступны только персоналу. '''
+        for name in ('core:metrics', 'core:metrics_prometheus'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_prometheus_export(self):
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('core:metrics_prometheus'))
+        self.assertContains(
+            response, 'yatube_requests_total{view="posts:index"} 1'
+        )
+        response = self.client.get(reverse('core:metrics'))
+        self.assertEqual(
+            response.json()['requests'][0]['view'], 'posts:index'
+        )
+
+
+class QueryWatchTest(TestCase):
+    def test_normalize(self):
+        ''' Запросы, отличающиеся только параметрами, имеют одну форму. '''
+        self.assertEqual(
+            normalize(
+                "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\'"
+            ),
+            normalize('SELECT  *  FROM t WHERE id IN (%s, %s) AND name = 1'),
+        )
+
+    def test_n_plus_one_detected(self):
+        ''' Повторяющийся запрос помечается вместе с местом вызова. '''
+        user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=user, text=str(i)) for i in range(3)
+        )
+        with QueryWatcher(threshold=3) as watcher:
+            for post in Post.objects.all():
+                post.author.username
+        (shape, count, site), = watcher.n_plus_one()
+        self.assertEqual(count, 3)
+        self.assertIn('auth_user', shape)
+        self.assertIn('core/tests.py', site[1][0])
+
+
+class TemplateProfilingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        instrument_template_profiling()
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    @override_settings(TEMPLATE_PROFILING=True)
+    def test_render_time_by_template_and_include(self):
+        ''' Время рендеринга разбито по шаблонам и {% include %}. '''
+        self.client.get(reverse('posts:index'))
+        templates = registry.snapshot()[0]['templates']
+        self.assertIn('template posts/index.html', templates)
+        self.assertIn('template includes/header.html', templates)
+        self.assertIn('include base.html:19', templates)
+
+    def test_profiling_is_off_by_default(self):
+        self.client.get(reverse('posts:index'))
+        self.assertNotIn('templates', registry.snapshot()[0])
+
+    def test_warm_templates(self):
+        ''' Прогрев компилирует шаблоны проекта. '''
+        self.assertGreater(warm_templates(), 0)
+
+
+class BenchTest(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(bench.percentile(values, 50), 50)
+        self.assertEqual(bench.percentile(values, 99), 99)
+        self.assertEqual(bench.percentile([], 95), 0.0)
+
+    def test_compare_reports_regressions(self):
+        ''' Рост числа запросов - регрессия при любом допуске. '''
+        baseline = {'scenarios': {
+            'index': {'p95_ms': 10.0, 'queries_max': 2},
+        }}
+        current = {'scenarios': {
+            'index': {'p95_ms': 11.0, 'queries_max': 3},
+        }}
+        self.assertEqual(
+            bench.compare(baseline, current, tolerance=0.5),
+            ['index: queries_max 2 -> 3'],
+        )
+
+    def test_run_concurrent(self):
+        result = bench.run_concurrent(
+            lambda client, number: HttpResponse(
+                status=HTTPStatus.NOT_FOUND if number == 3 else HTTPStatus.OK
+            ),
+            total=6,
+            concurrency=2,
+        )
+        self.assertEqual(result['requests'], 6)
+        self.assertEqual(result['errors'], 1)
+
+    def test_seed_and_scenarios(self):
+        ''' Все сценарии отрабатывают на синтетических данных. '''
+        data = seed(users=5, groups=2, posts=20, follows=6, comments=10)
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Follow.objects.count(), 6)
+        self.assertEqual(Comment.objects.count(), 10)
+        for name, scenario in bench.autodiscover().items():
+            with self.subTest(name=name):
+                client = Client()
+                if scenario.job:
+                    result = scenario(data, {'rows': 40})
+                    self.assertTrue(result)
+                    for key, value in result.items():
+                        self.assertGreaterEqual(value, 0, key)
+                    if 'rows' in result:
+                        self.assertEqual(result['rows'], 40)
+                    continue
+                if scenario.login:
+                    client.force_login(data.users[0])
+                response = scenario(data)(client, 1)
+                self.assertLess(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class SqliteTuningTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        ''' Новое соединение получает настройки из SQLITE_PRAGMAS. '''
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            # 1 - NORMAL.
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReadReplicaTest(TestCase):
+    def tearDown(self):
+        enable_replica_reads(False)
+
+    def test_router_reads_feeds_from_replica(self):
+        ''' С реплики читаются только модели лент и только по флагу. '''
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        enable_replica_reads()
+        self.assertEqual(router.db_for_read(Post), 'replica1')
+        self.assertIsNone(router.db_for_read(Session))
+        self.assertIsNone(router.db_for_read(User))
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+
+    def run_middleware(self, request, view_name):
+        seen = []
+
+        def get_response(request):
+            seen.append(replica_reads_enabled())
+            return HttpResponse()
+
+        middleware = ReadReplicaMiddleware(get_response)
+        request.resolver_match = type('Match', (), {'view_name': view_name})
+        middleware.process_view(request, None, (), {})
+        response = middleware(request)
+        self.assertFalse(replica_reads_enabled())
+        return seen[0], response
+
+    def test_middleware_routes_feed_views(self):
+        factory = RequestFactory()
+        enabled, _ = self.run_middleware(factory.get('/'), 'posts:index')
+        self.assertTrue(enabled)
+        enabled, _ = self.run_middleware(
+            factory.get('/create/'), 'posts:post_create'
+        )
+        self.assertFalse(enabled)
+
+    def test_write_pins_reader_to_primary(self):
+        ''' После записи автор какое-то время читает с основной базы. '''
+        factory = RequestFactory()
+        _, response = self.run_middleware(
+            factory.post('/posts/1/comment/'), 'posts:add_comment'
+        )
+        cookie = response.cookies['pin_primary']
+        request = factory.get('/')
+        request.COOKIES['pin_primary'] = cookie.value
+        enabled, _ = self.run_middleware(request, 'posts:index')
+        self.assertFalse(enabled)
+
+    def test_replicate_sqlite(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, 'db.sqlite3')
+            replica = os.path.join(temp_dir, 'replica.sqlite3')
+            with sqlite3.connect(source) as db:
+                db.execute('CREATE TABLE t (value INTEGER)')
+                db.execute('INSERT INTO t VALUES (1)')
+            replicate_sqlite(source, [replica])
+            with sqlite3.connect(replica) as db:
+                self.assertEqual(
+                    db.execute('SELECT value FROM t').fetchall(), [(1,)]
+                )
+
+
+class HubTest(TestCase):
+    def test_publish_fans_out_to_subscribers(self):
+        ''' Одно сообщение доходит до всех подписчиков канала. '''
+        hub = Hub()
+        first, second = hub.subscribe('a'), hub.subscribe('a')
+        other = hub.subscribe('b')
+        self.assertEqual(hub.publish('a', 'message'), 2)
+        self.assertEqual(first.get(timeout=0), 'message')
+        self.assertEqual(second.get(timeout=0), 'message')
+        self.assertIsNone(other.get(timeout=0))
+        first.close()
+        second.close()
+        self.assertEqual(hub.subscribers('a'), 0)
+
+    def test_slow_subscriber_is_dropped(self):
+        ''' Подписчик с полной очередью отключается, рассылка не ждёт. '''
+        hub = Hub(maxsize=1)
+        with hub.subscribe('a') as subscription:
+            hub.publish('a', 1)
+            self.assertEqual(hub.publish('a', 2), 0)
+            self.assertTrue(subscription.dropped)
+            self.assertEqual(hub.subscribers('a'), 0)
+
+
+class WsgiToAsgiTest(TestCase):
+    def call(self, application, scope, messages):
+        sent = []
+        messages = list(messages)
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        return sent
+
+    def test_request_runs_django(self):
+        ''' Ответ Django уходит как http.response.start и тело. '''
+        application = WsgiToAsgi(get_wsgi_application(), 1)
+        self.addCleanup(application.shutdown)
+        sent = self.call(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/nonexist-page/',
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+        }, [{'type': 'http.request', 'body': b''}])
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertEqual(sent[0]['status'], HTTPStatus.NOT_FOUND)
+        self.assertIn(b'text/html', dict(sent[0]['headers'])[b'content-type'])
+        self.assertEqual(sent[-1], {'type': 'http.response.body', 'body': b''})
+        self.assertTrue(b''.join(m.get('body', b'') for m in sent[1:]))
+
+    def test_streams_do_not_hold_request_pool(self):
+        ''' Ждущий поток не занимает пул запросов, лишний - 503. '''
+        release = threading.Event()
+
+        class Stream:
+            streaming = True
+
+            def __iter__(self):
+                yield b'retry: 1\n\n'
+                release.wait(5)
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            if environ['PATH_INFO'] == '/stream/':
+                return Stream()
+            return [b'page']
+
+        application = WsgiToAsgi(wsgi_application, 1, 1)
+        self.addCleanup(application.shutdown)
+
+        async def request(path):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                sent.append(message)
+
+            await application({
+                'type': 'http', 'method': 'GET', 'path': path,
+                'query_string': b'', 'headers': [],
+            }, receive, send)
+            return sent
+
+        async def scenario():
+            stream = asyncio.ensure_future(request('/stream/'))
+            while not application.streams:
+                await asyncio.sleep(0.01)
+            page = await asyncio.wait_for(request('/page/'), 2)
+            refused = await asyncio.wait_for(request('/stream/'), 2)
+            release.set()
+            return page, refused, await stream
+
+        page, refused, stream = asyncio.run(scenario())
+        self.assertEqual(page[1]['body'], b'page')
+        self.assertEqual(
+            refused[0]['status'], HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(stream[1]['body'], b'retry: 1\n\n')
+        self.assertEqual(application.streams, 0)
+
+    def test_environ_headers(self):
+        environ = WsgiToAsgi.environ({
+            'method': 'POST',
+            'path': '/create/',
+            'query_string': b'a=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+            ],
+        }, b'body')
+        self.assertEqual(environ['PATH_INFO'], '/create/')
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+        self.assertEqual(environ['wsgi.input'].read(), b'body')
+
+    def test_environ_path_is_decoded(self):
+        ''' PATH_INFO строится из раскодированного пути, как в PEP 3333. '''
+        environ = WsgiToAsgi.environ({
+            'method': 'GET',
+            'path': '/tag/тег/',
+            'raw_path': b'/tag/%D1%82%D0%B5%D0%B3/',
+            'query_string': b'',
+        }, b'')
+        self.assertEqual(
+            environ['PATH_INFO'], '/tag/тег/'.encode().decode('latin-1')
+        )
+
+    def test_lifespan(self):
+        application = WsgiToAsgi(get_wsgi_application(), 1)
+        sent = self.call(application, {'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'},
+        ])
+        self.assertEqual(
+            [message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('core.compression.brotli', None)
+    def test_negotiate(self):
+        ''' Accept-Encoding сводится к поддерживаемой кодировке. '''
+        self.assertEqual(compression.negotiate('gzip, deflate, br'), 'gzip')
+        self.assertEqual(compression.negotiate('*'), 'gzip')
+        self.assertIsNone(compression.negotiate('gzip;q=0, deflate'))
+        self.assertIsNone(compression.negotiate('identity'))
+        self.assertIsNone(compression.negotiate(None))
+
+    def test_gzip_is_reproducible(self):
+        ''' Одинаковое тело сжимается в одинаковые байты. '''
+        data = 'Тестовый пост '.encode() * 50
+        compressed = compression.compress(data, 'gzip')
+        self.assertEqual(compression.compress(data, 'gzip'), compressed)
+        self.assertEqual(compressed[4:8], bytes(4))
+        self.assertEqual(gzip.decompress(compressed), data)
+
+    @mock.patch('core.compression.brotli', None)
+    def test_cached_page_is_compressed_once(self):
+        ''' Попадания в кэш страницы не сжимают её заново. '''
+        Post.objects.create(
+            author=User.objects.create_user(username='auth'),
+            text='Тестовый пост ' * 50,
+        )
+        client = Client(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        with mock.patch(
+            'core.compression.compress', wraps=compression.compress
+        ) as compress:
+            first = client.get(reverse('posts:index'))
+            second = client.get(reverse('posts:index'))
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', first['Vary'])
+        self.assertEqual(first.content, second.content)
+        plain = Client().get(reverse('posts:index'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+
+    def test_compress_file_skips_incompressible(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text = os.path.join(temp_dir, 'style.css')
+            noise = os.path.join(temp_dir, 'logo.png')
+            with open(text, 'w') as file:
+                file.write('.card { margin: 0; }\n' * 100)
+            with open(noise, 'wb') as file:
+                file.write(os.urandom(1000))
+            self.assertIn('gzip', compression.compress_file(text, 0.9))
+            self.assertEqual(compression.compress_file(noise, 0.9), [])
+            self.assertTrue(os.path.exists(text + '.gz'))
+            self.assertFalse(os.path.exists(noise + '.gz'))
+
+
+class StaticFilesTest(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as file:
+            file.write('.card { margin: 0; }\n' * 100)
+
+    def collect(self):
+        os.makedirs(os.path.join(self.root, 'css'))
+        shutil.copy(
+            os.path.join(self.source, 'css', 'site.css'),
+            os.path.join(self.root, 'css', 'site.css'),
+        )
+        storage = ManifestStaticFilesStorage(location=self.root)
+        source = FileSystemStorage(location=self.source)
+        paths = {'css/site.css': (source, 'css/site.css')}
+        list(storage.post_process(paths))
+        with override_settings(STATIC_ROOT=self.root):
+            call_command('compress_static', stdout=io.StringIO())
+        return ManifestStaticFilesStorage(location=self.root)
+
+    def test_collect_hashes_and_compresses(self):
+        ''' collectstatic пишет файл с хешем, compress_static - копию. '''
+        storage = self.collect()
+        name = storage.stored_name('css/site.css')
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(storage.path(name) + '.gz'))
+
+    def test_missing_manifest_fails_loudly(self):
+        ''' Без манифеста или файла в нём адрес не строится. '''
+        with self.assertRaises(ValueError):
+            ManifestStaticFilesStorage(location=self.root).stored_name(
+                'css/site.css'
+            )
+        with self.assertRaises(ValueError):
+            self.collect().stored_name('css/none.css')
+
+    def test_serve_hashed_file(self):
+        ''' Файл с хешем - immutable и сжатая копия по Accept-Encoding. '''
+        name = self.collect().stored_name('css/site.css')
+        url = reverse('static_file', args=[name])
+        with override_settings(STATIC_SERVE=True, STATIC_ROOT=self.root):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            plain = self.client.get(
+                reverse('static_file', args=['css/site.css'])
+            )
+            outside = self.client.get(
+                reverse('static_file', args=['../secret'])
+            )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b'.card { margin: 0; }\n' * 100,
+        )
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(outside.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_static_serving_is_off_by_default(self):
+        response = self.client.get(reverse('static_file', args=['x.css']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_favicon_redirect(self):
+        response = self.client.get('/favicon.ico')
+        self.assertRedirects(
+            response, '/static/img/fav/fav.ico',
+            fetch_redirect_response=False,
+        )
+
+
+class MediaFilesTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.data = bytes(range(256)) * 4
+        with open(os.path.join(self.root, 'small.jpg'), 'wb') as file:
+            file.write(self.data)
+        self.url = reverse('media_file', args=['small.jpg'])
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_byte_range(self):
+        self.assertEqual(byte_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(byte_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(byte_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(byte_range('bytes=990-2000', 1000), (990, 999))
+        self.assertIsNone(byte_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(byte_range('bytes=5-1', 1000))
+        self.assertIsNone(byte_range(None, 1000))
+        with self.assertRaises(ValueError):
+            byte_range('bytes=1000-', 1000)
+
+    def test_full_and_partial_content(self):
+        ''' Файл целиком, диапазон и диапазон за концом файла. '''
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.data[10:20]
+        )
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_conditional_requests(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='Wed, 21 Oct 2015 07:28:00 GMT',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(OPEN_FILES_MAX_BYTES=100)
+    def test_large_file_is_sent_by_fileno(self):
+        ''' Крупный файл отдаётся серверу своим дескриптором для sendfile. '''
+        request = RequestFactory().get(self.url, HTTP_RANGE='bytes=1000-')
+        response = file_response(
+            request, os.path.join(self.root, 'small.jpg'), 'public'
+        )
+        file = response.file_to_stream
+        self.assertEqual(os.lseek(file.fileno(), 0, os.SEEK_CUR), 1000)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.data[1000:]
+        )
+        response.close()
+
+    def test_hot_file_is_sent_by_fileno(self):
+        ''' Частый файл отдаётся дубликатом дескриптора из LRU. '''
+        files = OpenFiles()
+        path = os.path.join(self.root, 'small.jpg')
+        request = RequestFactory().get(self.url)
+        with mock.patch('core.static.open_files', files):
+            for _ in range(2):
+                response = file_response(request, path, 'public')
+                file = response.file_to_stream
+                self.assertEqual(os.lseek(file.fileno(), 0, os.SEEK_CUR), 0)
+                self.assertEqual(
+                    b''.join(response.streaming_content), self.data
+                )
+                response.close()
+        self.assertEqual((files.hits, files.misses), (1, 1))
+        files.clear()
+
+    def test_open_files_lru(self):
+        ''' Дескриптор переиспользуется, подменённый файл - открывается. '''
+        files = OpenFiles(size=1)
+        path = os.path.join(self.root, 'small.jpg')
+        for _ in range(3):
+            os.close(files.open(path, os.stat(path)))
+        self.assertEqual((files.hits, files.misses), (2, 1))
+        with open(path, 'wb') as file:
+            file.write(b'new')
+        fd = files.open(path, os.stat(path))
+        self.assertEqual(os.pread(fd, 10, 0), b'new')
+        os.close(fd)
+        self.assertEqual(files.misses, 2)
+        files.clear()
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ThumbnailStoreTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.post = Post.objects.create(
+            author=User.objects.create_user(username='auth'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def patch_store(self, store):
+        patcher = mock.patch('sorl.thumbnail.default.kvstore', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_store_in_media_cache(self):
+        ''' Записи лежат в файле рядом с миниатюрами и переживают процесс. '''
+        store = SQLiteKVStore()
+        self.patch_store(store)
+        thumbnail = get_thumbnail(self.post.image, '960x339', crop='center')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'cache', '.kvstore.sqlite3')
+        ))
+        fresh = SQLiteKVStore()
+        self.assertEqual(fresh.get(thumbnail).size, thumbnail.size)
+        fresh.delete(ImageFile(self.post.image))
+        self.assertIsNone(SQLiteKVStore().get(thumbnail))
+
+    def test_prefetch_resolves_page_in_one_query(self):
+        ''' После prefetch {% thumbnail %} не обращается к файлу хранилища. '''
+        self.patch_store(SQLiteKVStore())
+        options = {'crop': 'center', 'upscale': True}
+        expected = get_thumbnail(self.post.image, '960x339', **options)
+        store = SQLiteKVStore()
+        self.patch_store(store)
+        backend = ThumbnailBackend()
+        found = backend.prefetch(
+            [self.post.image, None, ''], '960x339', **options
+        )
+        self.assertEqual(found, 1)
+        with mock.patch.object(
+            store, '_connection', side_effect=AssertionError
+        ):
+            thumbnail = backend.get_thumbnail(
+                self.post.image, '960x339', **options
+            )
+        self.assertEqual(thumbnail.url, expected.url)
+
+    def test_hidden_files_are_not_served(self):
+        response = self.client.get(
+            reverse('media_file', args=['cache/.kvstore.sqlite3'])
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    EMAIL_QUEUE_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            username='auth', email='auth@example.com', password='secret'
+        )
+
+    def test_password_reset_is_queued(self):
+        ''' Сброс пароля только ставит письмо в очередь. '''
+        self.client.post(
+            reverse('users:password_reset'), {'email': 'auth@example.com'}
+        )
+        self.assertEqual(mail.outbox, [])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(json.loads(email.recipients), ['auth@example.com'])
+        out = io.StringIO()
+        call_command('send_queued_mail', stdout=out)
+        self.assertIn('Отправлено писем: 1, с ошибкой: 0', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_batch_shares_connection(self):
+        ''' Пачка писем уходит через одно соединение, в файл. '''
+        mail.send_mass_mail([
+            (f'Subject {number}', f'Текст {number}', None, ['a@example.com'])
+            for number in range(3)
+        ])
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with override_settings(
+            EMAIL_QUEUE_BACKEND=(
+                'django.core.mail.backends.filebased.EmailBackend'
+            ),
+            EMAIL_FILE_PATH=root,
+        ):
+            self.assertEqual(send_queued(batch_size=2), (3, 0))
+        contents = []
+        for name in os.listdir(root):
+            with open(os.path.join(root, name), 'rb') as file:
+                contents.append(file.read().decode())
+        self.assertEqual(
+            sorted(content.count('Subject: ') for content in contents),
+            [1, 2],
+        )
+        self.assertIn('Текст 1', ''.join(contents))
+
+    def test_failed_email_is_retried(self):
+        ''' Ошибка откладывает письмо, после лимита попыток - стоп. '''
+        mail.send_mail('Subject', 'Текст', None, ['a@example.com'])
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=ConnectionError('down'),
+        ), override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2):
+            self.assertEqual(send_queued(), (0, 1))
+            email = OutboundEmail.objects.get()
+            self.assertEqual(email.attempts, 1)
+            self.assertIn('down', email.last_error)
+            self.assertEqual(send_queued(), (0, 0))
+            OutboundEmail.objects.update(next_attempt=timezone.now())
+            self.assertEqual(send_queued(), (0, 1))
+        self.assertIsNone(OutboundEmail.objects.get().next_attempt)
+        self.assertEqual(send_queued(), (0, 0))
+
+    def test_claimed_email_is_not_sent_twice(self):
+        ''' Письмо, взятое другим отправителем после чтения, не уходит. '''
+        mail.send_mail('Subject', 'Текст', None, ['a@example.com'])
+        atomic = transaction.atomic
+
+        @contextmanager
+        def claimed_by_other():
+            OutboundEmail.objects.update(
+                next_attempt=timezone.now() + timedelta(minutes=5)
+            )
+            with atomic():
+                yield
+
+        with mock.patch('core.mail.transaction.atomic', claimed_by_other):
+            self.assertEqual(send_queued(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_reopen_failure_fails_rest_of_batch(self):
+        ''' Если соединение не переоткрылось, остаток пачки ждёт повтора. '''
+        for number in range(3):
+            mail.send_mail(f'Subject {number}', 'Текст', None, ['a@b.c'])
+        backend = 'django.core.mail.backends.locmem.EmailBackend'
+        with mock.patch(
+            f'{backend}.send_messages', side_effect=ConnectionError('down'),
+        ), mock.patch(
+            f'{backend}.open', side_effect=[None, ConnectionError('gone')],
+        ):
+            self.assertEqual(send_queued(), (0, 3))
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('last_error', flat=True)),
+            ['ConnectionError: down'] + ['ConnectionError: gone'] * 2,
+        )
@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+# Переменных в одном запросе IN (...): предел старых сборок SQLite - 999.
+IN_CHUNK = 500
+
+
+class SQLiteKVStore(KVStoreBase):
+    ''' Хранилище sorl-thumbnail в локальном файле SQLite с LRU в памяти.
+
+    Вместо кэша Django и таблицы в основной базе: после сброса кэша
+    записи о миниатюрах не теряются и не превращаются в запросы к
+    базе и проверки exists() на каждой картинке. Файл лежит рядом с
+    миниатюрами (MEDIA_ROOT/cache) и уходит вместе с ними. Записи
+    в LRU живут THUMBNAIL_KVSTORE_LRU_SECONDS: так до процесса
+    доходит очистка хранилища командой thumbnail из другого процесса.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return django_settings.THUMBNAIL_KVSTORE_PATH or os.path.join(
+            django_settings.MEDIA_ROOT, 'cache', '.kvstore.sqlite3'
+        )
+
+    def _connection(self):
+        path = self.path
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        connection = self._local.connections.get(path)
+        if connection is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(
+                path, timeout=20, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS kvstore '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID'
+            )
+            self._local.connections[path] = connection
+        return connection
+
+    def _remember(self, path, values):
+        expires = (
+            time.monotonic() + django_settings.THUMBNAIL_KVSTORE_LRU_SECONDS
+        )
+        size = django_settings.THUMBNAIL_KVSTORE_LRU_SIZE
+        with self._lock:
+            for key, value in values.items():
+                self._lru[(path, key)] = (value, expires)
+                self._lru.move_to_end((path, key))
+            while len(self._lru) > size:
+                self._lru.popitem(last=False)
+
+    def _cached(self, path, key):
+        with self._lock:
+            entry = self._lru.get((path, key))
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._lru[(path, key)]
+                return None
+            self._lru.move_to_end((path, key))
+            return entry[0]
+
+    def _get_raw(self, key):
+        path = self.path
+        value = self._cached(path, key)
+        if value is None:
+            value = self.get_many_raw([key]).get(key)
+        return value
+
+    def get_many_raw(self, keys):
+        ''' Значения ключей: из LRU, остальные - запросом на пачку. '''
+        path = self.path
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._cached(path, key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        loaded = {}
+        for start in range(0, len(missing), IN_CHUNK):
+            chunk = missing[start:start + IN_CHUNK]
+            loaded.update(self._connection().execute(
+                'SELECT key, value FROM kvstore WHERE key IN '
+                f'({", ".join("?" * len(chunk))})',
+                chunk,
+            ))
+        self._remember(path, loaded)
+        found.update(loaded)
+        return found
+
+    def _set_raw(self, key, value):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            (key, value),
+        )
+        self._remember(self.path, {key: value})
+
+    def _delete_raw(self, *keys):
+        path = self.path
+        with self._lock:
+            for key in keys:
+                self._lru.pop((path, key), None)
+        for start in range(0, len(keys), IN_CHUNK):
+            chunk = keys[start:start + IN_CHUNK]
+            self._connection().execute(
+                'DELETE FROM kvstore WHERE key IN '
+                f'({", ".join("?" * len(chunk))})',
+                chunk,
+            )
+
+    def _find_keys_raw(self, prefix):
+        return [key for key, in self._connection().execute(
+            'SELECT key FROM kvstore WHERE key >= ? AND key < ?',
+            (prefix, prefix + '\U0010ffff'),
+        )]
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    ''' Бэкенд sorl-thumbnail с пакетной загрузкой записей хранилища. '''
+
+    def _options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail: от них
+        # зависит имя файла миниатюры.
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def prefetch(self, files, geometry_string, **options):
+        ''' Загружает записи о миниатюрах всех файлов одним запросом.
+
+        Следующие {% thumbnail %} с той же геометрией и опциями
+        находят записи в LRU хранилища. Возвращает число найденных.
+        '''
+        get_many_raw = getattr(default.kvstore, 'get_many_raw', None)
+        if get_many_raw is None:
+            return 0
+        keys = []
+        for file_ in files:
+            if not file_:
+                continue
+            source = ImageFile(file_)
+            name = self._get_thumbnail_filename(
+                source, geometry_string,
+                self._options(source, dict(options)),
+            )
+            keys.append(add_prefix(ImageFile(name, default.storage).key))
+        return len(get_many_raw(keys)) if keys else 0
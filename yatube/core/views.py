@@ -1,6 +1,14 @@
 from http import HTTPStatus
 
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+from django.templatetags.static import static
+from django.utils.cache import patch_cache_control
+
+from . import metrics
+from .static import HASHED_NAME, IMMUTABLE, file_response, resolve
 
 
 def page_not_found(request, exception):
@@ -29,3 +37,52 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def favicon(request):
+    ''' /favicon.ico, который браузеры запрашивают сами, без <link>. '''
+    response = redirect(static('img/fav/fav.ico'))
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24)
+    return response
+
+
+def media_file(request, path):
+    ''' Загруженные картинки и миниатюры sorl из MEDIA_ROOT. '''
+    if not settings.MEDIA_SERVE:
+        raise Http404('Медиафайлы отдаёт веб-сервер')
+    return file_response(
+        request,
+        resolve(settings.MEDIA_ROOT, path),
+        f'public, max-age={settings.MEDIA_MAX_AGE}',
+        precompressed=False,
+    )
+
+
+@staff_member_required
+def metrics_recent(request):
+    ''' Последние запросы из кольцевого буфера. '''
+    return JsonResponse({'requests': metrics.registry.snapshot()})
+
+
+@staff_member_required
+def metrics_prometheus(request):
+    return HttpResponse(
+        metrics.registry.prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def static_file(request, path):
+    ''' Статика из STATIC_ROOT для развёртываний без nginx.
+
+    Файлы с хешем в имени кэшируются клиентами навсегда (immutable),
+    остальные - на STATIC_MAX_AGE секунд.
+    '''
+    if not settings.STATIC_SERVE:
+        raise Http404('Статику отдаёт веб-сервер')
+    full_path = resolve(settings.STATIC_ROOT, path)
+    if HASHED_NAME.search(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+    return file_response(request, full_path, cache_control)
@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .trending import register_sqlite_functions
+
+        connection_created.connect(register_sqlite_functions)
+
+        # Граф подписок (FOLLOW_GRAPH_ENABLED) загружается при первом
+        # обращении: на новой базе таблицы подписок ещё нет.
+        if settings.COMMENT_BUFFER_ENABLED:
+            from .comment_buffer import comment_buffer
+            comment_buffer.start()
+        if settings.NOTIFICATION_BUFFER_ENABLED:
+            from .notifications import notification_buffer
+            notification_buffer.start()
+        if settings.CACHE_WARMUP_ON_STARTUP:
+            from .warmup import start_background_warmup
+            start_background_warmup()
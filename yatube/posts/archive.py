@@ -0,0 +1,89 @@
+import json
+import logging
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+
+class _Pipe:
+    ''' Поток для ZipFile, из которого генератор забирает готовые байты.
+
+    У него нет tell() и seek(), поэтому zipfile пишет архив
+    последовательно, с дескрипторами данных после каждого файла.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _post_record(post):
+    return {
+        'id': post['id'],
+        'text': post['text'],
+        'pub_date': post['pub_date'].isoformat(),
+        'group': post['group__slug'],
+        'image': f'images/{post["image"]}' if post['image'] else None,
+    }
+
+
+def stream_archive(author):
+    ''' ZIP-архив постов автора: posts.json и исходные картинки.
+
+    Посты читаются из базы порциями по ARCHIVE_CHUNK_SIZE, файлы -
+    кусками по ARCHIVE_FILE_CHUNK байт, и каждый кусок сразу уходит
+    клиенту, так что память не растёт с размером архива.
+    '''
+    pipe = _Pipe()
+    posts = author.posts.order_by('pub_date', 'id')
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('posts.json', 'w') as file:
+            file.write(b'[')
+            separator = b'\n'
+            for post in posts.values(
+                'id', 'text', 'pub_date', 'group__slug', 'image'
+            ).iterator(chunk_size=settings.ARCHIVE_CHUNK_SIZE):
+                file.write(separator + json.dumps(
+                    _post_record(post), ensure_ascii=False
+                ).encode())
+                separator = b',\n'
+                yield pipe.drain()
+            file.write(b'\n]\n')
+        yield pipe.drain()
+        for image in posts.exclude(image='').values_list(
+            'image', flat=True
+        ).iterator(chunk_size=settings.ARCHIVE_CHUNK_SIZE):
+            yield from _stream_file(archive, pipe, image)
+    yield pipe.drain()
+
+
+def _stream_file(archive, pipe, name):
+    try:
+        source = default_storage.open(name, 'rb')
+    except OSError:
+        logger.warning('Нет файла картинки %s для архива', name)
+        return
+    info = zipfile.ZipInfo(f'images/{name}')
+    # Картинки уже сжаты: повторное сжатие только тратит процессор.
+    info.compress_type = zipfile.ZIP_STORED
+    with source, archive.open(info, 'w', force_zip64=True) as file:
+        while True:
+            chunk = source.read(settings.ARCHIVE_FILE_CHUNK)
+            if not chunk:
+                break
+            file.write(chunk)
+            yield pipe.drain()
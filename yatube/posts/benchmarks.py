@@ -0,0 +1,350 @@
+import json
+import math
+import os
+import random
+import resource
+import tempfile
+import threading
+import tracemalloc
+from collections import defaultdict
+from time import perf_counter
+
+from core.bench import register
+from django.db import DatabaseError, connection
+from django.db.models import Max
+from django.urls import reverse
+
+from .bulk import Importer, read_records
+from .graph import FollowGraphIndex, build_snapshot
+from .live import latest_cursor
+from .models import Comment, Follow, Mention, Post, PostTag
+from .recommendations import FollowGraph, SparseFollowGraph, sparse
+from .tags import reindex
+
+
+@register('index')
+def index(data):
+    def request(client, number):
+        page = number % 3 + 1
+        return client.get(reverse('posts:index'), {'page': page})
+    return request
+
+
+@register('follow_index', login=True)
+def follow_index(data):
+    def request(client, number):
+        return client.get(reverse('posts:follow_index'))
+    return request
+
+
+@register('group_posts')
+def group_posts(data):
+    def request(client, number):
+        group = data.groups[number % len(data.groups)]
+        return client.get(
+            reverse('posts:group_posts', kwargs={'slug': group.slug})
+        )
+    return request
+
+
+@register('groups_feed')
+def groups_feed(data):
+    slugs = ','.join(group.slug for group in data.groups[:3])
+
+    def request(client, number):
+        return client.get(reverse('posts:groups_feed'), {'slug': slugs})
+    return request
+
+
+@register('profile')
+def profile(data):
+    def request(client, number):
+        user = data.users[number % len(data.users)]
+        return client.get(
+            reverse('posts:profile', kwargs={'username': user.username})
+        )
+    return request
+
+
+@register('trending')
+def trending(data):
+    def request(client, number):
+        return client.get(reverse('posts:trending'))
+    return request
+
+
+@register('new_posts')
+def new_posts(data):
+    ''' Опрос без новых постов: обычный случай для открытой ленты. '''
+    cursor = latest_cursor()
+
+    def request(client, number):
+        return client.get(reverse('posts:new_posts'), {'after': cursor})
+    return request
+
+
+@register('post_detail')
+def post_detail(data):
+    def request(client, number):
+        post_id = data.post_ids[number % len(data.post_ids)]
+        return client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+        )
+    return request
+
+
+@register('post_create', login=True)
+def post_create(data):
+    def request(client, number):
+        return client.post(
+            reverse('posts:post_create'),
+            {'text': f'Нагрузочный пост {number}'},
+        )
+    return request
+
+
+@register('add_comment', login=True)
+def add_comment(data):
+    def request(client, number):
+        post_id = data.post_ids[number % len(data.post_ids)]
+        return client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post_id}),
+            {'text': f'Нагрузочный комментарий {number}'},
+        )
+    return request
+
+
+@register('reads_during_writes')
+def reads_during_writes(data):
+    ''' Чтение страниц поста, пока отдельный поток пишет комментарии. '''
+    stop = threading.Event()
+    writes = {'writes': 0, 'write_errors': 0}
+
+    def writer():
+        try:
+            while not stop.is_set():
+                try:
+                    Comment.objects.create(
+                        post_id=data.post_ids[writes['writes'] % len(
+                            data.post_ids
+                        )],
+                        author=data.users[0],
+                        text='Фоновая запись',
+                    )
+                    writes['writes'] += 1
+                except DatabaseError:
+                    writes['write_errors'] += 1
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+
+    def request(client, number):
+        post_id = data.post_ids[number % len(data.post_ids)]
+        return client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+        )
+
+    def close():
+        stop.set()
+        thread.join()
+        return writes
+
+    request.close = close
+    return request
+
+
+@register('import_posts', job=True, rows=1000000)
+def import_posts(data, options):
+    ''' Загрузка ``--rows`` записей NDJSON через import_posts.
+
+    Примерно 80% записей - посты, 15% - комментарии, 5% - подписки.
+    '''
+    rows = options['rows']
+    usernames = [user.username for user in data.users]
+    slugs = [group.slug for group in data.groups]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'import.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            posts = 0
+            for number in range(rows):
+                author = usernames[number % len(usernames)]
+                if number % 20 == 19:
+                    record = {
+                        'model': 'follow',
+                        'user': author,
+                        'author': usernames[number * 7 % len(usernames)],
+                    }
+                elif number % 20 >= 16 and posts:
+                    record = {
+                        'model': 'comment',
+                        'post': number % posts + 1,
+                        'author': author,
+                        'text': f'Импортированный комментарий {number}',
+                    }
+                else:
+                    posts += 1
+                    record = {
+                        'model': 'post',
+                        'id': posts,
+                        'author': author,
+                        'group': slugs[number % len(slugs)],
+                        'text': f'Импортированный пост {number}',
+                        'pub_date': '2022-01-01T00:00:00+00:00',
+                    }
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        started = perf_counter()
+        with open(path, encoding='utf-8') as file:
+            imported = Importer().load(read_records(file, 'ndjson'))
+        elapsed = perf_counter() - started
+    return {
+        'rows': imported,
+        'elapsed_s': round(elapsed, 2),
+        'rows_per_s': round(imported / elapsed) if elapsed else 0,
+        # На Linux - в килобайтах.
+        'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+@register('tag_index', job=True)
+def tag_index(data, options):
+    ''' Разбор хештегов и упоминаний при загрузке ``--rows`` постов.
+
+    В каждом посте три хештега из двухсот и упоминание автора из
+    seed. Загрузка идёт через Importer без индексации, затем индекс
+    строится отдельно, как в after_bulk_load: так видна его доля во
+    времени загрузки.
+    '''
+    rows = options['rows']
+    rnd = random.Random(0)
+    usernames = [user.username for user in data.users]
+    records = [
+        {
+            'model': 'post',
+            'id': number + 1,
+            'author': usernames[number % len(usernames)],
+            'text': ' '.join(
+                [f'Пост {number} для @{rnd.choice(usernames)}']
+                + [f'#тема{rnd.randrange(200)}' for _ in range(3)]
+            ),
+        }
+        for number in range(rows)
+    ]
+    last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+    started = perf_counter()
+    Importer(index=False).load(records)
+    load_s = perf_counter() - started
+    loaded = Post.objects.filter(id__gt=last_id)
+    started = perf_counter()
+    reindex(loaded, new=True)
+    index_s = perf_counter() - started
+    return {
+        'rows': rows,
+        'load_s': round(load_s, 2),
+        'index_s': round(index_s, 2),
+        'index_share': round(index_s / (load_s + index_s), 3),
+        'rows_per_s': round(rows / index_s) if index_s else 0,
+        'post_tags': PostTag.objects.filter(post__in=loaded).count(),
+        'mentions': Mention.objects.filter(post__in=loaded).count(),
+    }
+
+
+def _per_call_us(func, calls):
+    started = perf_counter()
+    for args in calls:
+        func(*args)
+    return round((perf_counter() - started) / len(calls) * 1e6, 2)
+
+
+def _synthetic_edges(rows, rnd):
+    # Не меньше sqrt(rows) узлов, иначе различных рёбер не хватит.
+    nodes = max(int(math.sqrt(rows)) + 2, rows // 20)
+    edges = set()
+    while len(edges) < rows:
+        # Половина подписок - на немногих популярных авторов.
+        author = (
+            int(rnd.paretovariate(1.2)) % nodes if rnd.random() < 0.5
+            else rnd.randrange(nodes)
+        )
+        edges.add((rnd.randrange(nodes), author))
+    return nodes, edges
+
+
+@register('follow_graph', job=True)
+def follow_graph(data, options):
+    ''' Снимок графа подписок на ``--rows`` синтетических рёбрах.
+
+    Память на ребро сравнивается со словарём множеств, время
+    запросов к индексу - с запросом к базе на подписках из seed.
+    '''
+    rnd = random.Random(0)
+    nodes, edges = _synthetic_edges(options['rows'], rnd)
+    tracemalloc.start()
+    by_author = defaultdict(set)
+    for user, author in edges:
+        by_author[author].add(user)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del by_author
+    calls = [
+        (rnd.randrange(nodes), rnd.randrange(nodes)) for _ in range(10000)
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'follows.bin')
+        started = perf_counter()
+        build_snapshot(edges, path)
+        build_s = perf_counter() - started
+        index = FollowGraphIndex(path)
+        stats = index.stats()
+        result = {
+            'rows': stats['edges'],
+            'build_s': round(build_s, 2),
+            'bytes_per_edge': stats['bytes_per_edge'],
+            'dict_bytes_per_edge': round(dict_bytes / len(edges), 2),
+            'is_following_us': _per_call_us(index.is_following, calls),
+            'followers_us': _per_call_us(
+                index.followers, [(author,) for _, author in calls]
+            ),
+            'mutual_us': _per_call_us(
+                index.mutual, [(user,) for user, _ in calls[:1000]]
+            ),
+        }
+    pairs = [
+        (data.users[number % len(data.users)].id,
+         data.users[number * 7 % len(data.users)].id)
+        for number in range(1000)
+    ]
+    result['sql_is_following_us'] = _per_call_us(
+        lambda user, author: Follow.objects.filter(
+            user_id=user, author_id=author
+        ).exists(),
+        pairs,
+    )
+    return result
+
+
+@register('suggestions', job=True)
+def suggestions(data, options):
+    ''' Рекомендации для пачки читателей графа из ``--rows`` рёбер.
+
+    Циклы по словарям множеств сравниваются с произведениями
+    разреженных матриц scipy; без scipy замеряются только циклы.
+    '''
+    rnd = random.Random(0)
+    nodes, edges = _synthetic_edges(options['rows'], rnd)
+    users = rnd.sample(range(nodes), min(nodes, 500))
+    graphs = [('dict', FollowGraph)]
+    if sparse is not None:
+        graphs.append(('sparse', SparseFollowGraph))
+    result = {'rows': len(edges)}
+    for name, graph_class in graphs:
+        started = perf_counter()
+        graph = graph_class(edges)
+        result[f'{name}_build_s'] = round(perf_counter() - started, 2)
+        started = perf_counter()
+        graph.suggest_batch(users, [], 5)
+        result[f'{name}_users_per_s'] = round(
+            len(users) / (perf_counter() - started)
+        )
+    return result
@@ -0,0 +1,278 @@
+import csv
+import json
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, sql
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post, User
+from .signals import after_bulk_load, suspended
+
+BATCH_SIZE = 1000
+# Не больше стольких параметров в одном IN: лимит старых SQLite - 999.
+IN_CHUNK = 500
+
+# Все колонки CSV: у каждой модели заполнена только часть из них.
+CSV_FIELDS = (
+    'model', 'id', 'slug', 'title', 'description', 'author', 'group',
+    'text', 'pub_date', 'image', 'user', 'post', 'created',
+)
+
+
+def chunks(items, size=IN_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def read_records(file, file_format):
+    ''' Построчно читает записи NDJSON или CSV. '''
+    if file_format == 'csv':
+        for row in csv.DictReader(file):
+            yield {key: value for key, value in row.items() if value != ''}
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class RecordWriter:
+    def __init__(self, file, file_format):
+        self.file = file
+        self.csv = None
+        if file_format == 'csv':
+            self.csv = csv.DictWriter(file, CSV_FIELDS, restval='')
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv is not None:
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def export_records(writer, chunk_size=2000):
+    ''' Выгружает группы, посты, подписки и комментарии потоком. '''
+    count = 0
+    for group in Group.objects.values(
+        'slug', 'title', 'description'
+    ).iterator(chunk_size=chunk_size):
+        writer.write({'model': 'group', **group})
+        count += 1
+    for post in Post.objects.order_by('id').values(
+        'id', 'text', 'pub_date', 'image', 'author__username', 'group__slug'
+    ).iterator(chunk_size=chunk_size):
+        writer.write({
+            'model': 'post',
+            'id': post['id'],
+            'author': post['author__username'],
+            'group': post['group__slug'] or '',
+            'text': post['text'],
+            'pub_date': post['pub_date'].isoformat(),
+            'image': post['image'] or '',
+        })
+        count += 1
+    for follow in Follow.objects.values(
+        'user__username', 'author__username'
+    ).iterator(chunk_size=chunk_size):
+        writer.write({
+            'model': 'follow',
+            'user': follow['user__username'],
+            'author': follow['author__username'],
+        })
+        count += 1
+    for comment in Comment.objects.order_by('id').values(
+        'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=chunk_size):
+        writer.write({
+            'model': 'comment',
+            'post': comment['post_id'],
+            'author': comment['author__username'],
+            'text': comment['text'],
+            'created': comment['created'].isoformat(),
+        })
+        count += 1
+    return count
+
+
+def insert_with_dates(model, objs, batch_size):
+    ''' bulk_create с датами из выгрузки в полях auto_now_add.
+
+    bulk_create заменяет значение такого поля текущим временем.
+    Запрос вставки в режиме raw, как у loaddata, берёт все значения
+    из объектов как есть: строка пишется один раз, а само поле
+    модели не меняется.
+    '''
+    fields = model._meta.concrete_fields
+    batch_size = min(
+        batch_size, connection.ops.bulk_batch_size(fields, objs) or batch_size
+    )
+    for batch in chunks(objs, batch_size):
+        query = sql.InsertQuery(model)
+        query.insert_values(fields, batch, raw=True)
+        query.get_compiler(connection=connection).execute_sql()
+
+
+def lock_for_insert(*models):
+    ''' До конца транзакции запрещает другим вставки в таблицы. '''
+    tables = [
+        connection.ops.quote_name(model._meta.db_table) for model in models
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Пустая запись берёт блокировку записи на всю базу,
+            # как BEGIN IMMEDIATE.
+            cursor.execute(f'DELETE FROM {tables[0]} WHERE 0')
+            return
+        for table in tables:
+            cursor.execute(f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+
+
+class Importer:
+    ''' Загружает записи пачками по ``batch_size``.
+
+    Авторы и группы ищутся по словарям username -> id и slug -> id,
+    которые пополняются по ходу загрузки, поэтому на каждую запись
+    нет отдельного запроса. Id постов сдвигаются на максимальный
+    существующий id: комментарии находят свой пост без словаря,
+    и память не растёт с числом постов. Комментарии тоже получают
+    id по порядку.
+
+    Чтобы параллельные вставки не заняли эти id, вся загрузка идёт
+    в одной транзакции с блокировкой таблиц постов и комментариев,
+    а пачки - в точках сохранения внутри неё.
+
+    С ``index=False`` индекс тегов и упоминаний не строится: его
+    строит вызывающий через tags.reindex.
+    '''
+
+    def __init__(self, batch_size=BATCH_SIZE, index=True):
+        self.batch_size = batch_size
+        self.index = index
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.post_offset = 0
+        self.comment_id = 0
+        self.pending = {'group': [], 'post': [], 'follow': [], 'comment': []}
+        self.buffered = 0
+        self.imported = 0
+
+    def load(self, records):
+        with transaction.atomic(), suspended():
+            lock_for_insert(Post, Comment)
+            self.post_offset = Post.objects.aggregate(
+                last=Max('id')
+            )['last'] or 0
+            self.comment_id = Comment.objects.aggregate(
+                last=Max('id')
+            )['last'] or 0
+            for record in records:
+                self.pending[record['model']].append(record)
+                self.buffered += 1
+                if self.buffered >= self.batch_size:
+                    self.flush()
+            self.flush()
+            with connection.cursor() as cursor:
+                for statement in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]
+                ):
+                    cursor.execute(statement)
+        after_bulk_load(index=self.index)
+        return self.imported
+
+    @transaction.atomic
+    def flush(self):
+        # Порядок важен: посты ссылаются на группы, комментарии - на посты.
+        self.save_groups(self.pending['group'])
+        self.save_posts(self.pending['post'])
+        self.save_follows(self.pending['follow'])
+        self.save_comments(self.pending['comment'])
+        self.imported += self.buffered
+        self.buffered = 0
+        for records in self.pending.values():
+            records.clear()
+
+    def user_ids(self, usernames):
+        missing = {name for name in usernames if name not in self.users}
+        if missing:
+            new_users = [User(username=name) for name in missing]
+            for user in new_users:
+                user.set_unusable_password()
+            User.objects.bulk_create(new_users, batch_size=self.batch_size)
+            for names in chunks(missing):
+                self.users.update(User.objects.filter(
+                    username__in=names
+                ).values_list('username', 'id'))
+
+    def save_groups(self, records):
+        new = {}
+        for record in records:
+            # Повтор slug в пачке - одна группа, первая запись.
+            if record['slug'] not in self.groups:
+                new.setdefault(record['slug'], Group(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record.get('description', ''),
+                ))
+        new = list(new.values())
+        if new:
+            Group.objects.bulk_create(new)
+            for slugs in chunks(group.slug for group in new):
+                self.groups.update(Group.objects.filter(
+                    slug__in=slugs
+                ).values_list('slug', 'id'))
+
+    def save_posts(self, records):
+        self.user_ids(record['author'] for record in records)
+        insert_with_dates(Post, [
+            Post(
+                id=self.post_offset + int(record['id']),
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                text=record['text'],
+                pub_date=parse_date(record.get('pub_date')),
+                image=record.get('image', ''),
+            )
+            for record in records
+        ], self.batch_size)
+
+    def save_follows(self, records):
+        self.user_ids(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        pairs = {
+            (self.users[record['user']], self.users[record['author']])
+            for record in records
+        }
+        existing = set()
+        for user_ids in chunks({user for user, _ in pairs}):
+            existing.update(Follow.objects.filter(
+                user_id__in=user_ids
+            ).values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create([
+            Follow(user_id=user, author_id=author)
+            for user, author in pairs - existing
+            if user != author
+        ])
+
+    def save_comments(self, records):
+        self.user_ids(record['author'] for record in records)
+        comments = [
+            Comment(
+                id=self.comment_id + number,
+                post_id=self.post_offset + int(record['post']),
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=parse_date(record.get('created')),
+            )
+            for number, record in enumerate(records, 1)
+        ]
+        self.comment_id += len(comments)
+        insert_with_dates(Comment, comments, self.batch_size)
@@ -0,0 +1,92 @@
+import time
+from datetime import datetime, timezone
+
+from core.buffer import WriteBehindBuffer
+from django.conf import settings
+
+from .comment_stream import publish_comments
+from .models import Comment
+from .notifications import comment_events, save_notifications
+from .trending import add_comments
+
+PENDING_KEY = 'pending_comments'
+
+
+def save_comments(records):
+    # bulk_create не шлёт post_save: счёт постов и рассылку делаем сами.
+    comments = Comment.objects.bulk_create([
+        Comment(
+            post_id=record['post_id'],
+            author_id=record['author_id'],
+            text=record['text'],
+        )
+        for record in records
+    ])
+    add_comments(comments)
+    publish_comments(comments)
+    # Уже в фоновом сбросе: уведомления пишутся той же транзакцией.
+    save_notifications(comment_events(comments))
+
+
+comment_buffer = WriteBehindBuffer(
+    save_comments,
+    settings.COMMENT_BUFFER_SPOOL,
+    max_items=settings.COMMENT_BUFFER_MAX_ITEMS,
+    interval=settings.COMMENT_BUFFER_INTERVAL_MS / 1000,
+    fsync=settings.COMMENT_BUFFER_FSYNC,
+)
+
+
+def buffer_comment(request, post, text):
+    ''' Ставит комментарий в очередь и запоминает его в сессии автора. '''
+    submitted = time.time()
+    comment_buffer.submit({
+        'post_id': post.id,
+        'author_id': request.user.id,
+        'text': text,
+    })
+    pending = request.session.get(PENDING_KEY, [])
+    pending.append({'post_id': post.id, 'text': text, 'submitted': submitted})
+    request.session[PENDING_KEY] = pending
+
+
+def with_pending(request, post, comments):
+    ''' Комментарии поста плюс ещё не сохранённые комментарии автора.
+
+    Комментарий пропадает из сессии, как только появляется в базе
+    или истекает COMMENT_BUFFER_OVERLAY_SECONDS.
+    '''
+    if not request.user.is_authenticated:
+        return comments
+    pending = request.session.get(PENDING_KEY)
+    if not pending:
+        return comments
+    comments = list(comments)
+    now = time.time()
+    keep = []
+    for entry in pending:
+        if now - entry['submitted'] > settings.COMMENT_BUFFER_OVERLAY_SECONDS:
+            continue
+        if entry['post_id'] == post.id and any(
+            comment.author_id == request.user.id
+            and comment.text == entry['text']
+            and comment.created.timestamp() >= entry['submitted'] - 1
+            for comment in comments
+        ):
+            continue
+        keep.append(entry)
+    if keep != pending:
+        request.session[PENDING_KEY] = keep
+    overlay = [
+        Comment(
+            post=post,
+            author=request.user,
+            text=entry['text'],
+            created=datetime.fromtimestamp(
+                entry['submitted'], tz=timezone.utc
+            ),
+        )
+        for entry in reversed(keep)
+        if entry['post_id'] == post.id
+    ]
+    return overlay + comments
@@ -0,0 +1,128 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.pubsub import hub
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .models import Comment, User
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Больший id не переводится обратно в дату.
+MAX_EVENT_ID = (
+    datetime.max.replace(tzinfo=timezone.utc) - EPOCH
+) // timedelta(microseconds=1)
+
+
+def channel(post_id):
+    return f'comments:{post_id}'
+
+
+def event_id(comment):
+    ''' Id события - время комментария в микросекундах.
+
+    Комментарии из буфера сохраняются через bulk_create, и SQLite
+    не возвращает их id, поэтому продолжение после переподключения
+    (Last-Event-ID) ищет комментарии по времени.
+    '''
+    return (comment.created - EPOCH) // timedelta(microseconds=1)
+
+
+def _event(comment):
+    html = render_to_string(
+        'posts/includes/comment.html', {'comment': comment}
+    )
+    return event_id(comment), (
+        f'id: {event_id(comment)}\n'
+        f'event: comment\n'
+        f'data: {json.dumps({"html": html}, ensure_ascii=False)}\n\n'
+    )
+
+
+def publish_comments(comments):
+    ''' Рассылает новые комментарии открытым страницам их постов.
+
+    Каждый комментарий рендерится один раз, сколько бы страниц
+    ни было открыто. Рассылка - после коммита транзакции.
+    '''
+    comments = [
+        comment for comment in comments
+        if hub.subscribers(channel(comment.post_id))
+    ]
+    if not comments:
+        return
+    author_field = Comment._meta.get_field('author')
+    missing = {
+        comment.author_id for comment in comments
+        if not author_field.is_cached(comment)
+    }
+    authors = User.objects.in_bulk(missing) if missing else {}
+    for comment in comments:
+        if comment.author_id in authors:
+            comment.author = authors[comment.author_id]
+    events = [(comment.post_id, _event(comment)) for comment in comments]
+
+    def send():
+        for post_id, event in events:
+            hub.publish(channel(post_id), event)
+
+    transaction.on_commit(send)
+
+
+def parse_event_id(value):
+    ''' Id события из заголовка или параметра; None, если он неверен. '''
+    if not value or not value.isdigit():
+        return None
+    value = int(value)
+    return value if value <= MAX_EVENT_ID else None
+
+
+def comments_after(post_id, last):
+    ''' Комментарии поста новее события ``last``, от старых к новым. '''
+    return Comment.objects.filter(
+        post_id=post_id,
+        created__gt=EPOCH + timedelta(microseconds=last),
+    ).select_related('author').order_by('created')
+
+
+def latest_event_id(comments):
+    ''' Id события самого нового сохранённого комментария или 0. '''
+    return max(
+        (event_id(comment) for comment in comments if comment.pk), default=0
+    )
+
+
+def comment_events(post_id, last_event_id=None):
+    ''' Поток SSE: пропущенные комментарии, затем новые по мере появления.
+
+    Поток закрывается через COMMENT_STREAM_MAX_SECONDS, и браузер
+    переподключается сам, передавая Last-Event-ID. Пока поток открыт,
+    он занимает поток сервера, поэтому включается только настройкой
+    COMMENT_STREAM_ENABLED.
+    '''
+    subscription = hub.subscribe(channel(post_id))
+    try:
+        yield f'retry: {settings.COMMENT_STREAM_RETRY_MS}\n\n'
+        last = parse_event_id(last_event_id)
+        if last is not None:
+            for comment in comments_after(post_id, last):
+                last, event = _event(comment)
+                yield event
+        deadline = time.monotonic() + settings.COMMENT_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline and not subscription.dropped:
+            message = subscription.get(
+                timeout=settings.COMMENT_STREAM_KEEPALIVE_SECONDS
+            )
+            if message is None:
+                # Комментарий SSE: не даёт прокси закрыть соединение.
+                yield ': keepalive\n\n'
+                continue
+            message_id, event = message
+            if last is not None and message_id <= last:
+                continue
+            last = message_id
+            yield event
+    finally:
+        subscription.close()
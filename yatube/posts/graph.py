@@ -0,0 +1,249 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Follow
+
+MAGIC = b'YGRAPH1\0'
+# Сигнатура, число узлов, число рёбер, время начала сборки.
+HEADER = struct.Struct('<8sqqd')
+
+
+def _csr(sources, targets, nodes):
+    ''' Сжатые строки: offsets[n]..offsets[n + 1] - соседи узла n. '''
+    offsets = array('q', bytes(8 * (nodes + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(nodes):
+        offsets[node + 1] += offsets[node]
+    position = array('q', offsets)
+    row = array('i', bytes(4 * len(targets)))
+    for source, target in zip(sources, targets):
+        row[position[source]] = target
+        position[source] += 1
+    for node in range(nodes):
+        start, end = offsets[node], offsets[node + 1]
+        if end - start > 1:
+            row[start:end] = array('i', sorted(row[start:end]))
+    return offsets, row
+
+
+def _padding(size):
+    return b'\0' * (-size % 8)
+
+
+def build_snapshot(edges, path, started=None):
+    ''' Записывает граф подписок в файл снимка.
+
+    ``edges`` - пары (user_id, author_id). В файле два CSR-массива:
+    подписки (строки - читатели) и подписчики (строки - авторы),
+    соседи в каждой строке отсортированы. Файл заменяется атомарно,
+    так что процессы, которые уже отобразили старый, его дочитают.
+    '''
+    started = time.time() if started is None else started
+    users, authors = array('i'), array('i')
+    for user, author in edges:
+        users.append(user)
+        authors.append(author)
+    nodes = max(max(users, default=0), max(authors, default=0)) + 1
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, nodes, len(users), started))
+        for sources, targets in ((users, authors), (authors, users)):
+            offsets, row = _csr(sources, targets, nodes)
+            offsets.tofile(file)
+            row.tofile(file)
+            file.write(_padding(4 * len(row)))
+    os.replace(temp_path, path)
+    return len(users)
+
+
+def build_from_database(path):
+    started = time.time()
+    return build_snapshot(
+        Follow.objects.values_list('user_id', 'author_id').iterator(
+            chunk_size=10000
+        ),
+        path,
+        started,
+    )
+
+
+class _Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.mtime = os.fstat(file.fileno()).st_mtime
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic, self.nodes, self.edges, self.built_at = HEADER.unpack_from(
+            view
+        )
+        if magic != MAGIC:
+            raise ValueError(f'{path} - не снимок графа подписок')
+        position = HEADER.size
+        self.following, position = self._read_csr(view, position)
+        self.followers, position = self._read_csr(view, position)
+        self.size = len(self.map)
+
+    def _read_csr(self, view, position):
+        offsets_size = 8 * (self.nodes + 1)
+        offsets = view[position:position + offsets_size].cast('q')
+        position += offsets_size
+        row = view[position:position + 4 * self.edges].cast('i')
+        position += 4 * self.edges + len(_padding(4 * self.edges))
+        return (offsets, row), position
+
+    def row(self, csr, node):
+        if not 0 <= node < self.nodes:
+            return ()
+        offsets, row = csr
+        return row[offsets[node]:offsets[node + 1]]
+
+
+def _contains(row, value):
+    index = bisect_left(row, value)
+    return index < len(row) and row[index] == value
+
+
+class FollowGraphIndex:
+    ''' Граф подписок в памяти процесса для запросов без join.
+
+    Основа - снимок, отображённый через mmap: все процессы
+    сервера делят одни и те же страницы памяти. Подписки и отписки
+    этого процесса после снимка лежат в небольшом наложении.
+    Новый снимок (команда build_follow_graph) подхватывается
+    не чаще раза в FOLLOW_GRAPH_CHECK_SECONDS; из наложения
+    при этом уходят изменения, которые в снимок уже попали.
+    Наложение видно только своему процессу: подписки, сделанные
+    после снимка в другом процессе, здесь не видны до нового снимка.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self._snapshot = None
+        self._checked = 0.0
+        self._added = {}
+        self._removed = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        ''' Отображает снимок; если его нет - строит из базы. '''
+        path = self.path or settings.FOLLOW_GRAPH_SNAPSHOT
+        if not os.path.exists(path):
+            build_from_database(path)
+        snapshot = _Snapshot(path)
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked = time.monotonic()
+            for changes in (self._added, self._removed):
+                for edge, moment in list(changes.items()):
+                    if moment < snapshot.built_at:
+                        del changes[edge]
+        return snapshot
+
+    def rebuild(self):
+        build_from_database(self.path or settings.FOLLOW_GRAPH_SNAPSHOT)
+        return self.load()
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.load()
+        now = time.monotonic()
+        if now - self._checked >= settings.FOLLOW_GRAPH_CHECK_SECONDS:
+            self._checked = now
+            path = self.path or settings.FOLLOW_GRAPH_SNAPSHOT
+            try:
+                changed = os.stat(path).st_mtime != snapshot.mtime
+            except FileNotFoundError:
+                changed = False
+            if changed:
+                return self.load()
+        return snapshot
+
+    def built_at(self):
+        ''' Время начала сборки текущего снимка (time.time()). '''
+        return self._current().built_at
+
+    def followed(self, user_id, author_id):
+        ''' Обработчик подписки: ребро сразу видно в этом процессе. '''
+        with self._lock:
+            self._removed.pop((user_id, author_id), None)
+            self._added[(user_id, author_id)] = time.time()
+
+    def unfollowed(self, user_id, author_id):
+        with self._lock:
+            self._added.pop((user_id, author_id), None)
+            self._removed[(user_id, author_id)] = time.time()
+
+    def is_following(self, user_id, author_id):
+        snapshot = self._current()
+        edge = (user_id, author_id)
+        if edge in self._added:
+            return True
+        if edge in self._removed:
+            return False
+        return _contains(snapshot.row(snapshot.following, user_id),
+                         author_id)
+
+    def following(self, user_id):
+        ''' Авторы, на которых подписан пользователь, по возрастанию id. '''
+        snapshot = self._current()
+        return self._merge(
+            snapshot.row(snapshot.following, user_id),
+            {author for user, author in self._added if user == user_id},
+            {author for user, author in self._removed if user == user_id},
+        )
+
+    def followers(self, author_id):
+        ''' Подписчики автора по возрастанию id. '''
+        snapshot = self._current()
+        return self._merge(
+            snapshot.row(snapshot.followers, author_id),
+            {user for user, author in self._added if author == author_id},
+            {user for user, author in self._removed if author == author_id},
+        )
+
+    def mutual(self, user_id):
+        ''' Взаимные подписки: слияние двух отсортированных строк. '''
+        following = self.following(user_id)
+        followers = self.followers(user_id)
+        result = []
+        left = right = 0
+        while left < len(following) and right < len(followers):
+            if following[left] == followers[right]:
+                result.append(following[left])
+                left += 1
+                right += 1
+            elif following[left] < followers[right]:
+                left += 1
+            else:
+                right += 1
+        return result
+
+    @staticmethod
+    def _merge(row, added, removed):
+        if not added and not removed:
+            return row.tolist() if row else []
+        return sorted((set(row) | added) - removed)
+
+    def stats(self):
+        snapshot = self._current()
+        return {
+            'nodes': snapshot.nodes,
+            'edges': snapshot.edges,
+            'bytes': snapshot.size,
+            'bytes_per_edge': round(snapshot.size / snapshot.edges, 2)
+            if snapshot.edges else 0.0,
+            'overlay': len(self._added) + len(self._removed),
+        }
+
+
+follow_graph = FollowGraphIndex()
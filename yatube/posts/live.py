@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Post
+from .utils import decode_cursor, encode_cursor
+
+LATEST_KEY = 'posts:latest'
+# Маркер "нет постов": отличается от промаха кэша.
+NO_POSTS = ''
+
+
+def _key(group_id=None):
+    return LATEST_KEY if group_id is None else f'{LATEST_KEY}:{group_id}'
+
+
+def latest_cursor(group_id=None):
+    ''' Курсор самого нового поста ленты: из кэша, при промахе - из базы. '''
+    key = _key(group_id)
+    cursor = cache.get(key)
+    if cursor is None:
+        posts = Post.objects.order_by('-pub_date', '-id')
+        if group_id is not None:
+            posts = posts.filter(group_id=group_id)
+        latest = posts.only('pub_date').first()
+        cursor = encode_cursor(latest) if latest else NO_POSTS
+        cache.set(key, cursor, None)
+    return cursor
+
+
+def note_new_post(post):
+    ''' Сдвигает маркеры общей ленты и ленты группы нового поста. '''
+    cursor = encode_cursor(post)
+    keys = [_key()]
+    if post.group_id is not None:
+        keys.append(_key(post.group_id))
+    for key in keys:
+        # Не откатываем маркер, если более новый пост уже записан.
+        if is_newer(cursor, cache.get(key, NO_POSTS)):
+            cache.set(key, cursor, None)
+
+
+def forget_latest(group_ids=()):
+    cache.delete_many([_key()] + [_key(group_id) for group_id in group_ids])
+
+
+def is_newer(cursor, than):
+    ''' Новее ли курсор ``cursor`` курсора ``than``. '''
+    position = decode_cursor(cursor)
+    if position is None:
+        return False
+    known = decode_cursor(than)
+    return known is None or position > known
+
+
+def newer_posts(post_list, cursor):
+    ''' Посты новее курсора: диапазон по индексу (pub_date, id). '''
+    position = decode_cursor(cursor)
+    if position is None:
+        return post_list.none()
+    pub_date, post_id = position
+    return post_list.filter(
+        Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=post_id)
+    ).order_by('-pub_date', '-id')
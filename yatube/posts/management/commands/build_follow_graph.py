@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.graph import build_from_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит снимок графа подписок FOLLOW_GRAPH_SNAPSHOT. Процессы '
+        'сервера подхватывают новый снимок сами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию - один раз).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            edges = build_from_database(settings.FOLLOW_GRAPH_SNAPSHOT)
+            self.stdout.write(
+                f'Снимок графа: {edges} подписок '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
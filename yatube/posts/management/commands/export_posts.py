@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.bulk import RecordWriter, export_records
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, подписки и комментарии в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки или - для stdout.')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='По умолчанию - по расширению файла.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        if path == '-':
+            export_records(RecordWriter(sys.stdout, file_format))
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            count = export_records(RecordWriter(file, file_format))
+        self.stdout.write(self.style.SUCCESS(f'Выгружено записей: {count}'))
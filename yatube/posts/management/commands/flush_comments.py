@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.comment_buffer import comment_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сохраняет комментарии из журналов буфера, оставшихся '
+        'от остановленных процессов.'
+    )
+
+    def handle(self, *args, **options):
+        saved = comment_buffer.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Сохранено комментариев: {saved}')
+        )
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.bulk import BATCH_SIZE, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, подписки и комментарии из NDJSON или CSV '
+        '(формат export_posts). Посты должны иметь id: по нему к ним '
+        'привязываются комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки или - для stdin.')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='По умолчанию - по расширению файла.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        started = time.perf_counter()
+        if path == '-':
+            imported = self.load(sys.stdin, file_format, options)
+        else:
+            with open(path, encoding='utf-8', newline='') as file:
+                imported = self.load(file, file_format, options)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {imported} за {elapsed:.1f} с '
+            f'({imported / elapsed if elapsed else 0:.0f} в секунду)'
+        ))
+
+    def load(self, file, file_format, options):
+        importer = Importer(batch_size=options['batch_size'])
+        return importer.load(read_records(file, file_format))
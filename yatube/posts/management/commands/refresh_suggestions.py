@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации "кого почитать" по графу подписок. '
+        'Запускать периодически, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию - один раз).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            refreshed = refresh_suggestions(batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Обновлено списков: {refreshed} '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
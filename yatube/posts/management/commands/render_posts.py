@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tags import recount_tags, reindex
+from posts.text import rerender
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает HTML текста постов и индекс тегов и упоминаний: '
+        'после изменения правил разметки или появления упомянутых '
+        'пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Только посты без готового HTML.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        queryset = Post.objects.all()
+        if options['missing']:
+            queryset = queryset.filter(text_html='')
+        reindex(queryset, batch_size=options['batch_size'])
+        if not options['missing']:
+            recount_tags()
+        rendered = rerender(queryset, batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Обработано постов: {rendered} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.notifications import notification_buffer, send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает дайджесты непрочитанных уведомлений через '
+        'EMAIL_BACKEND. Запускать периодически, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию - один раз).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Сначала - события из журналов остановленных процессов.
+            notification_buffer.flush()
+            sent = send_digests(batch_size=options['batch_size'])
+            self.stdout.write(f'Отправлено дайджестов: {sent}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
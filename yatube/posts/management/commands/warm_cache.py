@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.warmup import is_shared_cache, warm_cache
+
+
+class Command(BaseCommand):
+    help = 'Прогревает кэш первых страниц самых популярных лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--feeds', type=int, default=settings.CACHE_WARMUP_FEEDS,
+            help='Сколько лент каждого вида прогревать.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=settings.CACHE_WARMUP_PAGES,
+            help='Сколько первых страниц каждой ленты прогревать.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.CACHE_WARMUP_WORKERS,
+            help='Сколько запросов выполнять одновременно.',
+        )
+        parser.add_argument(
+            '--host', action='append', dest='hosts',
+            help=(
+                'Хост, под которым страницы попадут в кэш; можно '
+                'несколько. По умолчанию - CACHE_WARMUP_HOSTS или '
+                'ALLOWED_HOSTS.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            # Кэш в памяти процесса: прогрелся бы только кэш команды,
+            # и статистики посещений сервера здесь тоже нет.
+            raise CommandError(
+                'Кэш не общий для процессов (CACHES), прогрев командой '
+                'бесполезен: включите CACHE_WARMUP_ON_STARTUP.'
+            )
+        warmed = warm_cache(
+            feeds=options['feeds'],
+            pages=options['pages'],
+            workers=options['workers'],
+            hosts=options['hosts'],
+        )
+        for url, pages in warmed:
+            self.stdout.write(f'{url}: {pages}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето лент: {len(warmed)}, '
+            f'страниц: {sum(pages for _, pages in warmed)}'
+        ))
@@ -0,0 +1,24 @@
+from http import HTTPStatus
+
+from .warmup import TRACKED_FEEDS, WARMUP_HEADER, feed_hits
+
+
+class FeedHitsMiddleware:
+    ''' Считает успешные просмотры лент для прогрева кэша. '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        if (
+            match is not None
+            and match.view_name in TRACKED_FEEDS
+            and request.method == 'GET'
+            and response.status_code == HTTPStatus.OK
+            and WARMUP_HEADER not in request.META
+        ):
+            kwarg = TRACKED_FEEDS[match.view_name]
+            feed_hits.hit(match.view_name, match.kwargs.get(kwarg))
+        return response
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:21
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# Копия расчёта из posts.trending: миграция не зависит от кода приложения.
+EPOCH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def logaddexp2(first, second):
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def event_term(moment, weight=1.0):
+    hours = (moment - EPOCH).total_seconds() / 3600
+    return math.log2(weight) + hours / settings.TRENDING_HALF_LIFE_HOURS
+
+
+def post_term(pub_date, followers):
+    return event_term(pub_date, 1 + followers)
+
+
+def fill_hot_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    followers = dict(Follow.objects.values('author_id').annotate(
+        count=Count('id')
+    ).values_list('author_id', 'count'))
+    scores = {
+        post_id: post_term(pub_date, followers.get(author_id, 0))
+        for post_id, pub_date, author_id in Post.objects.values_list(
+            'id', 'pub_date', 'author_id'
+        )
+    }
+    for post_id, created in Comment.objects.values_list('post_id', 'created'):
+        scores[post_id] = logaddexp2(scores[post_id], event_term(created))
+    for post_id, score in scores.items():
+        Post.objects.filter(pk=post_id).update(hot_score=score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date',)},
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(db_index=True, default=0.0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:00
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.encoding import iri_to_uri
+from django.utils.html import escape, format_html
+
+# Копия разбора и рендеринга из posts.text на момент миграции:
+# миграция не зависит от кода приложения и его моделей.
+TOKEN = re.compile(
+    r'(?P<url>https?://[^\s<>"\']+)'
+    r'|(?<![\w@])@(?P<mention>\w+(?:[.+-]\w+)*)'
+    r'|(?<![\w#])#(?P<hashtag>\w+)'
+)
+URL_TRAILING = '.,!?:;)'
+
+
+def _plain(text):
+    return escape(text).replace('\r\n', '\n').replace('\n', '<br>\n')
+
+
+def _token(match, usernames):
+    url = match.group('url')
+    if url:
+        tail = len(url) - len(url.rstrip(URL_TRAILING))
+        url = url[:len(url) - tail]
+        return format_html(
+            '<a href="{0}" rel="nofollow noopener" target="_blank">{0}</a>',
+            url,
+        ) + _plain(match.group()[len(url):])
+    username = match.group('mention')
+    if username:
+        if username not in usernames:
+            return _plain(match.group())
+        return format_html(
+            '<a href="{}" class="mention">@{}</a>',
+            iri_to_uri(f'/profile/{username}/'), username,
+        )
+    return format_html(
+        '<span class="hashtag">#{}</span>', match.group('hashtag')
+    )
+
+
+def render_text(text, usernames):
+    parts = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        parts.append(_plain(text[position:match.start()]))
+        parts.append(_token(match, usernames))
+        position = match.end()
+    parts.append(_plain(text[position:]))
+    return ''.join(parts)
+
+
+def fill_text_html(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    usernames = set(User.objects.values_list('username', flat=True))
+    posts = list(Post.objects.only('id', 'text'))
+    for post in posts:
+        post.text_html = render_text(post.text, usernames)
+    Post.objects.bulk_update(posts, ['text_html'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20261019_1039'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_text_html, migrations.RunPython.noop),
+    ]
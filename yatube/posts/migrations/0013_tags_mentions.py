@@ -0,0 +1,144 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:02
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.encoding import iri_to_uri
+from django.utils.html import escape, format_html
+
+# Копия разбора и рендеринга из posts.text на момент миграции:
+# миграция не зависит от кода приложения и его моделей.
+TOKEN = re.compile(
+    r'(?P<url>https?://[^\s<>"\']+)'
+    r'|(?<![\w@])@(?P<mention>\w+(?:[.+-]\w+)*)'
+    r'|(?<![\w#])#(?P<hashtag>\w{1,64})(?!\w)'
+)
+URL_TRAILING = '.,!?:;)'
+
+
+def mentions(text):
+    return {
+        match.group('mention') for match in TOKEN.finditer(text)
+        if match.group('mention')
+    }
+
+
+def hashtags(text):
+    return {
+        match.group('hashtag').lower() for match in TOKEN.finditer(text)
+        if match.group('hashtag')
+    }
+
+
+def _plain(text):
+    return escape(text).replace('\r\n', '\n').replace('\n', '<br>\n')
+
+
+def _token(match, usernames):
+    url = match.group('url')
+    if url:
+        tail = len(url) - len(url.rstrip(URL_TRAILING))
+        url = url[:len(url) - tail]
+        return format_html(
+            '<a href="{0}" rel="nofollow noopener" target="_blank">{0}</a>',
+            url,
+        ) + _plain(match.group()[len(url):])
+    username = match.group('mention')
+    if username:
+        if username not in usernames:
+            return _plain(match.group())
+        return format_html(
+            '<a href="{}" class="mention">@{}</a>',
+            iri_to_uri(f'/profile/{username}/'), username,
+        )
+    tag = match.group('hashtag')
+    return format_html(
+        '<a href="{}" class="hashtag">#{}</a>',
+        iri_to_uri(f'/tag/{tag.lower()}/'), tag,
+    )
+
+
+def render_text(text, usernames):
+    parts = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        parts.append(_plain(text[position:match.start()]))
+        parts.append(_token(match, usernames))
+        position = match.end()
+    parts.append(_plain(text[position:]))
+    return ''.join(parts)
+
+
+def fill_tags(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostTag = apps.get_model('posts', 'PostTag')
+    Mention = apps.get_model('posts', 'Mention')
+    Tag = apps.get_model('posts', 'Tag')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    users = dict(User.objects.values_list('username', 'id'))
+    posts = list(Post.objects.only('id', 'text'))
+    post_tags = {post.id: hashtags(post.text) for post in posts}
+    Tag.objects.bulk_create([
+        Tag(name=name) for name in sorted(set().union(*post_tags.values()))
+    ], batch_size=500)
+    tags = dict(Tag.objects.values_list('name', 'id'))
+    PostTag.objects.bulk_create([
+        PostTag(post_id=post_id, tag_id=tags[name])
+        for post_id, names in post_tags.items() for name in names
+    ], batch_size=500)
+    for tag in Tag.objects.annotate(count=models.Count('post_tags')):
+        Tag.objects.filter(pk=tag.pk).update(post_count=tag.count)
+    Mention.objects.bulk_create([
+        Mention(post_id=post.id, user_id=users[name])
+        for post in posts for name in mentions(post.text) if name in users
+    ], batch_size=500)
+    # Хештеги в HTML становятся ссылками на ленты тегов.
+    for post in posts:
+        post.text_html = render_text(post.text, users)
+    Post.objects.bulk_update(posts, ['text_html'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_post_text_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('post_count', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.Post')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.Tag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='posttag',
+            constraint=models.UniqueConstraint(fields=('tag', 'post'), name='unique_post_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='mention',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_mention'),
+        ),
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.constraints import UniqueConstraint
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -48,6 +51,26 @@ class Follow(models.Model):
         UniqueConstraint(fields=['author', 'user'], name='unique_follower')
 
 
+class FollowSuggestion(models.Model):
+    ''' Готовый список "кого почитать" для пользователя.
+
+    Имена авторов хранятся вместе со списком, чтобы страница
+    читала его одним запросом по ключу, без join.
+    '''
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestion',
+    )
+    payload = models.TextField(default='[]')
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def authors(self):
+        return json.loads(self.payload)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -57,11 +80,132 @@ class Group(models.Model):
         return self.title
 
 
+class GroupSubscription(models.Model):
+    ''' Подписка на группу: из них складывается лента "мои группы". '''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_subscriptions',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='subscribers',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'group'], name='unique_group_subscription'
+            ),
+        ]
+
+
+class Mention(models.Model):
+    ''' Упоминание @username в тексте поста, см. posts.tags. '''
+    # Поиск по post_id идёт по индексу уникальности (post_id, user_id).
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        db_index=False,
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['post', 'user'], name='unique_mention'),
+        ]
+
+
+class Notification(models.Model):
+    ''' Уведомление о подписке, комментарии или упоминании.
+
+    Однотипные события, пока получатель их не прочитал и они не
+    ушли в дайджест, схлопываются в одну запись со счётчиком,
+    см. posts.notifications.
+    '''
+    FOLLOW = 'follow'
+    COMMENT = 'comment'
+    MENTION = 'mention'
+    KINDS = (
+        (FOLLOW, 'Подписка'),
+        (COMMENT, 'Комментарий'),
+        (MENTION, 'Упоминание'),
+    )
+
+    # Поиск по recipient_id идёт по индексу ленты уведомлений.
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        db_index=False,
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    # Автор последнего из схлопнутых событий.
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    count = models.PositiveIntegerField(default=1)
+    updated = models.DateTimeField(default=timezone.now)
+    read = models.BooleanField(default=False)
+    emailed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ('-updated',)
+        indexes = [
+            models.Index(
+                fields=['recipient', '-updated'],
+                name='notification_inbox_idx',
+            ),
+            # Ещё не разосланные уведомления для дайджестов.
+            models.Index(
+                fields=['emailed', 'recipient'],
+                name='notification_digest_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.summary()
+
+    def summary(self):
+        actor = self.actor.get_full_name() or self.actor.username
+        post = f'«{self.post}»'
+        if self.kind == self.FOLLOW:
+            if self.count > 1:
+                return f'Новых подписчиков: {self.count}, последний - {actor}'
+            return f'Новый подписчик: {actor}'
+        if self.kind == self.COMMENT:
+            if self.count > 1:
+                return f'Новых комментариев к посту {post}: {self.count}'
+            return f'Новый комментарий к посту {post} от {actor}'
+        return f'{actor} упоминает вас в посте {post}'
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
         help_text='Введите текст поста'
     )
+    # Готовый HTML текста, см. posts.text: ленты не разбирают текст.
+    text_html = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Publication date'
@@ -84,9 +228,70 @@ class Post(models.Model):
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
     )
+    # Логарифм суммы весов с ростом во времени, см. posts.trending.
+    hot_score = models.FloatField(
+        default=0.0,
+        db_index=True,
+        editable=False,
+        verbose_name='Популярность',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            # Общая лента и опрос новых постов: диапазон по (pub_date, id).
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx',
+            ),
+            # Ленты групп: group_id IN (...) с сортировкой по дате.
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
+
+
+class PostTag(models.Model):
+    ''' Хештег поста: по этим строкам читается лента тега. '''
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+    )
+    # Посты тега отбираются по индексу (tag_id, pub_date, post_id).
+    tag = models.ForeignKey(
+        'Tag',
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        db_index=False,
+    )
+    # Копия Post.pub_date: лента тега идёт по индексу этой таблицы,
+    # не сортируя все посты тега.
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['tag', 'post'], name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='post_tag_pub_date_idx',
+            ),
+        ]
+
+
+class Tag(models.Model):
+    ''' Хештег в нижнем регистре.
+
+    Число постов поддерживается при сохранении и удалении постов,
+    чтобы страница тега не считала его запросом COUNT.
+    '''
+    name = models.CharField(max_length=64, unique=True)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return f'#{self.name}'
@@ -0,0 +1,192 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from core.buffer import WriteBehindBuffer
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Greatest
+from django.urls import reverse
+
+from .models import Comment, Notification, Post, User
+from .text import IN_CHUNK
+
+
+def event(kind, recipient_id, actor_id, post_id=None):
+    return {
+        'kind': kind,
+        'recipient_id': recipient_id,
+        'actor_id': actor_id,
+        'post_id': post_id,
+        'created': time.time(),
+    }
+
+
+def comment_events(comments):
+    ''' События о комментариях для авторов постов.
+
+    Автор поста берётся из уже загруженного comment.post, остальные -
+    одним запросом на пачку.
+    '''
+    field = Comment._meta.get_field('post')
+    authors = {
+        comment.post_id: comment.post.author_id
+        for comment in comments if field.is_cached(comment)
+    }
+    missing = sorted({comment.post_id for comment in comments} - set(authors))
+    for start in range(0, len(missing), IN_CHUNK):
+        authors.update(Post.objects.filter(
+            id__in=missing[start:start + IN_CHUNK]
+        ).values_list('id', 'author_id'))
+    return [
+        event(
+            Notification.COMMENT, authors[comment.post_id],
+            comment.author_id, comment.post_id,
+        )
+        for comment in comments
+    ]
+
+
+def save_notifications(records):
+    ''' Сохраняет события пачкой, схлопывая однотипные.
+
+    События с одним получателем, типом и постом складываются в
+    память, затем прибавляются к непрочитанной и не разосланной
+    записи условным UPDATE или создают новую: тысяча комментариев
+    к посту - это одно обновление, а не тысяча вставок.
+    '''
+    collapsed = {}
+    for record in records:
+        if record['recipient_id'] == record['actor_id']:
+            continue
+        key = (record['recipient_id'], record['kind'], record['post_id'])
+        count, last = collapsed.get(key, (0, record))
+        if record['created'] >= last['created']:
+            last = record
+        collapsed[key] = (count + 1, last)
+    if not collapsed:
+        return 0
+    recipients = sorted({key[0] for key in collapsed})
+    existing = []
+    for start in range(0, len(recipients), IN_CHUNK):
+        existing.extend(Notification.objects.filter(
+            recipient_id__in=recipients[start:start + IN_CHUNK],
+            read=False,
+            emailed=False,
+        ).order_by())
+    open_notifications = {
+        (note.recipient_id, note.kind, note.post_id): note
+        for note in existing
+    }
+    changed, new = 0, []
+    for key, (count, last) in collapsed.items():
+        updated = datetime.fromtimestamp(last['created'], tz=timezone.utc)
+        note = open_notifications.get(key)
+        # Прибавка - только к записи, которую ещё не забрала рассылка
+        # (send_digests): иначе события ушли бы в уже отправленное.
+        if note is not None and Notification.objects.filter(
+            pk=note.pk, read=False, emailed=False
+        ).update(
+            count=F('count') + count,
+            actor_id=last['actor_id'],
+            updated=Greatest(
+                'updated', Value(updated, output_field=DateTimeField())
+            ),
+        ):
+            changed += 1
+            continue
+        new.append(Notification(
+            recipient_id=key[0], kind=key[1], post_id=key[2],
+            actor_id=last['actor_id'], count=count, updated=updated,
+        ))
+    Notification.objects.bulk_create(new, batch_size=IN_CHUNK)
+    return changed + len(new)
+
+
+notification_buffer = WriteBehindBuffer(
+    save_notifications,
+    settings.NOTIFICATION_BUFFER_SPOOL,
+    max_items=settings.NOTIFICATION_BUFFER_MAX_ITEMS,
+    interval=settings.NOTIFICATION_BUFFER_INTERVAL_MS / 1000,
+)
+
+
+def notify(records):
+    ''' Ставит события в буфер или, если он выключен, сохраняет сразу. '''
+    if not settings.NOTIFICATION_BUFFER_ENABLED:
+        return save_notifications(records)
+    for record in records:
+        notification_buffer.submit(record)
+
+
+def _digest(user, notifications):
+    lines = [f'Здравствуйте, {user.get_full_name() or user.username}!', '']
+    lines.extend(f'- {note.summary()}' for note in notifications)
+    lines.extend(['', f'Все уведомления: {reverse("posts:notifications")}'])
+    return EmailMessage(
+        subject=f'Yatube: новых уведомлений - {len(notifications)}',
+        body='\n'.join(lines),
+        to=[user.email],
+    )
+
+
+def _claim(notes):
+    ''' Помечает уведомления разосланными, если они не менялись.
+
+    Запись, к которой save_notifications успел прибавить события
+    после чтения, не забирается и уйдёт следующим дайджестом целиком.
+    Другая рассылка тоже её не заберёт: условие emailed=False.
+    '''
+    with transaction.atomic():
+        return [
+            note for note in notes
+            if Notification.objects.filter(
+                pk=note.pk, emailed=False,
+                count=note.count, updated=note.updated,
+            ).update(emailed=True)
+        ]
+
+
+def send_digests(batch_size=None):
+    ''' Рассылает дайджесты непрочитанных уведомлений.
+
+    Получатели обрабатываются пачками по ``batch_size``: одно письмо
+    на получателя, все письма пачки - через одно соединение
+    EMAIL_BACKEND. Уведомления забираются (_claim) до отправки, и
+    в письмо попадают ровно те значения, что помечены разосланными;
+    если отправка упала, они возвращаются в очередь. Возвращает
+    число отправленных писем.
+    '''
+    batch_size = batch_size or settings.NOTIFICATION_DIGEST_BATCH
+    pending = Notification.objects.filter(emailed=False, read=False)
+    sent = last_id = 0
+    with get_connection() as connection:
+        while True:
+            recipients = list(User.objects.filter(
+                id__gt=last_id, id__in=pending.values('recipient_id')
+            ).order_by('id')[:batch_size])
+            if not recipients:
+                return sent
+            last_id = recipients[-1].id
+            # Без адреса почты уведомления остаются только во входящих.
+            claimed = _claim(pending.filter(
+                recipient_id__in=[user.id for user in recipients]
+            ).select_related('actor', 'post'))
+            by_recipient = defaultdict(list)
+            for note in claimed:
+                by_recipient[note.recipient_id].append(note)
+            try:
+                sent += connection.send_messages([
+                    _digest(user, by_recipient[user.id])
+                    for user in recipients
+                    if user.email and by_recipient[user.id]
+                ]) or 0
+            except Exception:
+                ids = sorted(note.id for note in claimed)
+                for start in range(0, len(ids), IN_CHUNK):
+                    Notification.objects.filter(
+                        id__in=ids[start:start + IN_CHUNK]
+                    ).update(emailed=False)
+                raise
@@ -0,0 +1,248 @@
+import heapq
+import json
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .bulk import chunks
+from .models import Follow, FollowSuggestion, User
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+# Вес автора, на которого подписаны мои авторы, относительно
+# вклада одного похожего читателя.
+FRIENDS_OF_FRIENDS_WEIGHT = 1.0
+
+
+class FollowGraph:
+    ''' Граф подписок в виде разреженной матрицы смежности A.
+
+    Строка ``following[u]`` - авторы, на которых подписан u (строка A),
+    ``followers[a]`` - подписчики автора a (столбец A).
+    '''
+
+    def __init__(self, edges):
+        self.following = defaultdict(set)
+        self.followers = defaultdict(set)
+        for user, author in edges:
+            self.following[user].add(author)
+            self.followers[author].add(user)
+
+    @classmethod
+    def load(cls):
+        return cls(Follow.objects.values_list(
+            'user_id', 'author_id'
+        ).iterator(chunk_size=settings.SUGGESTIONS_BATCH))
+
+    def friends_of_friends(self, user):
+        ''' Строка u произведения A·A: авторы моих авторов. '''
+        scores = defaultdict(float)
+        for author in self.following[user]:
+            for candidate in self.following.get(author, ()):
+                scores[candidate] += FRIENDS_OF_FRIENDS_WEIGHT
+        return scores
+
+    def similar_users(self, user):
+        ''' Строка u произведения A·Aᵀ, нормированная по косинусу.
+
+        Возвращает SUGGESTIONS_NEIGHBOURS самых похожих читателей.
+        '''
+        own = self.following[user]
+        overlap = defaultdict(int)
+        for author in own:
+            for other in self.followers[author]:
+                if other != user:
+                    overlap[other] += 1
+        similarity = (
+            (count / math.sqrt(len(own) * len(self.following[other])),
+             other)
+            for other, count in overlap.items()
+        )
+        return heapq.nlargest(settings.SUGGESTIONS_NEIGHBOURS, similarity)
+
+    def co_follow(self, user):
+        ''' Авторы, на которых подписаны похожие на u читатели. '''
+        scores = defaultdict(float)
+        for weight, other in self.similar_users(user):
+            for candidate in self.following[other]:
+                scores[candidate] += weight
+        return scores
+
+    def suggest(self, user, popular, size):
+        scores = self.friends_of_friends(user)
+        for candidate, score in self.co_follow(user).items():
+            scores[candidate] += score
+        return rank(
+            ((score, candidate) for candidate, score in scores.items()),
+            self.following[user] | {user}, popular, size,
+        )
+
+    def suggest_batch(self, users, popular, size):
+        return {user: self.suggest(user, popular, size) for user in users}
+
+
+class SparseFollowGraph:
+    ''' Тот же граф как матрица scipy.sparse.
+
+    Рекомендации пачки пользователей считаются произведениями её
+    строк B на A: B·A - друзья друзей, B·Aᵀ - общие авторы с другими
+    читателями, а по ним после нормировки и отбора соседей - авторы
+    похожих читателей. В Python остаётся только отбор лучших
+    кандидатов в каждой строке.
+    '''
+
+    def __init__(self, edges):
+        edges = numpy.array(list(edges), dtype=numpy.int64).reshape(-1, 2)
+        self.ids = numpy.unique(edges)
+        nodes = len(self.ids)
+        self.adjacency = sparse.csr_matrix(
+            (
+                numpy.ones(len(edges)),
+                (
+                    numpy.searchsorted(self.ids, edges[:, 0]),
+                    numpy.searchsorted(self.ids, edges[:, 1]),
+                ),
+            ),
+            shape=(nodes, nodes),
+        )
+        self.transposed = self.adjacency.T.tocsr()
+        self.degree = numpy.diff(self.adjacency.indptr)
+
+    @classmethod
+    def load(cls):
+        return cls(Follow.objects.values_list(
+            'user_id', 'author_id'
+        ).iterator(chunk_size=settings.SUGGESTIONS_BATCH))
+
+    def positions(self, users):
+        positions = numpy.searchsorted(self.ids, users)
+        known = positions < len(self.ids)
+        known[known] = self.ids[positions[known]] == users[known]
+        return positions, known
+
+    def similar_users(self, rows, positions):
+        ''' Косинусная близость к читателям, по SUGGESTIONS_NEIGHBOURS
+        самых похожих на строку. '''
+        overlap = (rows @ self.transposed).tocoo()
+        keep = overlap.col != positions[overlap.row]
+        row, col = overlap.row[keep], overlap.col[keep]
+        weight = overlap.data[keep] / numpy.sqrt(
+            self.degree[positions[row]] * self.degree[col]
+        )
+        # Как heapq.nlargest по (близость, id): при равенстве - больший id.
+        order = numpy.lexsort((-col, -weight, row))
+        row, col, weight = row[order], col[order], weight[order]
+        starts = numpy.searchsorted(row, row, side='left')
+        top = numpy.arange(len(row)) - starts < settings.SUGGESTIONS_NEIGHBOURS
+        return sparse.csr_matrix(
+            (weight[top], (row[top], col[top])), shape=overlap.shape
+        )
+
+    def suggest_batch(self, users, popular, size):
+        users = numpy.array(users, dtype=numpy.int64)
+        positions, known = self.positions(users)
+        positions = positions[known]
+        rows = self.adjacency[positions]
+        scores = (
+            FRIENDS_OF_FRIENDS_WEIGHT * (rows @ self.adjacency)
+            + self.similar_users(rows, positions) @ self.adjacency
+        ).tocsr()
+        suggestions = {}
+        number = 0
+        for user, is_known in zip(users.tolist(), known.tolist()):
+            if not is_known:
+                suggestions[user] = rank((), {user}, popular, size)
+                continue
+            start, end = scores.indptr[number], scores.indptr[number + 1]
+            following = self.ids[
+                rows.indices[rows.indptr[number]:rows.indptr[number + 1]]
+            ]
+            suggestions[user] = rank(
+                zip(
+                    scores.data[start:end].tolist(),
+                    self.ids[scores.indices[start:end]].tolist(),
+                ),
+                {user, *following.tolist()}, popular, size,
+            )
+            number += 1
+        return suggestions
+
+
+def load_graph():
+    ''' Граф для рекомендаций: матрица scipy, если он установлен. '''
+    if sparse is not None:
+        return SparseFollowGraph.load()
+    return FollowGraph.load()
+
+
+def rank(scored, skip, popular, size):
+    ''' Лучшие ``size`` кандидатов из пар (оценка, id) без ``skip``. '''
+    ranked = [
+        candidate for _, candidate in heapq.nlargest(size + len(skip), scored)
+        if candidate not in skip
+    ]
+    # Без подписок рекомендовать нечего - добираем популярными.
+    for candidate in popular:
+        if len(ranked) >= size:
+            break
+        if candidate not in skip and candidate not in ranked:
+            ranked.append(candidate)
+    return ranked[:size]
+
+
+def popular_authors(size):
+    return list(User.objects.annotate(
+        followers=Count('following')
+    ).filter(followers__gt=0).order_by('-followers').values_list(
+        'id', flat=True
+    )[:size * 2])
+
+
+def refresh_suggestions(batch_size=None, size=None):
+    ''' Пересчитывает списки рекомендаций всех пользователей.
+
+    Граф загружается один раз; списки считаются и сохраняются
+    пачками по ``batch_size`` пользователей, по транзакции на пачку.
+    Возвращает число обновлённых списков.
+    '''
+    batch_size = batch_size or settings.SUGGESTIONS_BATCH
+    size = size or settings.SUGGESTIONS_SIZE
+    graph = load_graph()
+    popular = popular_authors(size)
+    names = {}
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    refreshed = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = graph.suggest_batch(batch, popular, size)
+        missing = {
+            author for authors in suggestions.values() for author in authors
+        } - names.keys()
+        for ids in chunks(missing):
+            names.update(
+                (user.id, (user.username, user.get_full_name()))
+                for user in User.objects.filter(id__in=ids).only(
+                    'username', 'first_name', 'last_name'
+                )
+            )
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            FollowSuggestion.objects.bulk_create([
+                FollowSuggestion(user_id=user, payload=json.dumps([
+                    {
+                        'username': names[author][0],
+                        'full_name': names[author][1],
+                    }
+                    for author in authors
+                ], ensure_ascii=False))
+                for user, authors in suggestions.items()
+            ])
+        refreshed += len(batch)
+    return refreshed
@@ -0,0 +1,71 @@
+import random
+from collections import namedtuple
+
+from faker import Faker
+
+from .models import Comment, Follow, Group, Post, User
+from .text import render_posts
+
+BATCH_SIZE = 500
+
+SeedData = namedtuple('SeedData', 'users groups post_ids')
+
+
+def seed(users=50, groups=5, posts=500, follows=200, comments=500,
+         random_seed=0):
+    ''' Заполняет базу синтетическими пользователями, постами,
+    подписками и комментариями для нагрузочных прогонов.
+    '''
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    rnd = random.Random(random_seed)
+
+    User.objects.bulk_create([
+        User(
+            username=f'{fake.user_name()}{number}',
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+        )
+        for number in range(users)
+    ], batch_size=BATCH_SIZE)
+    Group.objects.bulk_create([
+        Group(
+            title=fake.sentence(nb_words=3),
+            slug=f'group-{number}',
+            description=fake.text(max_nb_chars=200),
+        )
+        for number in range(groups)
+    ], batch_size=BATCH_SIZE)
+    user_list = list(User.objects.order_by('id'))
+    group_list = list(Group.objects.order_by('id'))
+
+    Post.objects.bulk_create(render_posts([
+        Post(
+            author=rnd.choice(user_list),
+            group=rnd.choice(group_list + [None]) if group_list else None,
+            text=fake.text(max_nb_chars=400),
+        )
+        for _ in range(posts)
+    ]), batch_size=BATCH_SIZE)
+    post_ids = list(Post.objects.values_list('id', flat=True))
+
+    pairs = set()
+    max_pairs = len(user_list) * (len(user_list) - 1)
+    while len(pairs) < min(follows, max_pairs):
+        user, author = rnd.sample(user_list, 2)
+        pairs.add((user.id, author.id))
+    Follow.objects.bulk_create([
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in pairs
+    ], batch_size=BATCH_SIZE)
+
+    if post_ids:
+        Comment.objects.bulk_create([
+            Comment(
+                post_id=rnd.choice(post_ids),
+                author=rnd.choice(user_list),
+                text=fake.sentence(),
+            )
+            for _ in range(comments)
+        ], batch_size=BATCH_SIZE)
+    return SeedData(user_list, group_list, post_ids)
@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .comment_stream import publish_comments
+from .graph import follow_graph
+from .live import forget_latest, note_new_post
+from .models import Comment, Follow, Group, Notification, Post
+from .notifications import comment_events, event, notify
+from .tags import forget_post, index_posts, reindex
+from .text import render_posts, rerender
+from .trending import add_comments, post_term, recompute_hot_scores
+
+FEED_VERSION_KEY = 'posts:feed_version'
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    ''' Отключает обработчики сигналов на время массовой загрузки.
+
+    После загрузки нужно вызвать after_bulk_load: он пересчитывает
+    всё, что обработчики поддерживают по одной записи.
+    '''
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = False
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def after_bulk_load(index=True):
+    ''' Полный пересчёт после загрузки в обход сигналов. '''
+    recompute_hot_scores()
+    # Посты без HTML - загруженные сейчас: у них нет и строк индекса.
+    fresh = Post.objects.filter(text_html='')
+    if index:
+        reindex(fresh, new=True)
+    rerender(fresh)
+    if settings.FOLLOW_GRAPH_ENABLED:
+        follow_graph.rebuild()
+    forget_latest(Group.objects.values_list('id', flat=True))
+    bump_feed_version()
+
+
+def get_feed_version():
+    ''' Текущая версия лент: входит в ключи кэшированных фрагментов. '''
+    return cache.get_or_set(FEED_VERSION_KEY, _initial_version, None)
+
+
+def bump_feed_version():
+    ''' Инвалидирует кэшированные фрагменты всех лент разом. '''
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        cache.set(FEED_VERSION_KEY, _initial_version(), None)
+
+
+def _initial_version():
+    # Версия от времени не совпадёт с версиями фрагментов,
+    # которые могли пережить вытеснение самого ключа.
+    return int(time.time() * 1000)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def feed_changed(sender, **kwargs):
+    if not is_suspended():
+        bump_feed_version()
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created and not is_suspended():
+        note_new_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    forget_latest([instance.group_id])
+
+
+@receiver(post_save, sender=Post)
+def initial_hot_score(sender, instance, created, **kwargs):
+    # После вставки: pub_date проставляет auto_now_add при сохранении.
+    if created and not is_suspended():
+        instance.hot_score = post_term(
+            instance.pub_date, instance.author.following.count()
+        )
+        Post.objects.filter(pk=instance.pk).update(
+            hot_score=instance.hot_score
+        )
+
+
+@receiver(pre_save, sender=Post)
+def render_text_html(sender, instance, update_fields=None, **kwargs):
+    if is_suspended():
+        return
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    render_posts([instance])
+
+
+@receiver(post_save, sender=Post)
+def index_text(sender, instance, created, update_fields=None, **kwargs):
+    if is_suspended():
+        return
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    mentioned = index_posts([instance], new=created)
+    notify([
+        event(Notification.MENTION, user_id, instance.author_id, post_id)
+        for post_id, user_id in sorted(mentioned)
+    ])
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    forget_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created and not is_suspended():
+        add_comments([instance])
+        publish_comments([instance])
+        notify(comment_events([instance]))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_GRAPH_ENABLED:
+        follow_graph.followed(instance.user_id, instance.author_id)
+    if created and not is_suspended():
+        notify([
+            event(Notification.FOLLOW, instance.author_id, instance.user_id)
+        ])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if settings.FOLLOW_GRAPH_ENABLED:
+        follow_graph.unfollowed(instance.user_id, instance.author_id)
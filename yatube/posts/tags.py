@@ -0,0 +1,139 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Mention, Post, PostTag, Tag, User
+from .text import IN_CHUNK, hashtags, mentions
+
+
+def _ids(model, field, values):
+    ''' Словарь значение -> id для ``values`` поля ``field``. '''
+    values = sorted(values)
+    ids = {}
+    for start in range(0, len(values), IN_CHUNK):
+        ids.update(model.objects.filter(**{
+            f'{field}__in': values[start:start + IN_CHUNK]
+        }).values_list(field, 'id'))
+    return ids
+
+
+def tag_ids(names):
+    ''' id тегов по именам; недостающие теги создаются. '''
+    ids = _ids(Tag, 'name', names)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in missing],
+            batch_size=IN_CHUNK, ignore_conflicts=True,
+        )
+        ids.update(_ids(Tag, 'name', missing))
+    return ids
+
+
+def _sync(model, field, wanted, post_ids, new, extra=None):
+    ''' Приводит строки (post_id, ``field``_id) постов к ``wanted``.
+
+    Возвращает добавленные и удалённые пары. У новых постов строк
+    ещё нет, и существующие не читаются. ``extra`` - остальные поля
+    новых строк по post_id.
+    '''
+    extra = extra or {}
+    column = f'{field}_id'
+    existing = set()
+    if not new:
+        for start in range(0, len(post_ids), IN_CHUNK):
+            existing.update(model.objects.filter(
+                post_id__in=post_ids[start:start + IN_CHUNK]
+            ).values_list('post_id', column))
+    added = wanted - existing
+    removed = existing - wanted
+    model.objects.bulk_create(
+        [model(post_id=post_id, **{column: value}, **extra.get(post_id, {}))
+         for post_id, value in sorted(added)],
+        batch_size=IN_CHUNK,
+    )
+    by_post = defaultdict(list)
+    for post_id, value in removed:
+        by_post[post_id].append(value)
+    for post_id, values in by_post.items():
+        model.objects.filter(
+            post_id=post_id, **{f'{column}__in': values}
+        ).delete()
+    return added, removed
+
+
+def _update_counts(added, removed):
+    deltas = Counter(tag_id for _, tag_id in added)
+    deltas.subtract(tag_id for _, tag_id in removed)
+    by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(tag_id)
+    # Один UPDATE на каждое различное изменение, а не на каждый тег.
+    for delta, ids in by_delta.items():
+        for start in range(0, len(ids), IN_CHUNK):
+            Tag.objects.filter(id__in=ids[start:start + IN_CHUNK]).update(
+                post_count=F('post_count') + delta
+            )
+
+
+@transaction.atomic
+def index_posts(posts, new=False):
+    ''' Приводит теги и упоминания постов к их текстам.
+
+    Меняются только разошедшиеся строки, поэтому правка поста стоит
+    пары запросов. ``new`` - у постов точно нет строк индекса.
+    Возвращает добавленные упоминания: пары (post_id, user_id).
+    '''
+    post_tags = {post.id: hashtags(post.text) for post in posts}
+    post_mentions = {post.id: mentions(post.text) for post in posts}
+    tags = tag_ids(set().union(*post_tags.values()))
+    users = _ids(User, 'username', set().union(*post_mentions.values()))
+    post_ids = sorted(post_tags)
+    # Дата поста копируется в строки тегов для ленты тега.
+    dates = {post.id: {'pub_date': post.pub_date} for post in posts}
+    added, removed = _sync(PostTag, 'tag', {
+        (post_id, tags[name])
+        for post_id, names in post_tags.items() for name in names
+    }, post_ids, new, dates)
+    _update_counts(added, removed)
+    added, _ = _sync(Mention, 'user', {
+        (post_id, users[name])
+        for post_id, names in post_mentions.items()
+        for name in names if name in users
+    }, post_ids, new)
+    return added
+
+
+def reindex(queryset=None, batch_size=None, new=False):
+    ''' Индекс тегов и упоминаний постов пачками по ``batch_size``. '''
+    batch_size = batch_size or settings.TEXT_RENDER_BATCH
+    if queryset is None:
+        queryset = Post.objects.all()
+    queryset = queryset.order_by('id').only('id', 'text', 'pub_date')
+    indexed = last_id = 0
+    while True:
+        posts = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not posts:
+            return indexed
+        index_posts(posts, new=new)
+        indexed += len(posts)
+        last_id = posts[-1].id
+
+
+def forget_post(post):
+    ''' Уменьшает счётчики тегов удаляемого поста. '''
+    Tag.objects.filter(post_tags__post=post).update(
+        post_count=F('post_count') - 1
+    )
+
+
+def recount_tags():
+    ''' Пересчитывает счётчики всех тегов одним UPDATE. '''
+    counts = PostTag.objects.filter(tag=OuterRef('pk')).order_by().values(
+        'tag'
+    ).annotate(count=Count('id')).values('count')
+    return Tag.objects.update(post_count=Coalesce(Subquery(counts), 0))
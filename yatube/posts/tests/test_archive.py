@@ -0,0 +1,68 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, ARCHIVE_CHUNK_SIZE=2,
+                   ARCHIVE_FILE_CHUNK=16)
+class ArchiveViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.image = b'GIF89a' + bytes(range(100))
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', cls.image, 'image/gif'),
+        )
+        for number in range(4):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+        Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='Чужой пост',
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_archive_contains_own_posts_and_images(self):
+        '''Архив содержит все посты автора и исходные картинки.'''
+        response = self.authorized_client.get(reverse('posts:archive'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 5)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        posts = json.loads(archive.read('posts.json'))
+        self.assertEqual(len(posts), 5)
+        self.assertEqual(posts[0]['text'], self.post.text)
+        self.assertEqual(posts[0]['group'], self.group.slug)
+        self.assertEqual(archive.read(posts[0]['image']), self.image)
+        self.assertIsNone(posts[1]['image'])
+
+    def test_archive_requires_login(self):
+        '''Анонимного пользователя отправляет на страницу входа.'''
+        response = Client().get(reverse('posts:archive'))
+        self.assertEqual(response.status_code, 302)
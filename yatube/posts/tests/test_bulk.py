@@ -0,0 +1,119 @@
+import datetime as dt
+import io
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from posts.bulk import Importer, RecordWriter, export_records, read_records
+from posts.models import Comment, Follow, Group, Post, User
+from posts.signals import FEED_VERSION_KEY, get_feed_version
+
+
+class BulkImportExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.date = timezone.make_aware(dt.datetime(2020, 5, 17, 12, 30))
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        Post.objects.filter(pk=cls.post.pk).update(pub_date=cls.date)
+        comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Comment.objects.filter(pk=comment.pk).update(created=cls.date)
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, file_format):
+        buffer = io.StringIO()
+        export_records(RecordWriter(buffer, file_format))
+        buffer.seek(0)
+        return buffer
+
+    def assertRoundtrip(self, file_format):
+        source = self.export(file_format)
+        imported = Importer().load(read_records(source, file_format))
+        self.assertEqual(imported, 4)
+        self.assertEqual(Post.objects.count(), 2)
+        copy = Post.objects.order_by('-id').first()
+        self.assertNotEqual(copy.pk, self.post.pk)
+        self.assertEqual(copy.text, self.post.text)
+        self.assertEqual(copy.group, self.group)
+        self.assertEqual(copy.pub_date, self.date)
+        self.assertEqual(copy.comments.get().author, self.reader)
+        self.assertEqual(copy.comments.get().created, self.date)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_ndjson_roundtrip(self):
+        '''Выгрузка NDJSON загружается обратно с теми же датами.'''
+        self.assertRoundtrip('ndjson')
+
+    def test_csv_roundtrip(self):
+        '''Выгрузка CSV загружается обратно с теми же датами.'''
+        self.assertRoundtrip('csv')
+
+    def test_import_creates_missing_authors(self):
+        '''Неизвестные авторы создаются, подписки на себя пропускаются.'''
+        source = io.StringIO(
+            '{"model": "post", "id": 1, "author": "new", "text": "Пост"}\n'
+            '{"model": "follow", "user": "new", "author": "new"}\n'
+        )
+        Importer(batch_size=1).load(read_records(source, 'ndjson'))
+        author = User.objects.get(username='new')
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(author.posts.get().text, 'Пост')
+        self.assertFalse(Follow.objects.filter(user=author).exists())
+
+    def test_import_writes_rows_once(self):
+        '''Даты из выгрузки пишутся той же вставкой, без UPDATE.'''
+        source = self.export('ndjson')
+        with CaptureQueriesContext(connection) as queries:
+            Importer().load(read_records(source, 'ndjson'))
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE') and (
+                '"pub_date"' in query['sql'] or '"created"' in query['sql']
+            )
+        ])
+
+    def test_duplicate_group_slugs_in_batch(self):
+        '''Повтор slug в одной пачке создаёт одну группу.'''
+        source = io.StringIO(
+            '{"model": "group", "slug": "twice", "title": "Первая"}\n'
+            '{"model": "group", "slug": "twice", "title": "Вторая"}\n'
+        )
+        Importer().load(read_records(source, 'ndjson'))
+        self.assertEqual(Group.objects.get(slug='twice').title, 'Первая')
+
+    def test_import_bumps_feed_version_once(self):
+        '''Сигналы отключены на время загрузки, версия лент - одна.'''
+        version = get_feed_version()
+        Importer(batch_size=1).load(read_records(self.export('ndjson'),
+                                                 'ndjson'))
+        self.assertEqual(cache.get(FEED_VERSION_KEY), version + 1)
+
+    def test_commands(self):
+        '''Команды export_posts и import_posts работают через файлы.'''
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f'{temp_dir}/posts.csv'
+            call_command('export_posts', path, stdout=out)
+            call_command('import_posts', path, stdout=out)
+        self.assertIn('Загружено записей: 4', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
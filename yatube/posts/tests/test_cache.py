@@ -0,0 +1,120 @@
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, User
+from posts.signals import get_feed_version
+from posts.warmup import (FeedHitsTracker, feed_hits, hot_feeds, warm_cache,
+                          warmup_hosts)
+
+
+@override_settings(
+    CACHE_WARMUP_WORKERS=1, CACHE_WARMUP_HOSTS=['testserver']
+)
+class CacheWarmupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        feed_hits.clear()
+
+    def tearDown(self):
+        cache.clear()
+        feed_hits.clear()
+
+    def test_feed_hits_are_tracked(self):
+        '''Просмотры лент попадают в рейтинг прогрева.'''
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        for _ in range(3):
+            self.client.get(url)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            hot_feeds(2),
+            [('posts:group_posts', self.group.slug), ('posts:index', None)]
+        )
+
+    def test_feed_hits_are_shared_between_processes(self):
+        '''Счётчики лежат в кэше: рейтинг видят другие процессы.'''
+        first, second = FeedHitsTracker(flush_every=2), FeedHitsTracker()
+        for _ in range(2):
+            first.hit('posts:profile', 'auth')
+        second.hit('posts:index')
+        self.assertEqual(second.most_common(2), [
+            ('posts:profile', 'auth'), ('posts:index', None),
+        ])
+        second.clear()
+
+    def test_hot_feeds_fallback_without_hits(self):
+        '''Без статистики прогреваются самые наполненные ленты.'''
+        self.assertEqual(hot_feeds(1), [
+            ('posts:index', None),
+            ('posts:group_posts', self.group.slug),
+            ('posts:profile', self.user.username),
+        ])
+
+    def test_warm_cache_fills_index_page_cache(self):
+        '''После прогрева главная отдаётся из кэша.'''
+        warmed = warm_cache(feeds=1, pages=2)
+        self.assertIn(('http://testserver/', 1), warmed)
+        self.assertFalse(feed_hits.most_common(1))
+        Post.objects.all().delete()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+
+    @override_settings(
+        CACHE_WARMUP_HOSTS=None,
+        ALLOWED_HOSTS=['example.com', '.example.org', '*', 'testserver'],
+    )
+    def test_warm_cache_under_each_allowed_host(self):
+        '''Страницы греются под каждым хостом из ALLOWED_HOSTS.'''
+        self.assertEqual(warmup_hosts(), ['example.com', 'testserver'])
+        warmed = warm_cache(feeds=1, pages=1)
+        self.assertIn(('http://example.com/', 1), warmed)
+        Post.objects.all().delete()
+        response = Client(HTTP_HOST='example.com').get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+
+    def test_feed_version_changes_on_post_save(self):
+        '''Новый пост инвалидирует кэшированные фрагменты лент.'''
+        version = get_feed_version()
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertNotEqual(get_feed_version(), version)
+
+    def test_warm_cache_command(self):
+        '''Команда греет только общий кэш, кэш в памяти - ошибка.'''
+        with self.assertRaises(CommandError):
+            call_command('warm_cache', feeds=1, pages=1)
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': location,
+            }}):
+                call_command('warm_cache', feeds=1, pages=1, stdout=out)
+        self.assertIn('Прогрето лент: 3, страниц: 3', out.getvalue())
+
+    def test_warmup_keeps_request_signals(self):
+        '''Прогрев не отключает close_old_connections у запросов сервера.'''
+        with mock.patch.object(request_started, 'disconnect') as disconnect:
+            warmed = warm_cache(feeds=1, pages=1)
+        disconnect.assert_not_called()
+        self.assertIn(('http://testserver/', 1), warmed)
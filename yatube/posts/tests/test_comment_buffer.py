@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from core.buffer import WriteBehindBuffer
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.comment_buffer import comment_buffer, save_comments
+from posts.models import Comment, Post, User
+
+
+class WriteBehindBufferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.spool = os.path.join(self.spool_dir, 'comments.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def record(self, text):
+        return {'post_id': self.post.id, 'author_id': self.user.id,
+                'text': text}
+
+    def test_flush_saves_batch_and_removes_spool(self):
+        '''Накопленные записи сохраняются одним сбросом.'''
+        buffer = WriteBehindBuffer(save_comments, self.spool, max_items=10)
+        for number in range(3):
+            buffer.submit(self.record(f'comment {number}'))
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_full_buffer_flushes_without_thread(self):
+        buffer = WriteBehindBuffer(save_comments, self.spool, max_items=2)
+        buffer.submit(self.record('first'))
+        buffer.submit(self.record('second'))
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(buffer.pending(), [])
+
+    def test_spool_of_dead_process_is_replayed(self):
+        '''Журнал упавшего процесса сохраняется при следующем сбросе.'''
+        orphan = f'{self.spool}.999999999-1.0'
+        with open(orphan, 'w', encoding='utf-8') as spool:
+            spool.write(json.dumps(self.record('lost')) + '\n')
+        buffer = WriteBehindBuffer(save_comments, self.spool)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(Comment.objects.filter(text='lost').exists())
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_orphan_is_replayed_by_one_process(self):
+        '''Журнал, забранный другим процессом, не сохраняется дважды.'''
+        orphan = f'{self.spool}.999999999-1.0'
+        with open(orphan, 'w', encoding='utf-8') as spool:
+            spool.write(json.dumps(self.record('lost')) + '\n')
+        first = WriteBehindBuffer(save_comments, self.spool)
+        second = WriteBehindBuffer(save_comments, self.spool)
+        self.assertEqual(first.flush(), 1)
+        # Второй процесс успел увидеть журнал до того, как его забрали.
+        with mock.patch('core.buffer.glob.glob', return_value=[orphan]):
+            self.assertEqual(second.flush(), 0)
+        self.assertEqual(Comment.objects.filter(text='lost').count(), 1)
+
+
+@override_settings(COMMENT_BUFFER_ENABLED=True)
+class BufferedCommentViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.spool_path = comment_buffer.spool_path
+        comment_buffer.spool_path = os.path.join(self.spool_dir, 'c.ndjson')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        comment_buffer.flush()
+        comment_buffer.spool_path = self.spool_path
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def test_author_sees_buffered_comment_once(self):
+        '''Автор сразу видит свой комментарий, и после сохранения тоже.'''
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Буферизованный комментарий'},
+        )
+        self.assertEqual(Comment.objects.count(), 0)
+        response = self.client.get(url)
+        self.assertContains(response, 'Буферизованный комментарий', count=1)
+        self.assertNotContains(
+            Client().get(url), 'Буферизованный комментарий'
+        )
+        comment_buffer.flush()
+        self.assertEqual(Comment.objects.count(), 1)
+        response = self.client.get(url)
+        self.assertContains(response, 'Буферизованный комментарий', count=1)
+        self.assertEqual(self.client.session['pending_comments'], [])
@@ -0,0 +1,162 @@
+from unittest import mock
+
+from core.pubsub import hub
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.comment_buffer import save_comments
+from posts.comment_stream import channel, event_id
+from posts.models import Comment, Post, User
+
+
+def run_now(func):
+    func()
+
+
+@override_settings(COMMENT_STREAM_ENABLED=True,
+                   COMMENT_STREAM_KEEPALIVE_SECONDS=0.01,
+                   COMMENT_STREAM_MAX_SECONDS=0.5)
+@mock.patch('posts.comment_stream.transaction.on_commit', run_now)
+class CommentStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse(
+            'posts:comment_stream', kwargs={'post_id': self.post.id}
+        )
+
+    def open_stream(self, **headers):
+        response = self.client.get(self.url, **headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertTrue(next(stream).startswith(b'retry:'))
+        return response, stream
+
+    def next_event(self, stream):
+        for chunk in stream:
+            if not chunk.startswith(b':'):
+                return chunk.decode()
+        return None
+
+    def test_new_comment_pushed_to_all_viewers(self):
+        '''Один комментарий рендерится один раз и уходит всем зрителям.'''
+        streams = [self.open_stream() for _ in range(3)]
+        self.assertEqual(hub.subscribers(channel(self.post.id)), 3)
+        with mock.patch(
+            'posts.comment_stream.render_to_string', return_value='<p>Новый'
+        ) as render:
+            comment = Comment.objects.create(
+                post=self.post, author=self.user, text='Новый'
+            )
+        self.assertEqual(render.call_count, 1)
+        for response, stream in streams:
+            event = self.next_event(stream)
+            self.assertIn(f'id: {event_id(comment)}', event)
+            self.assertIn('Новый', event)
+            response.close()
+        self.assertEqual(hub.subscribers(channel(self.post.id)), 0)
+
+    def test_buffered_comments_are_pushed(self):
+        '''Комментарии из буфера записи тоже рассылаются.'''
+        response, stream = self.open_stream()
+        save_comments([{
+            'post_id': self.post.id, 'author_id': self.user.id,
+            'text': 'Из буфера',
+        }])
+        self.assertIn('Из буфера', self.next_event(stream))
+        response.close()
+
+    def test_reconnect_replays_missed_comments(self):
+        '''После переподключения приходят пропущенные комментарии.'''
+        seen = Comment.objects.create(
+            post=self.post, author=self.user, text='Прочитанный'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Пропущенный'
+        )
+        response, stream = self.open_stream(
+            HTTP_LAST_EVENT_ID=str(event_id(seen))
+        )
+        event = self.next_event(stream)
+        self.assertIn('Пропущенный', event)
+        self.assertNotIn('Прочитанный', event)
+        response.close()
+
+    def test_oversized_last_event_id(self):
+        '''Слишком большой Last-Event-ID не роняет поток.'''
+        response, stream = self.open_stream(HTTP_LAST_EVENT_ID='9' * 30)
+        self.assertTrue(next(stream).startswith(b':'))
+        response.close()
+
+    def test_stream_for_missing_post(self):
+        '''Для несуществующего поста - 404.'''
+        response = self.client.get(
+            reverse('posts:comment_stream', kwargs={'post_id': 10 ** 6})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentPollTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse(
+            'posts:new_comments', kwargs={'post_id': self.post.id}
+        )
+
+    def test_stream_is_opt_in(self):
+        '''Без COMMENT_STREAM_ENABLED страница опрашивает сервер.'''
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertNotContains(response, 'EventSource(')
+        self.assertContains(response, self.url)
+        self.assertEqual(
+            self.client.get(reverse(
+                'posts:comment_stream', kwargs={'post_id': self.post.id}
+            )).status_code,
+            404,
+        )
+
+    def test_poll_returns_newer_comments(self):
+        '''Опрос отдаёт комментарии новее курсора, новые - первыми.'''
+        seen = Comment.objects.create(
+            post=self.post, author=self.user, text='Прочитанный'
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(response.context['comments_cursor'], event_id(seen))
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Первый'
+        )
+        last = Comment.objects.create(
+            post=self.post, author=self.user, text='Второй'
+        )
+        data = self.client.get(self.url, {'after': event_id(seen)}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['cursor'], str(event_id(last)))
+        self.assertLess(data['html'].index('Второй'), data['html'].index(
+            'Первый'
+        ))
+        self.assertNotIn('Прочитанный', data['html'])
+        data = self.client.get(self.url, {'after': data['cursor']}).json()
+        self.assertEqual(data['count'], 0)
+
+    def test_poll_with_bad_cursor(self):
+        '''Неверный или слишком большой курсор - пустой ответ.'''
+        for after in ('', 'abc', '9' * 30):
+            with self.subTest(after=after):
+                data = self.client.get(self.url, {'after': after}).json()
+                self.assertEqual(data['count'], 0)
+                self.assertEqual(data['cursor'], after)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.graph import FollowGraphIndex, build_snapshot
+from posts.models import Follow, User
+
+
+class FollowGraphIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'follows.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_snapshot_queries(self):
+        '''Подписки, подписчики и взаимные подписки из снимка.'''
+        build_snapshot([(1, 3), (1, 2), (2, 1), (5, 1)], self.path)
+        index = FollowGraphIndex(self.path)
+        self.assertEqual(index.following(1), [2, 3])
+        self.assertEqual(index.followers(1), [2, 5])
+        self.assertEqual(index.mutual(1), [2])
+        self.assertTrue(index.is_following(5, 1))
+        self.assertFalse(index.is_following(1, 5))
+        self.assertFalse(index.is_following(100, 1))
+        self.assertEqual(index.followers(100), [])
+        self.assertEqual(index.stats()['edges'], 4)
+
+    @override_settings(FOLLOW_GRAPH_ENABLED=True)
+    def test_signals_update_overlay(self):
+        '''Подписка и отписка видны сразу, без нового снимка.'''
+        first, second = self.users[:2]
+        index = FollowGraphIndex(self.path)
+        index.load()
+        with mock.patch('posts.signals.follow_graph', index):
+            follow = Follow.objects.create(user=first, author=second)
+            self.assertTrue(index.is_following(first.id, second.id))
+            self.assertEqual(index.followers(second.id), [first.id])
+            follow.delete()
+            self.assertFalse(index.is_following(first.id, second.id))
+
+    @override_settings(FOLLOW_GRAPH_CHECK_SECONDS=0)
+    def test_reloads_new_snapshot(self):
+        '''Новый снимок подхватывается по времени изменения файла.'''
+        build_snapshot([(1, 2)], self.path)
+        index = FollowGraphIndex(self.path)
+        self.assertFalse(index.is_following(2, 1))
+        build_snapshot([(1, 2), (2, 1)], self.path)
+        os.utime(self.path, (0, 0))
+        self.assertTrue(index.is_following(2, 1))
+
+    def test_profile_sees_follow_from_other_process(self):
+        '''Флаг подписки верен, даже если наложение в другом процессе.'''
+        reader, author = self.users[:2]
+        build_snapshot([], self.path)
+        index = FollowGraphIndex(self.path)
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:profile', args=(author.username,))
+        with override_settings(FOLLOW_GRAPH_ENABLED=True), mock.patch(
+            'posts.views.follow_graph', index
+        ):
+            self.assertFalse(client.get(url).context['following'])
+            client.get(reverse('posts:profile_follow', args=(
+                author.username,
+            )))
+            # Подписка записалась в наложение другого процесса.
+            self.assertFalse(index.is_following(reader.id, author.id))
+            self.assertTrue(client.get(url).context['following'])
+            build_snapshot(
+                Follow.objects.values_list('user_id', 'author_id'), self.path
+            )
+            index.load()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(client.get(url).context['following'])
+            self.assertFalse(any(
+                'posts_follow"' in query['sql'] for query in queries
+            ))
@@ -0,0 +1,123 @@
+import datetime as dt
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Group, GroupSubscription, Post, User
+from posts.utils import decode_cursor, encode_cursor
+
+from yatube.settings import POSTS_PER_PAGE
+
+
+class GroupsFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {number}',
+                slug=f'group-{number}',
+                description='Тестовое описание',
+            )
+            for number in range(3)
+        ]
+        start = timezone.now() - dt.timedelta(days=1)
+        for number in range(POSTS_PER_PAGE * 2):
+            post = Post.objects.create(
+                author=cls.user,
+                group=cls.groups[number % 3],
+                text=f'Пост {number}',
+            )
+            # У части постов одинаковая дата: порядок решает id.
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + dt.timedelta(minutes=number // 2)
+            )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def expected(self, groups):
+        return list(Post.objects.filter(group__in=groups).order_by(
+            '-pub_date', '-id'
+        ))
+
+    def test_cursor_roundtrip(self):
+        '''Курсор хранит дату с точностью до микросекунды и id.'''
+        post = Post.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(post)), (post.pub_date, post.id)
+        )
+        self.assertIsNone(decode_cursor('мусор'))
+
+    def test_oversized_cursor(self):
+        '''Курсор за пределами дат не роняет ленты и опрос.'''
+        oversized = '99999999999999999999-1'
+        self.assertIsNone(decode_cursor(oversized))
+        self.assertIsNone(decode_cursor(f'1-{10 ** 20}'))
+        Post.objects.create(author=self.user, text='#тег')
+        for url, params in (
+            (reverse('posts:groups_feed'), {'slug': 'group-0'}),
+            (reverse('posts:my_groups'), {}),
+            (reverse('posts:tag_posts', args=('тег',)), {}),
+            (reverse('posts:new_posts'), {}),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, {'after': oversized, **params}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_multi_group_feed_pages(self):
+        '''Лента двух групп листается курсором без пропусков и повторов.'''
+        url = reverse('posts:groups_feed')
+        slugs = 'group-0,group-2'
+        seen = []
+        cursor = ''
+        while True:
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    url, {'slug': slugs, 'after': cursor}
+                )
+            page = response.context['page_obj']
+            seen.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor()
+        self.assertEqual(seen, self.expected(self.groups[::2]))
+
+    def test_cached_page_skips_posts_query(self):
+        '''Повторный запрос берёт посты из кэша фрагмента.'''
+        url = reverse('posts:groups_feed')
+        self.client.get(url, {'slug': 'group-1'})
+        with self.assertNumQueries(1):
+            self.client.get(url, {'slug': 'group-1'})
+
+    def test_unknown_groups_not_found(self):
+        '''Лента без существующих групп отдаёт 404.'''
+        response = self.client.get(
+            reverse('posts:groups_feed'), {'slug': 'missing'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_my_groups_follow_subscriptions(self):
+        '''"Мои группы" собирается из подписок пользователя.'''
+        self.authorized_client.get(
+            reverse('posts:group_subscribe', kwargs={'slug': 'group-1'})
+        )
+        self.assertTrue(GroupSubscription.objects.filter(
+            user=self.user, group=self.groups[1]
+        ).exists())
+        response = self.authorized_client.get(reverse('posts:my_groups'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            self.expected(self.groups[1:2])[:POSTS_PER_PAGE],
+        )
+        self.authorized_client.get(
+            reverse('posts:group_unsubscribe', kwargs={'slug': 'group-1'})
+        )
+        response = self.authorized_client.get(reverse('posts:my_groups'))
+        self.assertEqual(len(response.context['page_obj']), 0)
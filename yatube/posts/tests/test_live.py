@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.live import latest_cursor
+from posts.models import Follow, Group, Post, User
+from posts.utils import encode_cursor
+
+
+class NewPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, text='Первый')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:new_posts')
+        self.cursor = encode_cursor(self.post)
+
+    def test_no_new_posts_without_queries(self):
+        '''Пока маркер в кэше не новее курсора, база не нужна.'''
+        latest_cursor()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'after': self.cursor})
+        self.assertEqual(response.json()['count'], 0)
+        self.assertEqual(response.json()['cursor'], self.cursor)
+
+    def test_new_post_moves_marker_and_is_returned(self):
+        '''Новый пост сдвигает маркер и приходит готовым HTML.'''
+        latest_cursor()
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост'
+        )
+        self.assertEqual(latest_cursor(), encode_cursor(post))
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {'after': self.cursor}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['cursor'], encode_cursor(post))
+        self.assertIn('Свежий пост', data['html'])
+
+    def test_group_feed_uses_own_marker(self):
+        '''Пост вне группы не будит опрос ленты группы.'''
+        params = {
+            'feed': 'group', 'group': self.group.id, 'after': self.cursor,
+        }
+        Post.objects.create(author=self.user, text='Без группы')
+        data = self.client.get(self.url, params).json()
+        self.assertEqual(data['count'], 0)
+        Post.objects.create(author=self.user, group=self.group, text='В')
+        data = self.client.get(self.url, params).json()
+        self.assertEqual(data['count'], 1)
+
+    def test_follow_feed_counts_only_followed_authors(self):
+        '''Лента подписок считает только посты избранных авторов.'''
+        Post.objects.create(author=self.user, text='Свой пост')
+        Post.objects.create(author=self.author, text='Пост автора')
+        params = {'feed': 'follow', 'after': self.cursor}
+        data = self.authorized_client.get(self.url, params).json()
+        self.assertEqual(data['count'], 1)
+        self.assertIn('Пост автора', data['html'])
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 401)
+
+    def test_index_renders_live_cursor(self):
+        '''Первая страница ленты отдаёт курсор самого нового поста.'''
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['live_cursor'], self.cursor)
+        self.assertContains(response, 'live-new-posts')
@@ -0,0 +1,166 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.comment_buffer import save_comments
+from posts.models import Comment, Notification, Post, User
+from posts.notifications import (_claim, comment_events, event,
+                                 notification_buffer, save_notifications,
+                                 send_digests)
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='auth', email='auth@example.com'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_and_comment_notify_author(self):
+        '''Подписка и комментарии из запросов дают уведомления автору.'''
+        self.client.get(reverse('posts:profile_follow', args=('auth',)))
+        for number in range(3):
+            self.client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                {'text': f'Комментарий {number}'},
+            )
+        self.assertEqual(
+            set(Notification.objects.values_list('kind', 'count')),
+            {(Notification.FOLLOW, 1), (Notification.COMMENT, 3)},
+        )
+        note = Notification.objects.get(kind=Notification.COMMENT)
+        self.assertEqual(
+            note.summary(), 'Новых комментариев к посту «Тестовый пост»: 3'
+        )
+
+    def test_mentions_and_own_events(self):
+        '''Упоминание уведомляет один раз, свои действия - не уведомляют.'''
+        post = Post.objects.create(author=self.reader, text='@auth @reader')
+        post.text = '@auth, ещё раз'
+        post.save()
+        Comment.objects.create(post=self.post, author=self.author, text='Я')
+        self.assertEqual(
+            list(Notification.objects.values_list(
+                'recipient__username', 'kind', 'count'
+            )),
+            [('auth', Notification.MENTION, 1)],
+        )
+
+    def test_batch_collapses_events(self):
+        '''Пачка событий - одна запись на получателя, тип и пост.'''
+        save_comments([
+            {'post_id': self.post.id, 'author_id': self.reader.id,
+             'text': f'Буфер {number}'}
+            for number in range(50)
+        ])
+        note = Notification.objects.get()
+        self.assertEqual(note.count, 50)
+        note.read = True
+        note.save()
+        comments = list(Comment.objects.select_related('post')[:2])
+        with self.assertNumQueries(2):
+            save_notifications(comment_events(comments))
+        self.assertEqual(
+            list(Notification.objects.values_list('read', 'count')),
+            [(False, 2), (True, 50)],
+        )
+
+    def test_inbox_marks_page_read(self):
+        '''Входящие показывают уведомления и помечают их прочитанными.'''
+        save_notifications([
+            event(Notification.FOLLOW, self.author.id, self.reader.id)
+        ])
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:notifications'))
+        self.assertContains(response, 'Новый подписчик: reader')
+        self.assertEqual(len(response.context['unread']), 1)
+        self.assertTrue(Notification.objects.get().read)
+        response = self.client.get(reverse('posts:notifications'))
+        self.assertEqual(response.context['unread'], [])
+
+    def test_digests(self):
+        '''Дайджест - одно письмо на получателя, повторно не уходит.'''
+        save_notifications([
+            event(Notification.FOLLOW, self.author.id, self.reader.id),
+            event(Notification.COMMENT, self.author.id, self.reader.id,
+                  self.post.id),
+            event(Notification.FOLLOW, self.reader.id, self.author.id),
+        ])
+        self.assertEqual(send_digests(batch_size=1), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
+        self.assertIn('Новый подписчик: reader', mail.outbox[0].body)
+        self.assertFalse(
+            Notification.objects.filter(emailed=False).exists()
+        )
+        out = io.StringIO()
+        call_command('send_digests', stdout=out)
+        self.assertIn('Отправлено дайджестов: 0', out.getvalue())
+
+    def test_digest_claim_keeps_concurrent_events(self):
+        '''События, пришедшие во время рассылки, не теряются.'''
+        follow = event(Notification.FOLLOW, self.author.id, self.reader.id)
+        save_notifications([follow])
+        stale = Notification.objects.get()
+        # Прибавка после чтения: устаревшая запись не забирается.
+        save_notifications([follow])
+        self.assertEqual(_claim([stale]), [])
+        note = Notification.objects.get()
+        self.assertEqual((note.count, note.emailed), (2, False))
+        # Прибавка после забора идёт в новую запись.
+        self.assertEqual(_claim([note]), [note])
+        save_notifications([follow])
+        self.assertEqual(
+            list(Notification.objects.order_by('id').values_list(
+                'count', 'emailed'
+            )),
+            [(2, True), (1, False)],
+        )
+
+
+@override_settings(NOTIFICATION_BUFFER_ENABLED=True)
+class BufferedNotificationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.spool_path = notification_buffer.spool_path
+        notification_buffer.spool_path = os.path.join(
+            self.spool_dir, 'n.ndjson'
+        )
+
+    def tearDown(self):
+        notification_buffer.flush()
+        notification_buffer.spool_path = self.spool_path
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def test_events_are_written_by_flush(self):
+        '''Запрос только ставит событие в буфер, запись - при сбросе.'''
+        client = Client()
+        client.force_login(self.reader)
+        for number in range(5):
+            client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                {'text': f'Комментарий {number}'},
+            )
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(len(notification_buffer.pending()), 5)
+        notification_buffer.flush()
+        self.assertEqual(Notification.objects.get().count, 5)
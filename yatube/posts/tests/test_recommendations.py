@@ -0,0 +1,93 @@
+import io
+import math
+import random
+from unittest import skipIf
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Follow, FollowSuggestion, User
+from posts import recommendations
+from posts.recommendations import (FollowGraph, SparseFollowGraph,
+                                   refresh_suggestions)
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('me', 'friend', 'twin', 'fof', 'cofollow', 'star')
+        }
+        edges = (
+            ('me', 'friend'),
+            ('me', 'star'),
+            ('friend', 'fof'),
+            ('twin', 'friend'),
+            ('twin', 'star'),
+            ('twin', 'cofollow'),
+        )
+        for user, author in edges:
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, *names):
+        return [self.users[name].id for name in names]
+
+    def test_suggest_ranks_candidates(self):
+        '''Рекомендации из друзей друзей и похожих читателей.'''
+        graph = FollowGraph.load()
+        me = self.users['me'].id
+        self.assertEqual(
+            sorted(graph.suggest(me, popular=[], size=5)),
+            sorted(self.ids('fof', 'cofollow')),
+        )
+        similarity, user = graph.similar_users(me)[0]
+        self.assertEqual(user, self.users['twin'].id)
+        self.assertAlmostEqual(similarity, 2 / math.sqrt(2 * 3))
+
+    def test_user_without_follows_gets_popular_authors(self):
+        '''Без подписок рекомендуются популярные авторы.'''
+        graph = FollowGraph.load()
+        star = self.users['star'].id
+        self.assertEqual(
+            graph.suggest(star, popular=self.ids('friend', 'star'), size=5),
+            self.ids('friend'),
+        )
+
+    @skipIf(recommendations.sparse is None, 'scipy не установлен')
+    def test_sparse_graph_matches_dict_graph(self):
+        '''Произведения матриц дают те же рекомендации, что и циклы.'''
+        rnd = random.Random(0)
+        edges = {
+            (rnd.randrange(1, 60), rnd.randrange(1, 60)) for _ in range(400)
+        }
+        edges = [(user, author) for user, author in edges if user != author]
+        users = list(range(0, 62))
+        popular = [1, 2, 3]
+        self.assertEqual(
+            SparseFollowGraph(edges).suggest_batch(users, popular, 5),
+            FollowGraph(edges).suggest_batch(users, popular, 5),
+        )
+
+    def test_refresh_stores_lists_and_profile_shows_them(self):
+        '''Команда сохраняет списки, профиль читает их одним запросом.'''
+        call_command('refresh_suggestions', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(FollowSuggestion.objects.count(), len(self.users))
+        self.assertEqual(refresh_suggestions(), len(self.users))
+        client = Client()
+        client.force_login(self.users['me'])
+        response = client.get(
+            reverse('posts:profile', kwargs={'username': 'star'})
+        )
+        names = [
+            author['username'] for author in response.context['suggestions']
+        ]
+        self.assertEqual(sorted(names), ['cofollow', 'fof'])
+        self.assertContains(response, 'Кого почитать')
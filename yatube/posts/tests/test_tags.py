@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.bulk import Importer
+from posts.models import Mention, Post, PostTag, Tag, User
+from posts.tags import recount_tags, reindex
+from posts.utils import TagPage
+
+
+class TagIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def tags(self, post):
+        return set(PostTag.objects.filter(post=post).values_list(
+            'tag__name', flat=True
+        ))
+
+    def counts(self):
+        return dict(Tag.objects.values_list('name', 'post_count'))
+
+    def test_index_on_save(self):
+        '''Теги и упоминания пишутся при создании поста.'''
+        post = Post.objects.create(
+            author=self.user, text='#Django и #python для @reader и @ghost'
+        )
+        self.assertEqual(self.tags(post), {'django', 'python'})
+        self.assertEqual(self.counts(), {'django': 1, 'python': 1})
+        self.assertEqual(
+            list(Mention.objects.values_list('post', 'user')),
+            [(post.id, self.reader.id)],
+        )
+
+    def test_index_on_edit_and_delete(self):
+        '''Правка меняет только разошедшиеся строки и счётчики.'''
+        post = Post.objects.create(author=self.user, text='#a #b @reader')
+        Post.objects.create(author=self.user, text='#b')
+        post.text = '#b #c'
+        post.save()
+        self.assertEqual(self.tags(post), {'b', 'c'})
+        self.assertEqual(self.counts(), {'a': 0, 'b': 2, 'c': 1})
+        self.assertFalse(Mention.objects.exists())
+        post.delete()
+        self.assertEqual(self.counts(), {'a': 0, 'b': 1, 'c': 0})
+
+    def test_other_updates_skip_index(self):
+        '''Сохранение без поля text не трогает индекс.'''
+        post = Post.objects.create(author=self.user, text='#a')
+        with self.assertNumQueries(1):
+            post.save(update_fields=['hot_score'])
+
+    def test_bulk_load_and_reindex(self):
+        '''Загрузка в обход сигналов, reindex и пересчёт счётчиков.'''
+        Importer().load([
+            {'model': 'post', 'id': str(number), 'author': 'auth',
+             'text': f'#load{number % 2} для @reader'}
+            for number in range(1, 5)
+        ])
+        self.assertEqual(self.counts(), {'load0': 2, 'load1': 2})
+        self.assertEqual(Mention.objects.count(), 4)
+        Tag.objects.update(post_count=0)
+        PostTag.objects.filter(tag__name='load0').delete()
+        reindex(batch_size=3)
+        self.assertEqual(self.tags(Post.objects.first()), {'load0'})
+        self.assertEqual(recount_tags(), 2)
+        self.assertEqual(self.counts(), {'load0': 2, 'load1': 2})
+
+    def test_bulk_load_without_index(self):
+        '''С index=False индекс строит вызывающий.'''
+        Importer(index=False).load([
+            {'model': 'post', 'id': '1', 'author': 'auth', 'text': '#skip'},
+        ])
+        self.assertFalse(PostTag.objects.exists())
+        reindex(new=True)
+        self.assertEqual(self.counts(), {'skip': 1})
+
+    def test_tag_page(self):
+        '''Лента тега: только посты с тегом, страницы по курсору.'''
+        for number in range(12):
+            Post.objects.create(author=self.user, text=f'#Тег пост {number}')
+        Post.objects.create(author=self.user, text='без тега')
+        url = reverse('posts:tag_posts', args=('тег',))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertEqual(response.context['tag'].post_count, 12)
+        response = self.client.get(url, {'after': page_obj.next_cursor()})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:tag_posts', args=('нет',))
+            ).status_code,
+            404,
+        )
+
+    def test_tag_page_reads_post_tag_index(self):
+        '''Лента тега идёт по индексу PostTag, без сортировки постов.'''
+        post = Post.objects.create(author=self.user, text='#индекс')
+        self.assertEqual(post.post_tags.get().pub_date, post.pub_date)
+        page = TagPage(PostTag.objects.filter(
+            tag=Tag.objects.get(name='индекс')
+        ).select_related('post__author', 'post__group'), None, 10)
+        sql, params = page.post_list.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('post_tag_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertEqual(page.posts, [post])
@@ -0,0 +1,122 @@
+import io
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.bulk import Importer
+from posts.models import Post, User
+from posts.text import hashtags, mentions, render_text, rerender
+
+
+class RenderTextTests(TestCase):
+    def test_plain_text_is_escaped(self):
+        '''Разметка из текста поста не попадает в HTML.'''
+        html = render_text('<script>alert(1)</script>\nи "кавычки"', set())
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
+        self.assertIn('<br>', html)
+        self.assertIn('&quot;кавычки&quot;', html)
+
+    def test_links(self):
+        '''Ссылки становятся тегами a без завершающей пунктуации.'''
+        html = render_text('См. https://example.com/a?b=1&c=2.', set())
+        self.assertIn(
+            '<a href="https://example.com/a?b=1&amp;c=2" '
+            'rel="nofollow noopener" target="_blank">', html
+        )
+        self.assertTrue(html.endswith('</a>.'))
+
+    def test_link_cannot_break_attribute(self):
+        '''Кавычки и угловые скобки не входят в ссылку.'''
+        html = render_text('http://x.com/"onmouseover="a<b>', set())
+        self.assertIn('href="http://x.com/"', html)
+        self.assertNotIn('"onmouseover="', html)
+
+    def test_mentions_only_for_known_users(self):
+        '''Ссылкой становится упоминание только существующего автора.'''
+        html = render_text('Привет, @auth и @ghost.', {'auth'})
+        self.assertIn(
+            f'<a href="{reverse("posts:profile", args=("auth",))}" '
+            'class="mention">@auth</a>', html
+        )
+        self.assertIn('@ghost.', html)
+        self.assertNotIn('profile/ghost', html)
+
+    def test_hashtags(self):
+        '''Хештеги ведут на ленту тега, решётка внутри слова - нет.'''
+        html = render_text('#Django и C#sharp', set())
+        self.assertIn(
+            f'<a href="{reverse("posts:tag_posts", args=("django",))}" '
+            'class="hashtag">#Django</a>', html
+        )
+        self.assertIn('C#sharp', html)
+        self.assertEqual(hashtags('#Django и #django, C#sharp'), {'django'})
+
+    def test_mentions(self):
+        '''Упоминания ищутся без адресов почты и точки в конце.'''
+        self.assertEqual(
+            mentions('@auth. mail@example.com @first.last'),
+            {'auth', 'first.last'},
+        )
+
+
+class PostTextHtmlTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_rendered_on_save(self):
+        '''HTML собирается при сохранении и обновляется с текстом.'''
+        post = Post.objects.create(author=self.user, text='Для @auth')
+        self.assertIn('class="mention"', post.text_html)
+        post.text = '<b>жирный</b>'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '&lt;b&gt;жирный&lt;/b&gt;')
+
+    def test_pages_show_escaped_html(self):
+        '''Страницы поста и ленты выводят готовый безопасный HTML.'''
+        post = Post.objects.create(
+            author=self.user, text='<script>x</script> https://example.com'
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(post.id,)),
+        ):
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertNotIn('<script>x</script>', content)
+                self.assertIn('href="https://example.com"', content)
+
+    def test_import_renders_posts(self):
+        '''Загрузка в обход сигналов тоже заполняет HTML.'''
+        Importer().load([
+            {
+                'model': 'post', 'id': '1', 'author': 'auth',
+                'text': 'Привет, @auth',
+            },
+        ])
+        post = Post.objects.get(text='Привет, @auth')
+        self.assertIn('class="mention"', post.text_html)
+
+    def test_rerender(self):
+        '''Пересборка пачками и команда render_posts.'''
+        for number in range(5):
+            Post.objects.create(author=self.user, text=f'@later {number}')
+        User.objects.create_user(username='later')
+        self.assertEqual(rerender(batch_size=2), 5)
+        self.assertEqual(
+            Post.objects.filter(text_html__contains='class="mention"').count(),
+            5,
+        )
+        Post.objects.update(text_html='')
+        out = io.StringIO()
+        call_command('render_posts', '--missing', stdout=out)
+        self.assertIn('Обработано постов: 5', out.getvalue())
+        self.assertFalse(Post.objects.filter(text_html='').exists())
@@ -0,0 +1,91 @@
+import datetime as dt
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts.comment_buffer import save_comments
+from posts.models import Comment, Follow, Post, User
+from posts.trending import (event_term, logaddexp2, post_term,
+                            recompute_hot_scores)
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+        cls.new_post = Post.objects.create(author=cls.reader, text='Новый')
+
+    def setUp(self):
+        cache.clear()
+        self.old_post.refresh_from_db()
+        self.new_post.refresh_from_db()
+
+    def test_initial_score_counts_followers(self):
+        '''Начальный счёт поста учитывает подписчиков автора.'''
+        self.assertAlmostEqual(
+            self.old_post.hot_score,
+            post_term(self.old_post.pub_date, 1),
+        )
+        self.assertAlmostEqual(
+            self.new_post.hot_score,
+            post_term(self.new_post.pub_date, 0),
+        )
+
+    def test_comment_adds_term_to_score(self):
+        '''Комментарий добавляет к счёту поста свой вклад.'''
+        score = self.new_post.hot_score
+        comment = Comment.objects.create(
+            post=self.new_post, author=self.author, text='Комментарий'
+        )
+        self.new_post.refresh_from_db()
+        self.assertAlmostEqual(
+            self.new_post.hot_score,
+            logaddexp2(score, event_term(comment.created)),
+        )
+
+    def test_buffered_comments_update_score(self):
+        '''Сохранение пачки комментариев тоже обновляет счёт.'''
+        score = self.old_post.hot_score
+        save_comments([
+            {'post_id': self.old_post.id, 'author_id': self.reader.id,
+             'text': f'Комментарий {number}'}
+            for number in range(3)
+        ])
+        self.old_post.refresh_from_db()
+        self.assertGreater(self.old_post.hot_score, score)
+
+    def test_incremental_score_matches_recompute(self):
+        '''Пошаговый счёт совпадает с полным пересчётом.'''
+        for number in range(3):
+            Comment.objects.create(
+                post=self.old_post, author=self.reader, text=f'{number}'
+            )
+        scores = dict(Post.objects.values_list('id', 'hot_score'))
+        recompute_hot_scores()
+        for post_id, score in Post.objects.values_list('id', 'hot_score'):
+            with self.subTest(post_id=post_id):
+                self.assertAlmostEqual(score, scores[post_id])
+
+    def test_older_activity_decays(self):
+        '''Вчерашний комментарий весит меньше сегодняшнего.'''
+        now = timezone.now()
+        self.assertLess(
+            event_term(now - dt.timedelta(days=1)), event_term(now)
+        )
+
+    def test_trending_page_orders_by_score(self):
+        '''Обсуждаемый пост поднимается выше более нового.'''
+        for number in range(3):
+            Comment.objects.create(
+                post=self.old_post, author=self.reader, text=f'{number}'
+            )
+        with self.assertNumQueries(1):
+            response = Client().get(reverse('posts:trending'))
+        self.assertEqual(
+            list(response.context['posts']), [self.old_post, self.new_post]
+        )
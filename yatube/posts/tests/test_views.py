@@ -1,8 +1,9 @@
+from core.querywatch import NPlusOneAssertionsMixin
 from django import forms
 from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
-from posts.models import Comment, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User
 
 from yatube.settings import POSTS_PER_PAGE
 
@@ -363,3 +364,46 @@ class CommentViewsTest(TestCase):
             post=self.post.id
         ).exists())
         self.assertEqual(comment_obj.author, self.auth_user)
+
+
+class NPlusOneTest(NPlusOneAssertionsMixin, TestCase):
+    ''' Ленты и страница поста не делают запрос на каждую запись. '''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Первый пост'
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.user, group=cls.group, text=f'test-post {i}')
+            for i in range(POSTS_PER_PAGE)
+        ])
+        Comment.objects.bulk_create([
+            Comment(author=cls.follower, post=cls.post, text=f'comment {i}')
+            for i in range(POSTS_PER_PAGE)
+        ])
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_have_no_n_plus_one(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url), self.assertNoNPlusOne():
+                self.follower_client.get(url)
@@ -0,0 +1,113 @@
+import re
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.html import escape, format_html
+
+from .models import Post, User
+
+# Ссылка, упоминание пользователя или хештег в тексте поста.
+# Хештеги длиннее имени тега (Tag.name) не выделяются.
+TOKEN = re.compile(
+    r'(?P<url>https?://[^\s<>"\']+)'
+    r'|(?<![\w@])@(?P<mention>\w+(?:[.+-]\w+)*)'
+    r'|(?<![\w#])#(?P<hashtag>\w{1,64})(?!\w)'
+)
+# Знаки препинания после ссылки обычно относятся к предложению.
+URL_TRAILING = '.,!?:;)'
+# Не больше стольких параметров в одном IN: лимит старых SQLite - 999.
+IN_CHUNK = 500
+
+
+def mentions(text):
+    ''' Имена пользователей из упоминаний @username в тексте. '''
+    return {
+        match.group('mention') for match in TOKEN.finditer(text)
+        if match.group('mention')
+    }
+
+
+def hashtags(text):
+    ''' Хештеги текста в нижнем регистре, без решётки. '''
+    return {
+        match.group('hashtag').lower() for match in TOKEN.finditer(text)
+        if match.group('hashtag')
+    }
+
+
+def _plain(text):
+    return escape(text).replace('\r\n', '\n').replace('\n', '<br>\n')
+
+
+def _token(match, usernames):
+    url = match.group('url')
+    if url:
+        tail = len(url) - len(url.rstrip(URL_TRAILING))
+        url = url[:len(url) - tail]
+        return format_html(
+            '<a href="{0}" rel="nofollow noopener" target="_blank">{0}</a>',
+            url,
+        ) + _plain(match.group()[len(url):])
+    username = match.group('mention')
+    if username:
+        if username not in usernames:
+            return _plain(match.group())
+        return format_html(
+            '<a href="{}" class="mention">@{}</a>',
+            reverse('posts:profile', args=(username,)), username,
+        )
+    tag = match.group('hashtag')
+    return format_html(
+        '<a href="{}" class="hashtag">#{}</a>',
+        reverse('posts:tag_posts', args=(tag.lower(),)), tag,
+    )
+
+
+def render_text(text, usernames):
+    ''' HTML текста поста: ссылки, упоминания и хештеги.
+
+    Весь текст вне разметки экранируется, а разметку строит только
+    эта функция, поэтому результат безопасен без отдельной очистки.
+    Ссылкой становится упоминание только из ``usernames``.
+    '''
+    parts = []
+    position = 0
+    for match in TOKEN.finditer(text):
+        parts.append(_plain(text[position:match.start()]))
+        parts.append(_token(match, usernames))
+        position = match.end()
+    parts.append(_plain(text[position:]))
+    return ''.join(parts)
+
+
+def render_posts(posts):
+    ''' Заполняет text_html постов; упомянутые имена - запросом на пачку. '''
+    names = sorted(set().union(*(mentions(post.text) for post in posts)))
+    usernames = set()
+    for start in range(0, len(names), IN_CHUNK):
+        usernames.update(User.objects.filter(
+            username__in=names[start:start + IN_CHUNK]
+        ).values_list('username', flat=True))
+    for post in posts:
+        post.text_html = render_text(post.text, usernames)
+    return posts
+
+
+def rerender(queryset=None, batch_size=None):
+    ''' Пересобирает text_html постов пачками по ``batch_size``.
+
+    Пачки идут по возрастанию id, без OFFSET, по запросу на чтение
+    и bulk_update на запись. Возвращает число постов.
+    '''
+    batch_size = batch_size or settings.TEXT_RENDER_BATCH
+    if queryset is None:
+        queryset = Post.objects.all()
+    queryset = queryset.order_by('id').only('id', 'text')
+    rendered = last_id = 0
+    while True:
+        posts = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not posts:
+            return rendered
+        Post.objects.bulk_update(render_posts(posts), ['text_html'])
+        rendered += len(posts)
+        last_id = posts[-1].id
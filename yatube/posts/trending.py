@@ -0,0 +1,96 @@
+import math
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Count, F, Func, Value
+
+from .models import Comment, Post, User
+
+# Начало отсчёта: сдвиг одинаков для всех постов и на порядок не влияет.
+EPOCH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def logaddexp2(first, second):
+    ''' log2(2 ** first + 2 ** second) без переполнения. '''
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def event_term(moment, weight=1.0):
+    ''' Вклад события в hot_score.
+
+    Вместо того чтобы уменьшать старые вклады, каждый новый вклад
+    растёт вдвое за TRENDING_HALF_LIFE_HOURS. Порядок постов от этого
+    тот же, что при затухании, но при новом комментарии не нужно
+    пересчитывать остальные посты: к счёту поста добавляется один член.
+    '''
+    hours = (moment - EPOCH).total_seconds() / 3600
+    return math.log2(weight) + hours / settings.TRENDING_HALF_LIFE_HOURS
+
+
+def post_term(pub_date, followers):
+    ''' Начальный счёт поста: охват - число подписчиков автора. '''
+    return event_term(pub_date, 1 + followers)
+
+
+class LogAddExp2(Func):
+    function = 'LOGADDEXP2'
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    ''' Даёт SQLite функцию LOGADDEXP2 для атомарного обновления счёта. '''
+    if connection.vendor != 'sqlite':
+        return
+    # deterministic есть только с Python 3.8.
+    options = {'deterministic': True} if sys.version_info >= (3, 8) else {}
+    connection.connection.create_function(
+        'LOGADDEXP2', 2, logaddexp2, **options
+    )
+
+
+def add_comments(comments):
+    ''' Добавляет к счёту постов вклады новых комментариев.
+
+    Одно обновление на пост; счёт меняется в самом UPDATE,
+    поэтому одновременные комментарии не теряют вклады друг друга.
+    '''
+    terms = defaultdict(list)
+    for comment in comments:
+        terms[comment.post_id].append(event_term(comment.created))
+    for post_id, post_terms in terms.items():
+        total = post_terms[0]
+        for term in post_terms[1:]:
+            total = logaddexp2(total, term)
+        Post.objects.filter(pk=post_id).update(
+            hot_score=LogAddExp2(F('hot_score'), Value(total))
+        )
+
+
+def recompute_hot_scores(batch_size=1000):
+    ''' Полный пересчёт счёта всех постов, например после импорта. '''
+    followers = dict(User.objects.annotate(
+        count=Count('following')
+    ).values_list('id', 'count'))
+    scores = {
+        post_id: post_term(pub_date, followers.get(author_id, 0))
+        for post_id, pub_date, author_id in Post.objects.values_list(
+            'id', 'pub_date', 'author_id'
+        ).iterator(chunk_size=batch_size)
+    }
+    for post_id, created in Comment.objects.values_list(
+        'post_id', 'created'
+    ).iterator(chunk_size=batch_size):
+        scores[post_id] = logaddexp2(scores[post_id], event_term(created))
+    posts = [Post(id=post_id, hot_score=score)
+             for post_id, score in scores.items()]
+    Post.objects.bulk_update(posts, ['hot_score'], batch_size=batch_size)
+    return len(posts)
+
+
+def trending_posts(limit=None):
+    ''' Самые популярные посты: чтение первых записей по индексу. '''
+    return Post.objects.select_related('author', 'group').order_by(
+        '-hot_score'
+    )[:limit or settings.TRENDING_SIZE]
@@ -6,14 +6,41 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('archive/', views.archive, name='archive'),
     path('create/', views.post_create, name='post_create'),
     path('follow/', views.follow_index, name='follow_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path(
+        'group/<slug:slug>/subscribe/',
+        views.group_subscribe,
+        name='group_subscribe'
+    ),
+    path(
+        'group/<slug:slug>/unsubscribe/',
+        views.group_unsubscribe,
+        name='group_unsubscribe'
+    ),
+    path('groups/', views.groups_feed, name='groups_feed'),
+    path('groups/my/', views.my_groups, name='my_groups'),
+    path('notifications/', views.notifications, name='notifications'),
+    path('posts/new/', views.new_posts, name='new_posts'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/stream/',
+        views.comment_stream,
+        name='comment_stream'
+    ),
+    path(
+        'posts/<int:post_id>/comments/new/',
+        views.new_comments,
+        name='new_comments'
+    ),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
+    path('trending/', views.trending, name='trending'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path(
         'profile/<str:username>/follow/',
@@ -1,4 +1,7 @@
+from datetime import datetime, timedelta, timezone
+
 from django.core.paginator import Paginator
+from django.db.models import Q
 
 from yatube.settings import POSTS_PER_PAGE
 
@@ -9,3 +12,90 @@ def paginator(request, post_list):
     page_obj = paginator.get_page(page_number)
 
     return page_obj
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Границы курсора: дальше datetime и INTEGER SQLite не дотягиваются.
+MAX_MICROS = (
+    datetime.max.replace(tzinfo=timezone.utc) - EPOCH
+) // timedelta(microseconds=1)
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(post):
+    micros = (post.pub_date - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{post.id}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, post_id = (int(part) for part in cursor.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= micros <= MAX_MICROS and 0 <= post_id <= MAX_ID):
+        return None
+    try:
+        return EPOCH + timedelta(microseconds=micros), post_id
+    except OverflowError:
+        return None
+
+
+class KeysetPage:
+    ''' Страница ленты без OFFSET: следующая начинается после
+    последнего поста текущей, поэтому глубина страницы не влияет
+    на стоимость запроса. Посты читаются при первом обращении.
+    '''
+
+    # Поля порядка и курсора: дата поста и его id.
+    date_field, id_field = 'pub_date', 'id'
+
+    def __init__(self, post_list, cursor, per_page):
+        self.cursor = cursor or ''
+        position = decode_cursor(cursor)
+        date, number = self.date_field, self.id_field
+        if position is not None:
+            pub_date, post_id = position
+            post_list = post_list.filter(
+                Q(**{f'{date}__lt': pub_date})
+                | Q(**{date: pub_date, f'{number}__lt': post_id})
+            )
+        self.post_list = post_list.order_by(f'-{date}', f'-{number}')
+        self.per_page = per_page
+        self._posts = None
+
+    @property
+    def posts(self):
+        if self._posts is None:
+            self._posts = list(self.post_list[:self.per_page + 1])
+        return self._posts[:self.per_page]
+
+    def __iter__(self):
+        return iter(self.posts)
+
+    def __len__(self):
+        return len(self.posts)
+
+    def has_next(self):
+        return len(self.posts) < len(self._posts)
+
+    def next_cursor(self):
+        return encode_cursor(self.posts[-1]) if self.has_next() else ''
+
+
+class TagPage(KeysetPage):
+    ''' Лента тега по строкам PostTag.
+
+    Порядок и курсор берутся из копии pub_date в PostTag, и строки
+    читаются по индексу (tag, -pub_date, -post) без сортировки всех
+    постов тега. Посты приходят тем же запросом через select_related.
+    '''
+
+    date_field, id_field = 'pub_date', 'post_id'
+
+    @property
+    def posts(self):
+        return [post_tag.post for post_tag in super().posts]
+
+
+def keyset_paginator(request, post_list, page_class=KeysetPage):
+    return page_class(post_list, request.GET.get('after'), POSTS_PER_PAGE)
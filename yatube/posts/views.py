@@ -1,19 +1,42 @@
+import time
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
+from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.cache import cache_page
 
 from yatube.settings import CACHE_TIME
 
+from .archive import stream_archive
+from .comment_buffer import buffer_comment, with_pending
+from .comment_stream import (comment_events, comments_after, event_id,
+                             latest_event_id, parse_event_id)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
+from .graph import follow_graph
+from .live import is_newer, latest_cursor, newer_posts
+from .models import (Follow, FollowSuggestion, Group, GroupSubscription,
+                     Notification, Post, PostTag, Tag, User)
+from .signals import get_feed_version
+from .trending import trending_posts
+from .utils import (TagPage, encode_cursor, keyset_paginator,
+                    paginator)
+
+# Когда пользователь последний раз менял подписки (time.time()).
+FOLLOW_CHANGED_KEY = 'follow_changed'
 
 
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and settings.COMMENT_BUFFER_ENABLED:
+        # Запись в базу - пачкой из фонового потока.
+        buffer_comment(request, post, form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -21,11 +44,69 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@login_required
+def archive(request):
+    ''' Архив всех постов пользователя с картинками, отдаётся потоком. '''
+    response = StreamingHttpResponse(
+        stream_archive(request.user), content_type='application/zip'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}-posts.zip"'
+    )
+    return response
+
+
+def comment_stream(request, post_id):
+    ''' SSE-поток новых комментариев поста.
+
+    Каждое открытое соединение занимает поток сервера на всё время
+    жизни потока событий (не дольше COMMENT_STREAM_MAX_SECONDS),
+    поэтому без COMMENT_STREAM_ENABLED страницы опрашивают new_comments.
+    '''
+    if not settings.COMMENT_STREAM_ENABLED:
+        raise Http404('Поток комментариев выключен')
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404('Пост не найден')
+    response = StreamingHttpResponse(
+        comment_events(post_id, request.META.get('HTTP_LAST_EVENT_ID')),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Иначе nginx копит события в буфере.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def new_comments(request, post_id):
+    ''' Комментарии поста новее события ``after``: число и готовый HTML. '''
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404('Пост не найден')
+    after = request.GET.get('after', '')
+    last = parse_event_id(after)
+    comments = []
+    if last is not None:
+        comments = list(
+            comments_after(post_id, last)[:settings.LIVE_MAX_POSTS]
+        )
+    return JsonResponse({
+        'count': len(comments),
+        'cursor': str(event_id(comments[-1])) if comments else after,
+        'html': render_to_string(
+            'posts/includes/new_comments.html',
+            {'comments': comments[::-1]}, request,
+        ),
+        'poll_seconds': settings.LIVE_POLL_SECONDS,
+    })
+
+
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = Post.objects.filter(
+        author__following__user=request.user
+    ).select_related('author', 'group')
     page_obj = paginator(request, posts)
     context = {
+        'live_cursor': latest_cursor(),
         'page_obj': page_obj
     }
     return render(request, 'posts/follow_index.html', context)
@@ -35,23 +116,142 @@ def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('author')
     page_obj = paginator(request, post_list)
+    subscribed = request.user.is_authenticated and (
+        group.subscribers.filter(user=request.user).exists()
+    )
     context = {
+        'feed_version': get_feed_version(),
         'group': group,
+        'live_cursor': latest_cursor(group.id),
         'page_obj': page_obj,
+        'subscribed': subscribed,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@login_required
+def group_subscribe(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    GroupSubscription.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_posts', slug=slug)
+
+
+@login_required
+def group_unsubscribe(request, slug):
+    GroupSubscription.objects.filter(
+        user=request.user, group__slug=slug
+    ).delete()
+    return redirect('posts:group_posts', slug=slug)
+
+
+def _groups_feed(request, groups, title, slug_query=''):
+    ''' Общая лента нескольких групп одним запросом group_id IN (...). '''
+    post_list = Post.objects.filter(
+        group_id__in=[group.id for group in groups]
+    ).select_related('author', 'group')
+    context = {
+        'feed_version': get_feed_version(),
+        'groups': groups,
+        'groups_key': ','.join(sorted(group.slug for group in groups)),
+        'page_obj': keyset_paginator(request, post_list),
+        'slug_query': slug_query,
+        'title': title,
+    }
+    return render(request, 'posts/groups_feed.html', context)
+
+
+def groups_feed(request):
+    slugs = [
+        slug for slug in request.GET.get('slug', '').split(',') if slug
+    ][:settings.GROUP_FEED_MAX_GROUPS]
+    groups = list(Group.objects.filter(slug__in=slugs))
+    if not groups:
+        raise Http404('Не найдено ни одной группы')
+    return _groups_feed(
+        request, groups, 'Записи групп',
+        slug_query=','.join(sorted(group.slug for group in groups)),
+    )
+
+
 @cache_page(CACHE_TIME)
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
+    post_list = Post.objects.select_related('author', 'group')
     page_obj = paginator(request, post_list)
     context = {
+        'live_cursor': latest_cursor(),
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@login_required
+def my_groups(request):
+    groups = list(Group.objects.filter(subscribers__user=request.user))
+    return _groups_feed(request, groups, 'Мои группы')
+
+
+def new_posts(request):
+    ''' Посты ленты новее курсора ``after``: число и готовый HTML.
+
+    Пока маркер самого нового поста в кэше не новее курсора,
+    ответ обходится без запросов к базе.
+    '''
+    feed = request.GET.get('feed', 'index')
+    after = request.GET.get('after', '')
+    group_id = None
+    if feed == 'group':
+        try:
+            group_id = int(request.GET.get('group', ''))
+        except ValueError:
+            raise Http404('Не указана группа')
+    elif feed == 'follow' and not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    elif feed not in ('index', 'follow'):
+        raise Http404('Неизвестная лента')
+    if not is_newer(latest_cursor(group_id), after):
+        return JsonResponse({
+            'count': 0,
+            'cursor': after,
+            'html': '',
+            'poll_seconds': settings.LIVE_POLL_SECONDS,
+        })
+    post_list = Post.objects.select_related('author', 'group')
+    if feed == 'follow':
+        post_list = post_list.filter(author__following__user=request.user)
+    elif group_id is not None:
+        post_list = post_list.filter(group_id=group_id)
+    posts = newer_posts(post_list, after)
+    fresh = list(posts[:settings.LIVE_MAX_POSTS])
+    count = len(fresh)
+    if count == settings.LIVE_MAX_POSTS:
+        count = posts.count()
+    return JsonResponse({
+        'count': count,
+        'cursor': encode_cursor(fresh[0]) if fresh else after,
+        'html': render_to_string(
+            'posts/includes/new_posts.html', {'posts': fresh}, request
+        ),
+        'poll_seconds': settings.LIVE_POLL_SECONDS,
+    })
+
+
+@login_required
+def notifications(request):
+    ''' Входящие уведомления; открытая страница помечается прочитанной. '''
+    page_obj = Paginator(
+        request.user.notifications.select_related('actor', 'post'),
+        settings.NOTIFICATIONS_PER_PAGE,
+    ).get_page(request.GET.get('page'))
+    unread = [note.id for note in page_obj if not note.read]
+    if unread:
+        Notification.objects.filter(id__in=unread).update(read=True)
+    context = {
+        'page_obj': page_obj,
+        'unread': unread,
+    }
+    return render(request, 'posts/notifications.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, request.FILES or None)
@@ -70,10 +270,14 @@ def post_detail(request, post_id):
     post_detail = get_object_or_404(Post, id=post_id)
     author_posts_count = post_detail.author.posts.count()
     form = CommentForm(add_comment(request, post_id))
-    comments = post_detail.comments.all()
+    comments = list(with_pending(
+        request, post_detail, post_detail.comments.select_related('author')
+    ))
     context = {
         'author_posts_count': author_posts_count,
+        'comment_stream': settings.COMMENT_STREAM_ENABLED,
         'comments': comments,
+        'comments_cursor': latest_event_id(comments),
         'form': form,
         'post': post_detail,
     }
@@ -97,16 +301,39 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+def is_following(request, author):
+    ''' Подписан ли пользователь запроса на автора.
+
+    Граф подписок знает подписки после снимка только в своём
+    процессе, поэтому, если пользователь менял подписки позже
+    снимка, ответ берётся из базы.
+    '''
+    if not request.user.is_authenticated:
+        return False
+    changed_at = request.session.get(FOLLOW_CHANGED_KEY, 0)
+    if settings.FOLLOW_GRAPH_ENABLED and (
+        follow_graph.built_at() > changed_at
+    ):
+        return follow_graph.is_following(request.user.id, author.id)
+    return author.following.filter(user__id=request.user.id).exists()
+
+
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    post_list = author.posts.select_related('group')
     user_posts_count = post_list.count()
     page_obj = paginator(request, post_list)
-    following = author.following.filter(user__id=request.user.id).exists()
+    following = is_following(request, author)
+    # Список готовится командой refresh_suggestions: один запрос по ключу.
+    suggestion = request.user.is_authenticated and (
+        FollowSuggestion.objects.filter(user_id=request.user.id).first()
+    )
     context = {
         'author': author,
+        'feed_version': get_feed_version(),
         'following': following,
         'page_obj': page_obj,
+        'suggestions': suggestion.authors if suggestion else [],
         'user_posts_count': user_posts_count,
     }
     return render(request, 'posts/profile.html', context)
@@ -124,6 +351,7 @@ def profile_follow(request, username):
             user=request.user,
             author=get_object_or_404(User, username=username),
         )
+        request.session[FOLLOW_CHANGED_KEY] = time.time()
     return redirect('posts:profile', username=username)
 
 
@@ -131,4 +359,28 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.get(author=author, user=request.user).delete()
+    request.session[FOLLOW_CHANGED_KEY] = time.time()
     return redirect('posts:profile', username=username)
+
+
+def tag_posts(request, name):
+    ''' Лента хештега: посты по индексу тегов, без поиска по тексту. '''
+    tag = get_object_or_404(Tag, name=name.lower())
+    post_tags = PostTag.objects.filter(tag=tag).select_related(
+        'post__author', 'post__group'
+    )
+    context = {
+        'feed_version': get_feed_version(),
+        'page_obj': keyset_paginator(request, post_tags, TagPage),
+        'tag': tag,
+    }
+    return render(request, 'posts/tag_posts.html', context)
+
+
+def trending(request):
+    ''' Популярные посты: по свежим комментариям и охвату автора. '''
+    context = {
+        'posts': trending_posts(),
+        'trending': True,
+    }
+    return render(request, 'posts/trending.html', context)
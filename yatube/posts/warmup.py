@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import threading
+from http import HTTPStatus
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.base import BaseHandler
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .models import Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+FEED_HITS_KEY = 'posts:feed_hits'
+WARMUP_HEADER = 'HTTP_X_CACHE_WARMUP'
+
+# Имя маршрута ленты -> имя аргумента в URL.
+TRACKED_FEEDS = {
+    'posts:index': None,
+    'posts:group_posts': 'slug',
+    'posts:profile': 'username',
+}
+
+
+class FeedHitsTracker:
+    ''' Счётчик обращений к лентам в общем кэше.
+
+    Просмотры копятся в памяти процесса и раз в ``flush_every``
+    обращений прибавляются к счётчикам в кэше через cache.incr,
+    так что рейтинг общий для всех процессов сервера и команды
+    warm_cache. Список лент со счётчиками хранится отдельным ключом
+    и обрезается до ``size`` самых посещаемых.
+    '''
+
+    def __init__(self, flush_every=100, size=200):
+        self.flush_every = flush_every
+        self.size = size
+        self._pending = Counter()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def counter_key(feed):
+        digest = hashlib.blake2b(
+            repr(feed).encode(), digest_size=16
+        ).hexdigest()
+        return f'{FEED_HITS_KEY}:{digest}'
+
+    def hit(self, view_name, arg=None):
+        with self._lock:
+            self._pending[(view_name, arg)] += 1
+            self._count += 1
+            if self._count < self.flush_every:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._count = 0
+        if not pending:
+            return
+        for feed, hits in pending.items():
+            key = self.counter_key(feed)
+            try:
+                cache.incr(key, hits)
+            except ValueError:
+                # Ключа ещё нет; если другой процесс успел его
+                # создать, add не сработает и остаётся incr.
+                if not cache.add(key, hits, None):
+                    cache.incr(key, hits)
+        feeds = {tuple(feed) for feed in cache.get(FEED_HITS_KEY) or ()}
+        feeds.update(pending)
+        cache.set(FEED_HITS_KEY, self.ranked(feeds)[:self.size], None)
+
+    def ranked(self, feeds):
+        feeds = list(feeds)
+        counts = cache.get_many([self.counter_key(feed) for feed in feeds])
+        hits = [counts.get(self.counter_key(feed), 0) for feed in feeds]
+        return [
+            feed for count, feed in sorted(
+                zip(hits, feeds), key=lambda item: -item[0]
+            ) if count
+        ]
+
+    def most_common(self, limit):
+        self.flush()
+        feeds = [tuple(feed) for feed in cache.get(FEED_HITS_KEY) or ()]
+        return self.ranked(feeds)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._count = 0
+        feeds = cache.get(FEED_HITS_KEY) or ()
+        cache.delete_many(
+            [FEED_HITS_KEY]
+            + [self.counter_key(tuple(feed)) for feed in feeds]
+        )
+
+
+feed_hits = FeedHitsTracker()
+
+
+def hot_feeds(limit):
+    ''' Самые посещаемые ленты; без статистики - самые наполненные. '''
+    feeds = feed_hits.most_common(limit)
+    if feeds:
+        return feeds
+    groups = Group.objects.annotate(
+        posts_count=Count('posts')
+    ).order_by('-posts_count').values_list('slug', flat=True)[:limit]
+    authors = User.objects.annotate(
+        posts_count=Count('posts')
+    ).filter(posts_count__gt=0).order_by(
+        '-posts_count'
+    ).values_list('username', flat=True)[:limit]
+    return (
+        [('posts:index', None)]
+        + [('posts:group_posts', slug) for slug in groups]
+        + [('posts:profile', username) for username in authors]
+    )
+
+
+def feed_url(view_name, arg=None):
+    kwarg = TRACKED_FEEDS[view_name]
+    if kwarg is None:
+        return reverse(view_name)
+    return reverse(view_name, kwargs={kwarg: arg})
+
+
+def feed_pages(view_name, arg=None):
+    ''' Число страниц в ленте: дальше последней прогревать нечего. '''
+    posts = Post.objects.all()
+    if view_name == 'posts:group_posts':
+        posts = posts.filter(group__slug=arg)
+    elif view_name == 'posts:profile':
+        posts = posts.filter(author__username=arg)
+    return max(1, -(-posts.count() // settings.POSTS_PER_PAGE))
+
+
+def is_shared_cache():
+    ''' Виден ли кэш другим процессам: память процесса - нет. '''
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _handler():
+    ''' Обработчик запросов без сигналов начала и конца запроса.
+
+    Тестовый Client на время запроса отключает глобальный обработчик
+    close_old_connections, а это гонка с настоящими запросами сервера.
+    '''
+    handler = BaseHandler()
+    handler.load_middleware()
+    return handler
+
+
+def warmup_hosts():
+    ''' Хосты для прогрева: ключ cache_page содержит схему и хост.
+
+    CACHE_WARMUP_HOSTS или все ALLOWED_HOSTS, кроме масок ('*',
+    '.example.com'): страница, прогретая под другим хостом, настоящим
+    запросам из кэша не достанется. Запись вида https://example.com
+    прогревается по HTTPS.
+    '''
+    if settings.CACHE_WARMUP_HOSTS is not None:
+        return list(settings.CACHE_WARMUP_HOSTS)
+    hosts = [
+        host for host in settings.ALLOWED_HOSTS
+        if host != '*' and not host.startswith('.')
+    ]
+    return hosts or ['localhost']
+
+
+def warm_feed(url, pages, host, handler=None):
+    ''' Запрашивает первые страницы ленты, чтобы они легли в кэш. '''
+    handler = handler or _handler()
+    scheme, _, name = host.rpartition('://')
+    factory = RequestFactory(HTTP_HOST=name, **{WARMUP_HEADER: '1'})
+    warmed = 0
+    try:
+        for number in range(1, pages + 1):
+            page_url = url if number == 1 else f'{url}?page={number}'
+            response = handler.get_response(
+                factory.get(page_url, secure=scheme == 'https')
+            )
+            if response.status_code != HTTPStatus.OK:
+                break
+            warmed += 1
+    except Exception:
+        logger.exception('Не удалось прогреть %s%s', host, url)
+    return f'{scheme or "http"}://{name}{url}', warmed
+
+
+def warm_cache(feeds=None, pages=None, workers=None, hosts=None):
+    ''' Прогревает кэш самых популярных лент под каждым хостом.
+
+    Число одновременных запросов ограничено ``workers``, чтобы прогрев
+    не отнимал у базы всё время сразу после выкладки.
+    '''
+    pages = pages or settings.CACHE_WARMUP_PAGES
+    workers = workers or settings.CACHE_WARMUP_WORKERS
+    hosts = hosts or warmup_hosts()
+    tasks = [
+        (feed_url(view_name, arg), min(pages, feed_pages(view_name, arg)),
+         host)
+        for view_name, arg in hot_feeds(
+            feeds or settings.CACHE_WARMUP_FEEDS
+        )
+        for host in hosts
+    ]
+    handler = _handler()
+    if workers == 1:
+        return [warm_feed(*args, handler) for args in tasks]
+
+    def task(args):
+        try:
+            return warm_feed(*args, handler)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(task, tasks))
+
+
+def start_background_warmup(**kwargs):
+    ''' Прогрев в фоновом потоке: после выкладки или сброса кэша.
+
+    Страницы ложатся в кэш этого процесса, поэтому прогрев работает
+    и с кэшем в памяти процесса.
+    '''
+    def run():
+        try:
+            warm_cache(**kwargs)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
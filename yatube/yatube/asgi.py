@@ -0,0 +1,24 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.2 has no ASGI support of its own, so the WSGI handler runs in a
+bounded thread pool (ASGI_THREADS) behind core.asgi.WsgiToAsgi; streaming
+responses are read in a separate pool of ASGI_STREAMS threads.
+
+Run it with any ASGI server, e.g. ``uvicorn yatube.asgi:application``,
+or locally with ``python manage.py runasgi``.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WsgiToAsgi(
+    get_wsgi_application(), settings.ASGI_THREADS, settings.ASGI_STREAMS
+)
@@ -16,6 +16,95 @@ POSTS_PER_PAGE: int = 10
 
 CACHE_TIME = (60 * 20)
 
+# Прогрев кэша популярных лент (команда warm_cache и фоновый поток).
+CACHE_WARMUP_ON_STARTUP = False
+CACHE_WARMUP_FEEDS: int = 10
+CACHE_WARMUP_PAGES: int = 3
+CACHE_WARMUP_WORKERS: int = 2
+# Ключ cache_page содержит хост: None - все ALLOWED_HOSTS без масок,
+# запись вида https://example.com прогревается по HTTPS.
+CACHE_WARMUP_HOSTS = None
+
+# Замеры запросов: время, база, шаблоны и кэш (core.middleware).
+METRICS_ENABLED = True
+METRICS_BUFFER_SIZE: int = 500
+
+# Журнал медленных запросов и поиск N+1 (core.querywatch).
+QUERY_WATCH_SAMPLE_RATE: float = 0.01
+QUERY_WATCH_SLOW_MS: int = 100
+QUERY_WATCH_N_PLUS_ONE: int = 3
+
+# Разбивка времени рендеринга по шаблонам, {% include %} и {% thumbnail %}.
+TEMPLATE_PROFILING = False
+
+# Архив постов пользователя: постов за запрос к базе и байт за чтение файла.
+ARCHIVE_CHUNK_SIZE: int = 500
+ARCHIVE_FILE_CHUNK: int = 64 * 1024
+
+# Популярные посты: вес комментария убывает вдвое за период полураспада.
+TRENDING_HALF_LIFE_HOURS: float = 12.0
+TRENDING_SIZE: int = 30
+
+# Рекомендации "кого почитать" (команда refresh_suggestions).
+SUGGESTIONS_SIZE: int = 5
+SUGGESTIONS_NEIGHBOURS: int = 50
+SUGGESTIONS_BATCH: int = 500
+
+# Пересборка HTML текста постов (posts.text, команда render_posts).
+TEXT_RENDER_BATCH: int = 500
+
+# Сводная лента нескольких групп: не больше стольких групп в запросе.
+GROUP_FEED_MAX_GROUPS: int = 20
+
+# Опрос новых постов в лентах (posts.live).
+LIVE_POLL_SECONDS: int = 30
+LIVE_MAX_POSTS: int = 20
+
+# Поток новых комментариев поста (SSE, posts.comment_stream). Поток
+# держит поток сервера на каждую открытую страницу, поэтому выключен:
+# без него страница раз в LIVE_POLL_SECONDS опрашивает new_comments.
+COMMENT_STREAM_ENABLED: bool = False
+COMMENT_STREAM_KEEPALIVE_SECONDS: int = 15
+COMMENT_STREAM_MAX_SECONDS: int = 300
+COMMENT_STREAM_RETRY_MS: int = 3000
+
+# Потоков для Django за ASGI-приложением (yatube.asgi).
+ASGI_THREADS: int = 8
+# Потоков для потоковых ответов (SSE): свыше - 503, пул запросов не ждёт.
+ASGI_STREAMS: int = 32
+
+# Сжатие ответов (core.middleware.CompressionMiddleware) и статики
+# (команда compress_static: копия остаётся, если не больше доли от файла).
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE: int = 500
+COMPRESSION_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'application/json',
+    'application/javascript', 'image/svg+xml',
+)
+COMPRESSION_STATIC_MIN_RATIO: float = 0.9
+
+# Отдача статики самим Django, когда перед ним нет nginx (core.views).
+# Файлы без хеша в имени кэшируются на STATIC_MAX_AGE секунд.
+STATIC_SERVE = False
+STATIC_MAX_AGE: int = 60 * 60
+
+# Отдача загруженных картинок и миниатюр (core.views.media_file).
+MEDIA_SERVE = True
+MEDIA_MAX_AGE: int = 60 * 60 * 24
+
+# Открытые дескрипторы частых файлов не больше OPEN_FILES_MAX_BYTES;
+# файлы крупнее отдаются сервером через sendfile (core.static).
+OPEN_FILES_CACHE_SIZE: int = 256
+OPEN_FILES_MAX_BYTES: int = 256 * 1024
+
+# Записи sorl-thumbnail в локальном SQLite с LRU в памяти (core.thumbnails).
+# Без пути файл лежит в MEDIA_ROOT/cache рядом с самими миниатюрами.
+THUMBNAIL_BACKEND = 'core.thumbnails.ThumbnailBackend'
+THUMBNAIL_KVSTORE = 'core.thumbnails.SQLiteKVStore'
+THUMBNAIL_KVSTORE_PATH = None
+THUMBNAIL_KVSTORE_LRU_SIZE: int = 10000
+THUMBNAIL_KVSTORE_LRU_SECONDS: int = 300
+
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -28,7 +117,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 't_9tdkj0x!0xcls^rzc3k$h#3g^tlo%)!$=*llc032)1l7d$6='
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', '1').lower() in ('1', 'true')
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -56,13 +145,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.QueryWatchMiddleware',
+    'core.middleware.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.middleware.FeedHitsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -73,7 +167,7 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
+        'APP_DIRS': DEBUG,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -85,8 +179,18 @@ TEMPLATES = [
         },
     },
 ]
+# Вне отладки шаблоны компилируются один раз и прогреваются при старте.
+TEMPLATE_WARMUP = not DEBUG
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 
 # Database
@@ -96,7 +200,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Секунды ожидания блокировки записи до ошибки.
+            'timeout': 20,
+        },
+    }
+}
+
+# Реплики только для чтения (core.routers). Локально это копии файла
+# основной базы, которые обновляет команда replicate.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.getenv('SQLITE_REPLICAS', '0')) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+# Без auth: request.user не должен читаться с отстающей реплики.
+READ_REPLICA_APPS = ('posts',)
+READ_REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+    'posts:trending',
+    'posts:groups_feed',
+    'posts:my_groups',
+)
+READ_REPLICA_PIN_COOKIE = 'pin_primary'
+READ_REPLICA_PIN_SECONDS: int = 10
+
+# Выполняются для каждого нового соединения с SQLite (core.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -135,14 +283,29 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# В продакшене адреса статики содержат хеш содержимого (манифест пишет
+# collectstatic, сжатые копии - compress_static). Без манифеста {% static %}
+# падает с ValueError, а не хеширует файл на каждый запрос.
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+    )
 
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь (core.mail), а команда send_queued_mail
+# отправляет их через EMAIL_QUEUE_BACKEND пачками по одному соединению.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+EMAIL_QUEUE_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+EMAIL_QUEUE_BATCH: int = 100
+EMAIL_QUEUE_MAX_ATTEMPTS: int = 5
+EMAIL_QUEUE_RETRY_SECONDS: int = 60
+EMAIL_QUEUE_LEASE_SECONDS: int = 300
 
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -152,13 +315,60 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# Отложенная пакетная запись комментариев (posts.comment_buffer).
+COMMENT_BUFFER_ENABLED = False
+COMMENT_BUFFER_MAX_ITEMS: int = 200
+COMMENT_BUFFER_INTERVAL_MS: int = 200
+COMMENT_BUFFER_FSYNC = False
+COMMENT_BUFFER_SPOOL = os.path.join(BASE_DIR, 'spool', 'comments.ndjson')
+COMMENT_BUFFER_OVERLAY_SECONDS: int = 60
+
+# Уведомления (posts.notifications): запись пачками через буфер
+# и дайджесты на почту (команда send_digests).
+NOTIFICATION_BUFFER_ENABLED = False
+NOTIFICATION_BUFFER_MAX_ITEMS: int = 500
+NOTIFICATION_BUFFER_INTERVAL_MS: int = 1000
+NOTIFICATION_BUFFER_SPOOL = os.path.join(
+    BASE_DIR, 'spool', 'notifications.ndjson'
+)
+NOTIFICATION_DIGEST_BATCH: int = 500
+NOTIFICATIONS_PER_PAGE: int = 20
+
+# Граф подписок в памяти (posts.graph): снимок общий для всех процессов.
+FOLLOW_GRAPH_ENABLED = False
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(BASE_DIR, 'graph', 'follows.bin')
+FOLLOW_GRAPH_CHECK_SECONDS: int = 5
+
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
     }
 }
 
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_queries.log'),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -2,12 +2,26 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from core import views as core_views
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics/', include('core.urls', namespace='core')),
+    path('favicon.ico', core_views.favicon, name='favicon'),
+    path(
+        f'{settings.STATIC_URL.strip("/")}/<path:path>',
+        core_views.static_file,
+        name='static_file',
+    ),
+    path(
+        f'{settings.MEDIA_URL.strip("/")}/<path:path>',
+        core_views.media_file,
+        name='media_file',
+    ),
 ]
 
 handler404 = 'core.views.page_not_found'